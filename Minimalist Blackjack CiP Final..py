@@ -9,7 +9,12 @@ Written by Devenish Smith to serve as final project assignment for Code in Place
 *** Directory ***
 intro() - Display welcome text.
 thank_you() - Exit thank you text.
-build_cards() - Build details of all 52 cards in a list.
+pause() - Show what has been printed so far, then pause for a visual delay.
+build_card_tables() - Build details of all 52 cards as lookup tables.
+HouseRules - Every House rule of the game in one place.
+parse_rules() - House rules from FIELD=VALUE strings.
+Shoe - Playing deck of card ids with a deal cursor, counting what is left as it deals.
+build_cards() - Build the 52 card ids of a pack.
 build_deck() - Compile multiple packs of cards into a deck, then shuffle and cut.
 refresh_deck() - Refresh deck of cards when it reaches the cut.
 on_the_house() - Give a player some courtesy credits when near bankruptcy.
@@ -18,6 +23,7 @@ start_player_cards() - Deal players first cards.
 start_dealer_cards() - Deal dealers first cards.
 player_starting_data() - Display players first cards.
 dealer_starting_data() - Display dealers first cards.
+Hand - A hand of cards that keeps its value as cards are added.
 get_hand_value() - Used to get value of players hand of cards.
 display_full_hand() - Used to display full list of all cards in a hand.
 deal_new_card() - Used to deal a new card to an existing hand.
@@ -29,16 +35,261 @@ player_main_hand()  - Player will play their Main hand.
 dealer_plays_hand() - Dealer will attempt to beat the player.
 settlements() - Payouts and summery of the game.
 play_another_game() - Ask the user to play again.
+blackjack_rounds() - The game loop of blackjack(), yielding a RoundResult for each round.
 black_jack() - The Game of Blackjack, using functions above.
+
+*** Headless engine ***
+HeadlessStrategy - Makes every player decision for the headless engine (no prompts).
+ShoePool - Shuffled shoes kept ready by a background thread or process.
+fill_shoe_pool() - Keep a queue topped up with shuffled shoes.
+HeadlessSession - Running balance, deck and random generator for a headless game.
+headless_refresh_deck() - refresh_deck() without printing or pausing.
+hand_steps() - double_down() then hit_or_stand() on one hand, as steps of seat_steps().
+settle_hand() - Signed payout of one hand, as used by settlements().
+seat_steps() - The rules of the player's side of a dealt round, shared with the table server.
+finish_steps() - Play seat_steps() or round_steps() that never wait.
+play_seat() - Play the player's side of a dealt round with a strategy.
+best_hand_value() - The player's hand the House plays against.
+headless_dealer_plays() - dealer_plays_hand() without printing or pausing.
+round_steps() - The rules of one full round of blackjack(), shared with the table server.
+play_round() - Play one full round of blackjack() with no I/O.
+RoundResult - Lightweight record of one finished round.
+iter_rounds() - Yield a RoundResult for each headless round, played as they are asked for.
+run_headless() - Play many rounds in a row with a strategy.
+
+*** Simulation ***
+SimulationStats - Totals of simulated rounds that can be merged together.
+simulate_chunk() - Play one chunk of rounds with its own random generator.
+simulate() - Spread a number of rounds across all cores and merge the results.
+display_simulation() - Print a report of simulated rounds.
+RunningMoments - Streaming mean and variance (Welford) that can be merged together.
+simulate_until() - Simulate in batches until the house edge is known closely enough.
+display_simulate_until() - Print a report of simulate_until().
+tournament_chunk() - Play every strategy on the same shoes, cuts and dealer stops.
+tournament() - Compare strategies on common shoes across all cores.
+display_tournament() - Print each strategy's results and the paired differences.
+TableSession - Up to seven seats dealt from one shared shoe.
+play_table_round() - One round for every seat, with one House hand and one settlement pass.
+simulate_table_chunk() - Play one chunk of table rounds with its own random generator.
+simulate_table() - Spread table rounds across all cores and merge each seat's results.
+display_table_simulation() - Print each seat's results and the whole table's.
+QuantileSketch - Mergeable streaming quantiles to a set relative accuracy.
+FixedHistogram - Mergeable counts of values in equal width bins.
+BankrollStats - Streaming summary of many sessions' balances, ruin and courtesy credits.
+bankroll_chunk() - Play one chunk of whole sessions with its own random generator.
+bankroll_analysis() - Play many sessions across all cores and merge their BankrollStats.
+display_bankroll() - Print the bankroll and risk of ruin report.
+sweep_rules() - House edge of many House rules, played in parallel and cached on disk.
+rules_grid() - Every combination of House rules from lists of values.
+display_sweep() - Print the results of sweep_rules().
+simulate_dealer_batch() - Play many rounds at once as NumPy arrays (needs NumPy).
+display_dealer_batch() - Print a report of simulate_dealer_batch().
+
+*** Probabilities ***
+full_shoe_composition() - Count of each card value in a new shoe.
+shoe_composition() - Count of each card value left in a Shoe.
+ten_chance() - Chance the next unseen card is worth 10.
+insurance_value() - Expected credits won by buying insurance.
+dealer_draw_probabilities() - Exact final totals of the House from a part played hand.
+dealer_outcome_probabilities() - Exact final totals of the House from its face up card (cached).
+player_outcome_probabilities() - Chance to win, push or lose against those totals.
+display_dealer_table() - Print the House's odds for every face up card.
+
+*** Strategy table ***
+strategy_index() - Position of a hand in the flat strategy tables.
+hand_action_values() - Expected value of standing, hitting and doubling every hand.
+build_strategy_table() - Work out the best choice for every hand and face up card.
+TableStrategy - HeadlessStrategy that looks up every choice in the strategy tables.
+CountingStrategy - TableStrategy that sizes bets and buys insurance by the count.
+display_strategy_table() - Print the strategy tables as charts.
+make_strategy() - A strategy from its name on the command line.
+
+*** Table server ***
+send_text() - Send text to a connected player.
+ask_player() - Ask a connected player a question until they give a valid answer.
+hand_text() - The text of display_full_hand() as a string.
+TablePlayer - Asks a connected player each choice of round_steps() and shows them the game.
+table_round() - One round of round_steps() for a connected player.
+table_session() - A whole game for one connected player.
+serve_tables() - Run a table for every player that connects.
+
+*** Instrumentation ***
+PhaseTimer - Counts, total time and latency histogram of each phase of blackjack().
+
+*** Metrics ***
+MetricsShard - The counters and histograms of one thread.
+Metrics - Counters and latency histograms of a running game, in Prometheus text format.
+MetricsHandler - HTTP request handler serving Metrics on /metrics.
+serve_metrics() - Serve Metrics over HTTP from a background thread.
+write_metrics() - Write Metrics to a file, replacing it in one step.
+start_metrics_file() - Rewrite a metrics file every few seconds from a background thread.
+start_metrics() - Metrics published as asked for on the command line.
+
+*** Benchmarks ***
+stubbed_console() - Answer blackjack()'s prompts from a function with no output or pauses.
+scripted_answer() - A scripted player for stubbed_console().
+time_benchmark() - Best time in nanoseconds for one call of a function.
+run_benchmarks() - Time the deck, hand and round functions.
+compare_benchmarks() - Flag benchmarks slower than a saved baseline.
+
+*** Scripted play ***
+ScriptedInput - Answer the real game's prompts from a script file or pipe.
+play_script() - Play blackjack() until the player quits or the script runs out.
+display_script_stats() - Print the startup time and rounds per second of a scripted game.
+
+*** Rendering ***
+NullRenderer - Renderer that throws away all output, for headless runs.
+ConsoleRenderer - Renderer that writes a whole frame to the terminal at each step of the game.
+CursesRenderer - Renderer that draws the game in curses, redrawing only the lines that changed.
+make_renderer() - Renderer by name.
+use_renderer() - Send the game's output and prompts through a renderer.
+
+*** Hand history ***
+HandHistoryWriter - Append every round to a file of fixed size binary records.
+HandHistory - Read a hand history file through mmap without copying it.
+display_hand_history() - Print a summery of a hand history file.
+
+*** Replay ***
+ReplayDivergence - Raised when a replay stops matching the recorded session.
+DecisionRecorder - Write the seed and every decision of a session to a decision log.
+RecordingStrategy - HeadlessStrategy that records the choices of another strategy.
+load_decision_log() - Read the seed and rounds of a decision log.
+ReplayStrategy - HeadlessStrategy that makes the choices read from a decision log.
+Replay - Replay a recorded session at full speed and seek to any round.
+display_replay_round() - Print one round of a replayed session.
+
+*** Snapshots ***
+pack_snapshot() - The whole state of a session in a small fixed layout.
+unpack_snapshot() - Read the state packed by pack_snapshot().
+write_snapshot() - Save the whole state of a session to a small fixed layout file.
+read_snapshot() - Load a session saved by write_snapshot().
+sync_snapshot() - Sync the last snapshot to disk when the game exits.
+session_snapshot() - Pack a HeadlessSession.
+snapshot_session() - Save a HeadlessSession.
+resume_session() - A HeadlessSession carried on from a snapshot.
+
 main() - Main includes Intro(), blackjack() and thank_you().
 """
 
+import argparse
+import array
+import asyncio
+import atexit
+import bisect
+import builtins
+import contextlib
+import copy
+import functools
+import hashlib
+import http.server
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import platform
+import queue
 import random
+import re
+import statistics
+import struct
+import sys
+import threading
 import time
+import timeit
 
+PROCESS_START = time.perf_counter() # When the module started running, for display_script_stats().
 STARTING_BALANCE = int(1000) # Starting credits issued to player.
 NUM_OF_DECKS = 3 # How many decks used in an active game.
 MED_PAUSE = 0.9 # time to pause for visual delay.
+PAUSES_ON = True # False to skip the delay of pause(), as --no-pause and --script do.
+SIM_CHUNK_ROUNDS = 10000 # Rounds in each independently seeded chunk of a simulation.
+SIM_MAX_ROUNDS = 100000000 # Most rounds simulate_until() plays before giving up.
+TOURNAMENT_CHUNK_SHOES = 200 # Shoes in each independently seeded chunk of a tournament.
+BANKROLL_SESSION_ROUNDS = 1000 # Rounds in each session of bankroll_analysis().
+BANKROLL_CHUNK_SESSIONS = 50 # Sessions in each independently seeded chunk of a bankroll analysis.
+BANKROLL_PERCENTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99) # Percentiles shown by display_bankroll().
+BANKROLL_COUNTS = ("sessions", "ruined", "rescued", "ahead", "top_ups") # Totals of a BankrollStats, merged by adding.
+BANKROLL_ESTIMATORS = ("final_balance", "final_sketch", "final_histogram", "own_balance", "own_sketch", "drawdown",
+    "drawdown_sketch", "ruin_round", "ruin_sketch") # Estimators of a BankrollStats, merged by their own merge().
+SKETCH_ACCURACY = 0.01 # Relative error of the quantiles of a QuantileSketch.
+MAX_SEATS = 7 # Most seats at a TableSession.
+SWEEP_CACHE_DIR = ".blackjack_sweeps" # Where sweep_rules() keeps results it has worked out.
+SHOE_POOL_SIZE = 4 # Shuffled shoes a ShoePool keeps ready.
+RENDERERS = ("console", "null", "curses") # Renderers that make_renderer() knows.
+CURSES_SCROLLBACK = 500 # Lines a CursesRenderer keeps.
+METRICS_INTERVAL = 10.0 # Seconds between rewrites of a metrics file.
+METRIC_BUCKETS = (0.0001, 0.001, 0.01, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0) # Upper bounds in seconds of the latency histograms.
+SERVER_BACKLOG = 4096 # Connections the table server lets wait to be accepted.
+BENCHMARK_ROUNDS = 100 # Rounds in each scripted game timed by run_benchmarks().
+BENCHMARK_THRESHOLD = 10.0 # Percent slower than the baseline that counts as a regression.
+DEALER_CACHE_SIZE = 65536 # Most results kept by the dealer probability caches.
+DEALER_BUST = 22 # Index of a bust in the tuples from dealer_outcome_probabilities().
+ACTION_STAND = 0 # Choices stored in the strategy tables.
+ACTION_HIT = 1
+ACTION_DOUBLE = 2
+ACTION_SPLIT = 3
+STRATEGY_TABLE_SIZE = 22 * 2 * 2 * 12 # Hand values 0-21, soft, pair and face up card 0-11.
+PHASE_NAMES = ("refresh deck", "betting", "initial deal", "insurance", "split", "main hand",
+    "dealer", "settlements", "play again", "pauses") # Phases of a round timed by PhaseTimer.
+PHASE_REFRESH, PHASE_BETTING, PHASE_DEAL, PHASE_INSURANCE, PHASE_SPLIT, PHASE_MAIN_HAND, \
+    PHASE_DEALER, PHASE_SETTLEMENTS, PHASE_PLAY_AGAIN, PHASE_PAUSES = range(len(PHASE_NAMES))
+PHASE_BUCKETS = 64 # Histogram buckets per phase, bucket n holds times under 2**n nanoseconds.
+HISTORY_MAGIC = b"BJHH" # First bytes of a hand history file.
+HISTORY_VERSION = 1
+HISTORY_HAND_CARDS = 20 # Card slots per hand in a history record, no hand can hold more.
+HISTORY_BUFFER_RECORDS = 4096 # Records a HandHistoryWriter packs before writing them out.
+HISTORY_INSURANCE = 1 # Bits of the actions field of a history record.
+HISTORY_SPLIT = 2
+HISTORY_DOUBLE = 4
+HISTORY_DOUBLE2 = 8
+# File header: magic, version and record size.
+HISTORY_HEADER = struct.Struct("<4sHH")
+# Record: round number, balance after the round, opening bet, bet_amount, bet_amount2,
+# insurance_bet, net_win, actions, the number of cards in each hand, then the card ids of
+# the main hand, split hand and the House's hand.
+HISTORY_RECORD = struct.Struct(f"<QqiiiiiBBBB{HISTORY_HAND_CARDS}s{HISTORY_HAND_CARDS}s{HISTORY_HAND_CARDS}s")
+REPLAY_CHECKPOINT_ROUNDS = 1000 # Rounds between the checkpoints a Replay keeps for seeking.
+REPLAY_CHECKPOINT_SUFFIX = ".checkpoints" # Added to a decision log's path for the file of its saved checkpoints.
+SNAPSHOT_MAGIC = b"BJSS" # First bytes of a session snapshot file.
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SHOE_CARDS = 52 * 20 # Card slots for the shoe in a snapshot, up to 20 packs.
+# Snapshot: magic, version, snapshot size, rounds played, balance, opening bet, cut_num, number
+# of cards in the shoe (0 before the first shoe), cursor, the first 8 bytes of the House rules'
+# config_hash(), the random generator's 624 words and position, whether it holds a gauss()
+# value and the value, then the card ids of the shoe.
+SNAPSHOT = struct.Struct(f"<4sHHQqiiHH8s625IBd{SNAPSHOT_SHOE_CARDS}s")
+
+# Counters kept by Metrics, their Prometheus names and help text.
+METRIC_COUNTERS = (
+    ("blackjack_rounds_total", "Rounds played."),
+    ("blackjack_hands_total", "Player hands settled, two for a split."),
+    ("blackjack_shuffles_total", "Shoes shuffled by refresh_deck()."),
+    ("blackjack_house_top_ups_total", "Courtesy credits given by on_the_house()."),
+    ("blackjack_insurance_taken_total", "Insurance bets taken."),
+    ("blackjack_insurance_won_total", "Insurance bets won."),
+    ("blackjack_splits_total", "Hands split."),
+    ("blackjack_doubles_total", "Hands doubled down."),
+)
+METRIC_ROUNDS, METRIC_HANDS, METRIC_SHUFFLES, METRIC_TOP_UPS, METRIC_INSURANCE_TAKEN, METRIC_INSURANCE_WON, \
+    METRIC_SPLITS, METRIC_DOUBLES = range(len(METRIC_COUNTERS))
+# Latency histograms kept by Metrics, their Prometheus names and help text.
+METRIC_HISTOGRAMS = (
+    ("blackjack_decision_seconds", "Time the player took to answer each question."),
+    ("blackjack_dealer_seconds", "Time of the House's turn, from the face down card to its last card."),
+)
+METRIC_DECISION, METRIC_DEALER = range(len(METRIC_HISTOGRAMS))
+
+# Prompts and banners, formatted once with their highlights.
+YES_NO = "\033[93m(\033[00mY\033[93m)\033[00mes or \033[93m(\033[00mN\033[93m)\033[00mo: "
+PRESS_ENTER = "Press \033[93m<\033[00mEnter\033[93m>\033[00m to continue."
+HIT_OR_STAND = "\nWould you like to \033[93m(\033[00mH\033[93m)\033[00mit or \033[93m(\033[00mS\033[93m)\033[00mtand?: "
+DOUBLE_DOWN = "\nWould you like to double down? " + YES_NO
+PLAY_AGAIN = "Would you like to play again? " + YES_NO
+SUMMARY_BANNER = "\033[93m#####\033[00m  Game Summery  \033[93m#####\033[00m\n"
+# The colour codes used in the text above, and their parts for the curses renderer.
+ANSI_CODE = re.compile("\033\\[(\\d+)m")
+
 
 def intro():
     """A welcome message when starting the game.
@@ -52,69 +303,245 @@ def thank_you():
     print(f"Thank you for playing! \n\nA special thanks to everyone at Code in Place 2021.\n")
 
 
-def build_cards():
-    """Will generate 52 cards to make a deck in two loops, 1 nested.
-    Returns: 
-        deck_of_cards > list with sublist (integer, integer, string, string) as (Value of 2-11, Num 2-14 "Suit", "Card Name")
-        A List of all 52 cards each stored as a sublist (int value, int card num, str suit, str of name).
-    """    
-    # deck_of_cards is a list store nested list's.
-    # (int value, card_num, str suit, str of name)
-    deck_of_cards=[]
+def pause():
+    """Shows everything printed so far as one frame, then pauses for MED_PAUSE seconds
+        unless PAUSES_ON is False.
+    """
+    sys.stdout.flush()
+    if PAUSES_ON:
+        time.sleep(MED_PAUSE)
+
+
+def build_card_tables():
+    """Will generate the details of all 52 cards in two loops, 1 nested. Cards are stored
+        everywhere else as a small integer id (0-51), the details of a card are looked up
+        by its id in the tables returned here.
+    Returns:
+        card_values: Tuple of integer value 2-11 for each card id.
+        card_nums: Tuple of integer card num 2-14 for each card id.
+        card_suits: Tuple of string "Suit" for each card id.
+        card_names: Tuple of string "Card Name" for each card id.
+    """
+    card_values = []
+    card_nums = []
+    card_suits = []
+    card_names = []
     # Define each group by suit.
-    for suit_num in range (4):
-        if suit_num == 0:
-            suit_family = "Clubs"
-        elif suit_num == 1:
-            suit_family = "Diamonds"
-        elif suit_num == 2:
-            suit_family = "Hearts"
-        elif suit_num == 3:
-            suit_family = "Spades"
+    for suit_family in ("Clubs", "Diamonds", "Hearts", "Spades"):
         # Get each card value (13 total) for each given family.
-        # Value must start at 1 to build value starting with Ace.
-        card_num = 2
-        while card_num <= 14:
-            card_name = ""
-            if card_num <= 10 and card_num > 1:
-                card_name = (str(card_num)+" of "+str(suit_family))
-                card_value = int(card_num)
+        for card_num in range(2, 15):
+            if card_num <= 10:
+                card_name = (str(card_num)+" of "+suit_family)
+                card_value = card_num
             elif card_num == 11:
-                card_name = ("Jack of "+str(suit_family))
-                card_value = int(10)
+                card_name = ("Jack of "+suit_family)
+                card_value = 10
             elif card_num == 12:
-                card_name = ("Queen of "+str(suit_family))
-                card_value = int(10)
+                card_name = ("Queen of "+suit_family)
+                card_value = 10
             elif card_num == 13:
-                card_name = ("King of "+str(suit_family))
-                card_value = int(10)
-            elif card_num == 14:
-                card_name = ("Ace of "+str(suit_family))
-                card_value = int(11)
-            # card_data is temporary to hold values for each card as a list.
-            card_data = (int(card_value), int(card_num), str(suit_family), card_name)
-            # appends current card_data ot deck_of_cards list until all 52 cards are created.
-            deck_of_cards.append(card_data)
-            card_num += 1
-    return deck_of_cards
-
-
-def build_deck(NUM_OF_DECKS, pack_of_cards):
+                card_name = ("King of "+suit_family)
+                card_value = 10
+            else:
+                card_name = ("Ace of "+suit_family)
+                card_value = 11
+            card_values.append(card_value)
+            card_nums.append(card_num)
+            card_suits.append(suit_family)
+            card_names.append(card_name)
+    return tuple(card_values), tuple(card_nums), tuple(card_suits), tuple(card_names)
+
+
+# Lookup tables for card details, indexed by card id (0-51).
+CARD_VALUES, CARD_NUMS, CARD_SUITS, CARD_NAMES = build_card_tables()
+# A card id for each value 2-11 (index 0 and 1 unused), for working with values only.
+CARD_VALUE_IDS = (None, None) + tuple(CARD_VALUES.index(card_value) for card_value in range(2, 12))
+# Hi-Lo count of each card id: +1 for 2-6, 0 for 7-9 and -1 for 10's and Aces.
+CARD_HI_LO = tuple(1 if card_value <= 6 else -1 if card_value >= 10 else 0 for card_value in CARD_VALUES)
+
+
+class HouseRules:
+    """Every House rule of the game in one place. A shoe of num_decks packs is shuffled again
+        once it is down to a random cut_min to cut_max cards. The House keeps drawing while
+        behind the player, up to a random dealer_stop_min to dealer_stop_max. Insurance costs
+        insurance_rate of the bet, double down is offered on hands worth double_min to
+        double_max, and the bet on a split hand of 21 is multiplied by split_21_bonus.
+        With continuous_shuffle the shoe is a continuous shuffling machine instead: the
+        cards of each round go back in before the next, and there is no cut.
+        HOUSE_RULES are the rules of the console game, a HeadlessSession can have its own.
+    """
+    __slots__ = ("num_decks", "cut_min", "cut_max", "dealer_stop_min", "dealer_stop_max",
+                 "insurance_rate", "double_min", "double_max", "split_21_bonus", "continuous_shuffle")
+
+    def __init__(self, num_decks=NUM_OF_DECKS, cut_min=40, cut_max=70, dealer_stop_min=18, dealer_stop_max=19,
+                 insurance_rate=0.5, double_min=9, double_max=11, split_21_bonus=2, continuous_shuffle=False):
+        if cut_min > cut_max or dealer_stop_min > dealer_stop_max or double_min > double_max:
+            raise ValueError("A House rule's lowest value is more than its highest.")
+        self.num_decks = num_decks
+        self.cut_min = cut_min
+        self.cut_max = cut_max
+        self.dealer_stop_min = dealer_stop_min
+        self.dealer_stop_max = dealer_stop_max
+        self.insurance_rate = insurance_rate
+        self.double_min = double_min
+        self.double_max = double_max
+        self.split_21_bonus = split_21_bonus
+        self.continuous_shuffle = continuous_shuffle
+
+    def __repr__(self):
+        return "HouseRules(" + ", ".join(f"{name}={value!r}" for name, value in self.as_dict().items()) + ")"
+
+    def as_dict(self):
+        """Returns:
+            Dictionary of every rule by name.
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def config_hash(self):
+        """Returns:
+            String hash of the rules, the same for equal rules on any machine.
+        """
+        return hashlib.sha256(json.dumps(self.as_dict(), sort_keys=True).encode()).hexdigest()
+
+    @property
+    def dealer_stops(self):
+        # Every max_num the House can pick in dealer_plays_hand(), all equally likely.
+        return range(self.dealer_stop_min, self.dealer_stop_max + 1)
+
+
+# The House rules of the console game.
+HOUSE_RULES = HouseRules()
+
+
+def parse_rules(settings, rules=None):
+    """Reads House rules from strings like "num_decks=6".
+    Inputs:
+        settings: List of strings of FIELD=VALUE, a field of HouseRules and its value.
+        rules: HouseRules to start from, default HOUSE_RULES.
+    Returns:
+        rules: New HouseRules with the settings changed.
+    """
+    values = (rules or HOUSE_RULES).as_dict()
+    for setting in settings:
+        name, _, value = setting.partition("=")
+        if name not in values:
+            raise ValueError(f"Unknown House rule {name!r}, choose from: {', '.join(values)}")
+        if isinstance(values[name], bool):
+            values[name] = value.lower() in ("1", "true", "yes", "y", "on")
+        else:
+            values[name] = type(values[name])(value)
+    return HouseRules(**values)
+
+
+class Shoe:
+    """A playing deck of card ids stored in a bytearray. Cards are dealt by moving a cursor
+        along the array rather than removing them, and shuffling reuses the same array.
+        As each card is dealt the shoe updates remaining, the count of each card value 2-11
+        still to deal, and running_count, the Hi-Lo count of the cards dealt, so neither
+        ever needs the cards counted again.
+    """
+    __slots__ = ("cards", "cursor", "full_counts", "remaining", "running_count")
+
+    def __init__(self, cards):
+        self.cards = bytearray(cards)
+        full_counts = [0] * 10
+        for card in self.cards:
+            full_counts[CARD_VALUES[card] - 2] += 1
+        self.full_counts = tuple(full_counts)
+        self.restart()
+
+    def __len__(self):
+        # Number of cards left to deal.
+        return len(self.cards) - self.cursor
+
+    def deal(self):
+        """Deals the next card.
+        Returns:
+            card: Integer card id.
+        """
+        card = self.cards[self.cursor]
+        self.cursor += 1
+        self.remaining[CARD_VALUES[card] - 2] -= 1
+        self.running_count += CARD_HI_LO[card]
+        return card
+
+    def shuffle(self, rng=random):
+        """Puts every card back and shuffles the shoe in place.
+        Inputs:
+            rng: Random generator to shuffle with, default the random module.
+        """
+        rng.shuffle(self.cards)
+        self.restart()
+
+    def reinsert(self, rng=random):
+        """Puts every card dealt back in, as a continuous shuffling machine does after each
+            round, without shuffling the shoe. Working back from the last card dealt, each
+            card swaps with a random card at or after its place, one step of a Fisher-Yates
+            shuffle, so the shoe stays in a uniformly random order for one swap per card.
+        Inputs:
+            rng: Random generator to place the cards with, default the random module.
+        """
+        cards = self.cards
+        num_cards = len(cards)
+        for position in range(self.cursor - 1, -1, -1):
+            swap = rng.randrange(position, num_cards)
+            cards[position], cards[swap] = cards[swap], cards[position]
+        self.restart()
+
+    def restart(self, cursor=0):
+        """Deals again from a card without shuffling, and counts the cards before it.
+        Inputs:
+            cursor: Integer position of the next card to deal.
+        """
+        self.cursor = cursor
+        self.remaining = list(self.full_counts)
+        self.running_count = 0
+        for card in self.cards[:cursor]:
+            self.remaining[CARD_VALUES[card] - 2] -= 1
+            self.running_count += CARD_HI_LO[card]
+
+    @property
+    def true_count(self):
+        # Running count per pack of cards left to deal.
+        return self.running_count * 52 / max(len(self), 1)
+
+    def unseen_counts(self, hidden_cards=()):
+        """Counts of each card value the player has not seen: the cards left to deal and any
+            dealt face down.
+        Inputs:
+            hidden_cards: Card ids dealt but not shown, such as the House's face down card.
+        Returns:
+            counts: List of 10 integer counts, for card values 2 to 11 in order.
+        """
+        counts = list(self.remaining)
+        for card in hidden_cards:
+            counts[CARD_VALUES[card] - 2] += 1
+        return counts
+
+
+def build_cards():
+    """Will generate the 52 cards to make a pack of cards.
+    Returns:
+        pack_of_cards: bytes of the 52 card ids, details are found in CARD_VALUES,
+            CARD_NUMS, CARD_SUITS and CARD_NAMES.
+    """
+    return bytes(range(52))
+
+
+def build_deck(NUM_OF_DECKS, pack_of_cards, card_deck=None):
     """Takes number packs needed to build playing deck of cards, 
         then shuffles them in random order.
     Inputs:
         NUM_OF_DECKS:  Integer number of packs of cards used in a playing deck.
-        pack_of_cards: List with sublist (integer, integer, string, string) as (Value of 2-11, Num 2-14, "Suit", "Card Name")
-        A List of all 52 cards each stored as a sublist (int value, int card num, str suit, str of name).
+        pack_of_cards: bytes of the 52 card ids in a pack.
+        card_deck: Shoe to shuffle again in place, None to build a new Shoe.
     Returns:
-        card_deck: List with sublist (integer, integer, string, string) as (Value of 2-11, Num 2-14, "Suit", "Card Name")
-        Multiple decks of cards combined and shuffled and ready to be dealt.
-    """    
-    card_deck = []
-    for i in range (NUM_OF_DECKS):
-        card_deck.extend(pack_of_cards)
+        card_deck: Shoe of multiple decks of cards combined and shuffled and ready to be dealt.
+    """
+    if card_deck is None:
+        card_deck = Shoe(pack_of_cards * NUM_OF_DECKS)
     # Shuffles all cards in the deck.
-    random.shuffle(card_deck)
+    card_deck.shuffle()
     print("\nShuffling new deck...\n")
     return card_deck
 
@@ -124,23 +551,26 @@ def refresh_deck(card_deck, pack_of_cards, NUM_OF_DECKS, cut_num):
         Will also check how often deck needs to be reshuffled from the radom cut.
         Most work is done in build_deck(), this just decides when to do it again.
     Inputs:
-        card_deck List with sublist (integer, integer, string, string) as (Value of 2-11, Num 2-14, "Suit", "Card Name")
-            Multiple decks of cards combined and shuffled and ready to be dealt.
-        pack_of_cards List with sublist (integer, integer, string, string) as (Value of 2-11, Num 2-14, "Suit", "Card Name")
+        card_deck: Shoe of multiple decks of cards combined and shuffled and ready to be dealt,
+            None before the first round.
+        pack_of_cards: bytes of the 52 card ids in a pack.
         NUM_OF_DECKS: Constant to determine how many decks are used.
         cut_num: Integer for random number, to determine when to cut cards again.
 
     Returns:
-        card_deck: list of cards refreshed.
+        card_deck: Shoe of cards refreshed.
         cut_num: Integer for random number, to determine when to cut cards again.
     """    
+    # A continuous shuffling machine takes back the last round's cards, there is no cut.
+    if HOUSE_RULES.continuous_shuffle and card_deck is not None:
+        card_deck.reinsert()
+        return card_deck, cut_num
     # Build a playing deck with multiple packs of cards and then shuffles them.
     # Will also check how often deck needs to be reshuffled from the radom cut.
-    cards_left = len(card_deck)
-    if cut_num == 0 or cards_left <= cut_num:
-        card_deck = build_deck(NUM_OF_DECKS, pack_of_cards)
-        cut_num = random.randint(40, 70) 
-        time.sleep(MED_PAUSE) 
+    if cut_num == 0 or len(card_deck) <= cut_num:
+        card_deck = build_deck(NUM_OF_DECKS, pack_of_cards, card_deck)
+        cut_num = random.randint(HOUSE_RULES.cut_min, HOUSE_RULES.cut_max) 
+        pause() 
     return card_deck, cut_num
 
 
@@ -155,8 +585,8 @@ def on_the_house(player_balance):
         player_balance += 500
         print("Have some fun with an extra 500 credits, courtesy of the House.")
         print(f"Player's new balance is: {player_balance} credits")
-        time.sleep(MED_PAUSE)
-        input("Press \033[93m<\033[00mEnter\033[93m>\033[00m to continue.")
+        pause()
+        input(PRESS_ENTER)
     return player_balance
 
 
@@ -184,30 +614,28 @@ def get_opening_bet(player_balance):
 def start_player_cards(card_deck):
     """removes data of 2 cards from card_deck to player_hand and returns both.
     Inputs:
-        card_deck: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name")
-        A List of all 52 cards each stored as a sublist (int value, int card num, str suit, str of name).
+        card_deck: Shoe of card ids ready to be dealt.
     Returns:
-        player_hand: List updated with new cards added to list.
-        card_deck:: List updated with cards removed from the list.
+        player_hand: Hand updated with new cards added to it.
+        card_deck:: Shoe updated with cards dealt.
     """    
-    player_hand = []
+    player_hand = Hand()
     for i in range(2):
-        player_hand.append(card_deck.pop())
+        player_hand.add(card_deck.deal())
     return player_hand, card_deck
 
 
 def start_dealer_cards(card_deck):
     """removes data of 2 cards from card_deck to dealer_hand and returns both.
     Inputs:
-        card_deck: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name")
-        A List of all 52 cards each stored as a sublist (int value, int card num, str suit, str of name).
+        card_deck: Shoe of card ids ready to be dealt.
     Returns:
-        dealer_hand: Updated with 2 cards that previously existed in card_deck.
-        card_deck: Updated with the removed card data that has been moved to player_hand list.
+        dealer_hand: Hand updated with 2 cards that previously existed in card_deck.
+        card_deck: Shoe updated with cards dealt.
     """  
-    dealer_hand = []
+    dealer_hand = Hand()
     for i in range(2):
-        dealer_hand.append(card_deck.pop())
+        dealer_hand.add(card_deck.deal())
     return dealer_hand, card_deck
 
 
@@ -215,105 +643,149 @@ def player_starting_data(player_hand):
     """Designed to be used once and display the players starting hand after being dealt. It will import
         player_hand and display both cards and it's value. Nothing to return.
     Inputs:
-        player_hand: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name"). 
+        player_hand: Hand of card ids.
     """    
     # Get value of cards.
     # Display the Players hand.
     player_hand_value = get_hand_value(player_hand)
-    print(f"\nPlayer has cards: {player_hand[0][3]} and {player_hand[1][3]}.  (Value of: {player_hand_value})")
+    print(f"\nPlayer has cards: {CARD_NAMES[player_hand[0]]} and {CARD_NAMES[player_hand[1]]}.  (Value of: {player_hand_value})")
 
 
 def dealer_starting_data(dealer_hand):
     """Designed to be used once and display the dealers starting hand after being dealt. It will import
         dealer_hand and display first card down(no info) and second card up with it's value. Nothing to return.
     Inputs:
-        dealer_hand: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name").
+        dealer_hand: Hand of card ids.
     """    
     # Display The Dealers hand.
-    print(f"House has cards: (Face Down) and {dealer_hand[1][3]}.  (Value of: {dealer_hand[1][0]}+)")
+    print(f"House has cards: (Face Down) and {CARD_NAMES[dealer_hand[1]]}.  (Value of: {CARD_VALUES[dealer_hand[1]]}+)")
+
+
+class Hand:
+    """A hand of card ids that keeps its value up to date as each card is added, so the
+        cards never need to be counted again. value is the best total of the hand, with
+        Aces counted as 11 until that would go over 21, and soft_aces is how many Aces
+        are still counted as 11.
+    """
+    __slots__ = ("cards", "value", "soft_aces")
+
+    def __init__(self, cards=()):
+        self.cards = []
+        self.value = 0
+        self.soft_aces = 0
+        for card in cards:
+            self.add(card)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __getitem__(self, index):
+        return self.cards[index]
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def add(self, card):
+        """Adds a card to the hand and updates its value.
+        Inputs:
+            card: Integer card id.
+        """
+        self.cards.append(card)
+        card_value = CARD_VALUES[card]
+        self.value += card_value
+        if card_value == 11:
+            self.soft_aces += 1
+        # Count Aces as 1 instead of 11 while bust.
+        while self.value > 21 and self.soft_aces:
+            self.value -= 10
+            self.soft_aces -= 1
+
+    def pop(self, index=-1):
+        """Removes a card from the hand, used when splitting.
+        Inputs:
+            index: Integer position of the card to remove.
+        Returns:
+            card: Integer card id removed.
+        """
+        card = self.cards.pop(index)
+        remaining = self.cards
+        self.cards = []
+        self.value = 0
+        self.soft_aces = 0
+        for remaining_card in remaining:
+            self.add(remaining_card)
+        return card
+
+    @property
+    def is_soft(self):
+        # An Ace is still counted as 11.
+        return self.soft_aces > 0
+
+    @property
+    def is_blackjack(self):
+        # A natural 21 with the first two cards.
+        return self.value == 21 and len(self.cards) == 2
+
+    @property
+    def is_bust(self):
+        return self.value > 21
 
 
 def get_hand_value(player_hand):
-    """Imports a hand of cards, then loops through to get a value the hand is worth. It will decide
-        if the Ace's are to be counted as 1 or 11. then return the final value as integer.
+    """Gets the value of a hand of cards. Aces count as 11, or as 1 when 11 would bust.
+        The value is kept up to date by Hand.add(), so nothing is counted here.
     Inputs:
-        player_hand: List with sublist (integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name").
+        player_hand: Hand of card ids.
     Returns:
         player_hand_value: Integer reflecting scoring value from player_hand.
     """    
-    player_hand_value = 0
-    num_of_aces = 0
-    # loop for each card in hand, add to player value.
-    for i in range(len(player_hand)):
-        player_hand_value += player_hand[i][0]
-        if player_hand[i][0] == 11:
-            num_of_aces += 1
-    # test how to handle for Aces of 1 or 11.
-    # Under 21, safe and return.
-    if player_hand_value <= 21: 
-        return player_hand_value
-    # No aces and bust.
-    elif num_of_aces == 0 and player_hand_value > 21:
-        return player_hand_value
-    # For each Ace while bust, reflect new value and return.
-    else:
-        for i in range(num_of_aces):
-            if player_hand_value > 21:
-                player_hand_value -= 10
-            else:
-                return player_hand_value
-        return int(player_hand_value)
+    return player_hand.value
 
 
 def display_full_hand(source_hand, name):
     """Takes the source_hand of given cards, and then prints out the list of card names ("8 of Hearts")
         and returns nothing.
     Inputs:
-        source_hand: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name") 
+        source_hand: Hand of card ids.
         name: A string for "Name" of who's hand the cards belong to.
     """    
-    cards_in_hand = []
-    for i in range(len(source_hand)):
-        cards_in_hand.append(source_hand[i][3])
-    # Display cards in hand.
-    print(f'{name} has cards: {", ".join(cards_in_hand)}')
+    cards_in_hand = ", ".join([CARD_NAMES[card] for card in source_hand])
     player_hand_value = get_hand_value(source_hand)
-    # Display the value of those cards.
-    print(f"{name} hand value is: {player_hand_value}")
+    # Display cards in hand and the value of those cards.
+    print(f"{name} has cards: {cards_in_hand}\n{name} hand value is: {player_hand_value}")
 
 
 def deal_new_card(source, destination, name):
     """Takes part of a list representing value's of the card from card_pack and moves it to the select hand of cards.
         Prints which card is dealt and then returns both updated list.
     Inputs:
-        source: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name")
-                such as card_deck.
-        destination: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name")
-                such as players_hand or dealers_hand
+        source: Shoe of card ids such as card_deck.
+        destination: Hand of card ids such as players_hand or dealers_hand
         name: A string for "Name" of who's hand the cards belong to.
     Returns:
-        source: Updated to reflect card removed from its list.
+        source: Updated to reflect card dealt.
         destination: Updated to reflect new card added to its list.
     """    
     # Move card from deck to hand.
-    destination.append(source.pop())
+    destination.add(source.deal())
     # Get length of card deck.
     last_card_num = len(destination)
     last_card_num -= 1
     # Print's string name of last card dealt.
-    print(f"{name} is dealt card: {destination[last_card_num][3]}")
+    print(f"{name} is dealt card: {CARD_NAMES[destination[last_card_num]]}")
     return source, destination
 
 
-def get_insurance(dealer_hand, player_hand, bet_amount, player_balance):
+def get_insurance(dealer_hand, player_hand, bet_amount, player_balance, card_deck=None):
     """If dealer has an ace face up and the player has large enough balance, the player is presented with an 
         option to buy insurance if they choose to do so. The insurance_bet value will be updated and returned 
         with game_push to be later tracked for future events.
     Inputs:
-        dealer_hand: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name").
-        player_hand: list with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name").
+        dealer_hand: Hand of card ids.
+        player_hand: Hand of card ids.
         bet_amount: Integer value for the players current bet.
         player_balance: The running balance of credits teh player has available.
+        card_deck: Shoe being dealt from, to show the player what insurance is worth. None to not show it.
     Returns:
         insurance_bet: Integer representing value of the player taking insurance to be applied against their balance.
         game_push: Boolean to determine if during insurance bet a Push game happened and skip rest of the game.
@@ -326,15 +798,19 @@ def get_insurance(dealer_hand, player_hand, bet_amount, player_balance):
         insurance_bet = 0
         return insurance_bet, game_push
     # Get cost of insurance.
-    insurance_bet = round(bet_amount / 2) #House rules
+    insurance_bet = round(bet_amount * HOUSE_RULES.insurance_rate) #House rules
     # Check if dealer face up card has an Ace.
-    if dealer_hand[1][0] == 11 and player_balance >= insurance_bet:
+    if CARD_VALUES[dealer_hand[1]] == 11 and player_balance >= insurance_bet:
         while True: 
             try:
                 # Ace found, player prompted to purchase insurance.
                 print(f"\nThe House has an Ace. Your balance is: {(player_balance - bet_amount)} credits")
+                if card_deck is not None:
+                    # From the cards the player has not seen, which includes the face down card.
+                    chance = ten_chance(card_deck.unseen_counts((dealer_hand[0],)))
+                    print(f"Chance of a 10 under the Ace: {100 * chance:.1f}%  Insurance is worth: {insurance_value(chance, insurance_bet):+.1f} credits")
                 # "Would you like to buy insurance for {insurance_bet} credits? (Y)es or (N)o: "
-                user_action = str(input(f"Would you like to buy insurance for {insurance_bet} credits? \033[93m(\033[00mY\033[93m)\033[00mes or \033[93m(\033[00mN\033[93m)\033[00mo: ")) 
+                user_action = str(input(f"Would you like to buy insurance for {insurance_bet} credits? {YES_NO}")) 
                 user_action = user_action.lower()
                 if user_action == "y":
                     user_action = "yes"
@@ -343,8 +819,8 @@ def get_insurance(dealer_hand, player_hand, bet_amount, player_balance):
                 # Player buys insurance
                 if user_action == "yes":
                     #Dealer has blackjack
-                    if dealer_hand[0][0] == 10:
-                        print(f"Dealer revels face down card: {dealer_hand[0][3]}")
+                    if CARD_VALUES[dealer_hand[0]] == 10:
+                        print(f"Dealer revels face down card: {CARD_NAMES[dealer_hand[0]]}")
                         insurance_bet = round(insurance_bet * 2)
                         print(f"Players insurance payout is {insurance_bet} credits.")
                         player_hand_value = get_hand_value(player_hand)
@@ -355,7 +831,7 @@ def get_insurance(dealer_hand, player_hand, bet_amount, player_balance):
                         print(f"The House does not have 21. Insurance bet is lost.")
                         insurance_bet = insurance_bet * -1
                     print(f" Your balance is: {(player_balance - bet_amount) + (insurance_bet)} credits")
-                    input("Press \033[93m<\033[00mEnter\033[93m>\033[00m to continue.\n")
+                    input(PRESS_ENTER + "\n")
                     break
                 # Player does not buy insurance.        
                 elif user_action == "no":
@@ -374,13 +850,12 @@ def double_down(card_deck, player_hand, bet_amount, player_balance):
         player_balance has enough credits to cover the bet.
         If they do a new card will be added to their hand and bet amount is doubled. 
     Inputs:
-        card_deck: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name")
-            A List of all 52 cards each stored as a sublist (int value, int card num, str suit, str of name).
-        player_hand: list with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name").
+        card_deck: Shoe of card ids ready to be dealt.
+        player_hand: Hand of card ids.
         bet_amount: Integer value of the current bet amount.
         player_balance: Integer reflecting current value of credits in players bank.
     Returns:
-        card_deck: List will reflect the new missing card data.
+        card_deck: Updated to reflect the card dealt.
         player_hand: List will reflect new data added.
         bet_amount: Updated to reflect players choice on bet.
     """
@@ -388,11 +863,11 @@ def double_down(card_deck, player_hand, bet_amount, player_balance):
     player_hand_value = get_hand_value(player_hand)
 
     #Ask player to double down if 2 cards match and has enough balance to cover bet.
-    if player_hand_value >= 9 and player_hand_value <= 11 and (player_balance >= (2 * bet_amount)):
+    if player_hand_value >= HOUSE_RULES.double_min and player_hand_value <= HOUSE_RULES.double_max and (player_balance >= (2 * bet_amount)):
         while True: 
             try:
                 # Ask user "Would you like to double down? (Y)es or (N)o: "
-                user_action = str(input(f"\nWould you like to double down? \033[93m(\033[00mY\033[93m)\033[00mes or \033[93m(\033[00mN\033[93m)\033[00mo: "))
+                user_action = str(input(DOUBLE_DOWN))
                 user_action = user_action.lower()
                 if user_action == "y":
                     user_action = "yes"
@@ -417,11 +892,10 @@ def hit_or_stand(card_deck, player_hand):
         card data will be removed from card_deck list and added to player_hand list. If they
         get blackjack or bust they'll be forced to continue forward.
     Inputs:
-        card_deck: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name")
-            A List of all 52 cards each stored as a sublist (int value, int card num, str suit, str of name).
-        player_hand: list with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name").
+        card_deck: Shoe of card ids ready to be dealt.
+        player_hand: Hand of card ids.
     Returns:
-        card_deck: Updated to reflect cards removed from list.
+        card_deck: Updated to reflect cards dealt.
         player_hand: Updated to reflect cards added to list.
     """
 
@@ -432,7 +906,7 @@ def hit_or_stand(card_deck, player_hand):
     while True: 
         try:
             # Ask user "Would you like to (H)it or (S)tand?: "
-            user_action = str(input(f"\nWould you like to \033[93m(\033[00mH\033[93m)\033[00mit or \033[93m(\033[00mS\033[93m)\033[00mtand?: "))
+            user_action = str(input(HIT_OR_STAND))
             user_action = user_action.lower()
             if user_action == "s":
                 user_action = "stand"
@@ -443,7 +917,7 @@ def hit_or_stand(card_deck, player_hand):
                 card_deck, player_hand = deal_new_card(card_deck, player_hand, "Player")
                 display_full_hand(player_hand, "Player")
                 player_hand_value = get_hand_value(player_hand)
-                time.sleep(MED_PAUSE) 
+                pause() 
             # User decides to "stand".
             if user_action == "stand":
                 print(f"Player stands with a value of {player_hand_value}\n")
@@ -459,7 +933,7 @@ def hit_or_stand(card_deck, player_hand):
         except ValueError:
             continue
     # "Press <Enter> to continue."
-    input("Press \033[93m<\033[00mEnter\033[93m>\033[00m to continue.")
+    input(PRESS_ENTER)
     print("") #extra space after enter is pressed.
     return card_deck, player_hand
 
@@ -470,27 +944,26 @@ def player_split_hand(card_deck, player_hand, player_balance, bet_amount):
         and equal bet value will be applied to bet_amount2. Each hand will be dealt an extra card and 
         in this function the player will play the split hand.
     Inputs:
-        card_deck: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name")
-            A List of all 52 cards each stored as a sublist (int value, int card num, str suit, str of name).
-        player_hand: list with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name") 
+        card_deck: Shoe of card ids ready to be dealt.
+        player_hand: Hand of card ids.
         player_balance: Integer reflecting current value of credits in players bank.
         bet_amount: Integer value of the current bet amount.
     Returns:
-        card_deck: Updated to reflect cards removed from list.
+        card_deck: Updated to reflect cards dealt.
         player_hand: Updated to reflect cards removed and added to list.
         player_hand2: Updated to reflect cards added to list.
         bet_amount2: Integer valued added based on bet_amount and user choices.
     """    
     # Defined blank list and variable for later use.
-    player_hand2 = []
+    player_hand2 = Hand()
     bet_amount2 = 0
     # Checks if the players hand has two matching chards to split.
-    if player_hand[0][0] == player_hand[1][0] and player_balance >= (bet_amount * 2):
+    if CARD_VALUES[player_hand[0]] == CARD_VALUES[player_hand[1]] and player_balance >= (bet_amount * 2):
         while True:
             try:
                 print(f"\nYour balance is: {(player_balance - bet_amount)} credits.")
                 # Ask user "Would you like to split for bet_amount credits? (Y)es or (No): "
-                user_action = input(f"Would you like to split for {bet_amount} credits? \033[93m(\033[00mY\033[93m)\033[00mes or \033[93m(\033[00mN\033[93m)\033[00mo: ")
+                user_action = input(f"Would you like to split for {bet_amount} credits? {YES_NO}")
                 if user_action == "y":
                     user_action = "yes"
                 elif user_action == "n":
@@ -498,25 +971,25 @@ def player_split_hand(card_deck, player_hand, player_balance, bet_amount):
                 # Player does split
                 if user_action == "yes":
                     print("Player has chosen to split.\n")
-                    time.sleep(MED_PAUSE)
+                    pause()
                     # Move 1 card from first hand to a new hand.
-                    player_hand2.append(player_hand.pop(0))
+                    player_hand2.add(player_hand.pop(0))
                     bet_amount2 = bet_amount
-                    print(f"Player first hand has: {player_hand2[0][3]}")
+                    print(f"Player first hand has: {CARD_NAMES[player_hand2[0]]}")
                     # Deal new card for second hand.
                     card_deck, player_hand2 = deal_new_card(card_deck, player_hand2, "Player")
                     display_full_hand(player_hand2, "Player")
                     player_hand2_value = get_hand_value(player_hand2)
                     if player_hand2_value == 21:
                         print(f"Blackjack, Congratulations! {player_hand2_value}.\n")
-                        bet_amount2 = bet_amount2 * 2 #We are extra friendly, 4:1
+                        bet_amount2 = bet_amount2 * HOUSE_RULES.split_21_bonus #We are extra friendly, 4:1
                     else:
                         # Ask player to double down.
                         card_deck, player_hand2, bet_amount2 = double_down(card_deck, player_hand2, bet_amount2, player_balance)
                         # Let user begin to play split hand.
                         card_deck, player_hand2 = hit_or_stand(card_deck, player_hand2)
                     # Deal remaning hand player_hand a new replacement card and exit.
-                    print(f"Player second hand has: {player_hand[0][3]}")
+                    print(f"Player second hand has: {CARD_NAMES[player_hand[0]]}")
                     card_deck, player_hand = deal_new_card(card_deck, player_hand, "Player")
                     display_full_hand(player_hand, "Player")
                     break
@@ -532,13 +1005,12 @@ def player_main_hand(card_deck, player_hand, bet_amount, player_balance):
     """Final interaction of choices player has in the round to play their hand of cards without going bust. 
         including options to double down, hit and stand with their cards dealt.
     Inputs:
-        card_deck: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name")
-            A List of all 52 cards each stored as a sublist (int value, int card num, str suit, str of name).
-        player_hand: list with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name"). 
+        card_deck: Shoe of card ids ready to be dealt.
+        player_hand: Hand of card ids. 
         bet_amount: Integer value of the current bet amount.
         player_balance: Integer reflecting current value of credits in players bank.
     Returns:
-        card_deck: Updated to reflect cards removed from list.
+        card_deck: Updated to reflect cards dealt.
         player_hand: Updated to reflect cards added to list.
         bet_amount: Integer valued of the players associated bet
     """
@@ -550,7 +1022,7 @@ def player_main_hand(card_deck, player_hand, bet_amount, player_balance):
         print(f"Blackjack, Congratulations! Player has natural {player_hand_value}.\n")
         #bet_amount = bet_amount * 2 #We can be extra friendly, 4:1
         # "Press <Enter> to continue."
-        input("Press \033[93m<\033[00mEnter\033[93m>\033[00m to continue.")
+        input(PRESS_ENTER)
         print() #Space it out
         return card_deck, player_hand, bet_amount
 
@@ -568,13 +1040,12 @@ def dealer_plays_hand(card_deck, dealer_hand, player_hand, player_hand2):
     """Dealer attempts to beat player hand(S) without going bust. It first determines which player_hand is larger in value,
         bust not bust; hand1 or hand2. Once determined the Dealer will attempt to get a higher value with its hand and exit.
     Inputs:
-        card_deck card_deck: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name")
-            A List of all 52 cards each stored as a sublist (int value, int card num, str suit, str of name).
-        dealer_hand: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name"). 
-        player_hand: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name"). 
-        player_hand2 List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name"). 
+        card_deck card_deck: Shoe of card ids ready to be dealt.
+        dealer_hand: Hand of card ids.
+        player_hand: Hand of card ids.
+        player_hand2 Hand of card ids.
     Returns:
-        card_deck: Updated to reflect cards removed from list.
+        card_deck: Updated to reflect cards dealt.
         dealer_hand: Updated to reflect cards added to list.
     """
     player_hand_value1 = get_hand_value(player_hand)
@@ -590,22 +1061,22 @@ def dealer_plays_hand(card_deck, dealer_hand, player_hand, player_hand2):
         player_winning_hand = player_hand_value1
 
     # Prints dealers current cards to remind the player.
-    print(f"Dealer reveals the face down card: {dealer_hand[0][3]}.")
+    print(f"Dealer reveals the face down card: {CARD_NAMES[dealer_hand[0]]}.")
     #print(f"The Houses hand value is: {dealer_hand_value}").
     display_full_hand(dealer_hand, "The House")
     print("")
-    time.sleep(MED_PAUSE)
+    pause()
 
     # Dealer will deal new cards in attempt to beat the players cards.
     if player_winning_hand <= 21:
-        max_num = random.randint(18, 19)
+        max_num = random.randint(HOUSE_RULES.dealer_stop_min, HOUSE_RULES.dealer_stop_max)
         # Random max number dealer feels lucky to go to  without busting.
         while dealer_hand_value <= max_num and dealer_hand_value < player_winning_hand:
             card_deck, dealer_hand = deal_new_card(card_deck, dealer_hand, "The House")
             display_full_hand(dealer_hand, "The House")
             dealer_hand_value = get_hand_value(dealer_hand)
             print()
-            time.sleep(MED_PAUSE)
+            pause()
 
     # Check if the dealer has Blackjack.
     if dealer_hand_value == 21:
@@ -614,7 +1085,7 @@ def dealer_plays_hand(card_deck, dealer_hand, player_hand, player_hand2):
     if dealer_hand_value > 21:
         print("Bust, the House has more than 21.\n")
     #"Press <Enter> to continue."
-    input("Press \033[93m<\033[00mEnter\033[93m>\033[00m to continue.")
+    input(PRESS_ENTER)
     print("") #give space, after user hit enter.
     return card_deck, dealer_hand
 
@@ -623,9 +1094,9 @@ def settlements(dealer_hand, player_hand, player_hand2, bet_amount, bet_amount2,
     """Will take in all needed game data for the round, determine the winner for each hand and 
         payoff / collect current bets. The final information is displayed in a summery for the user.
     Inputs:
-        dealer_hand: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name"). 
-        player_hand: List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name"). 
-        player_hand2 List with sublist (integer, integer, string, string) as (Value of 2-11, 2-14, "Suit", "Card Name").
+        dealer_hand: Hand of card ids.
+        player_hand: Hand of card ids.
+        player_hand2 Hand of card ids.
         bet_amount: Integer value of the current bet amount.
         bet_amount2: Integer value of the current bet amount.
         player_balance: Integer reflecting current value of credits in players bank. 
@@ -636,7 +1107,7 @@ def settlements(dealer_hand, player_hand, player_hand2, bet_amount, bet_amount2,
     player_hand_value2 = get_hand_value(player_hand2)
     dealer_hand_value = get_hand_value(dealer_hand)
 
-    print("\033[93m#####\033[00m  Game Summery  \033[93m#####\033[00m\n")
+    print(SUMMARY_BANNER)
     # Check if split was happened, then post if yes.
     if player_hand_value2 > 0:
         # Player bust.
@@ -669,12 +1140,12 @@ def settlements(dealer_hand, player_hand, player_hand2, bet_amount, bet_amount2,
         # Display summery of hand2 (split).
         display_full_hand(player_hand2, "Player")
         display_full_hand(dealer_hand, "The House")
-        time.sleep(MED_PAUSE)
+        pause()
         print(str(f"\n{who_won}"))
         print(str(f"{bet_summery}\n"))
         # "Press <Enter> to continue."
-        input("Press \033[93m<\033[00mEnter\033[93m>\033[00m to continue.\n")
-        time.sleep(MED_PAUSE)
+        input(PRESS_ENTER + "\n")
+        pause()
 
     #For first hand of cards.
     if player_hand_value1 > 21:
@@ -707,12 +1178,12 @@ def settlements(dealer_hand, player_hand, player_hand2, bet_amount, bet_amount2,
     # Display summery.
     display_full_hand(player_hand, "Player")
     display_full_hand(dealer_hand, "The House")
-    time.sleep(MED_PAUSE)
+    pause()
     print(str(f"\n{who_won}"))
     print(str(f"{bet_summery}"))
     print(f"\nFinal player balance is: {player_balance} credits")
     print(f"--------------------------\n")
-    time.sleep(MED_PAUSE)
+    pause()
     return int(player_balance)
 
 
@@ -726,7 +1197,7 @@ def play_another_game():
         try:
             # Ask if player wants to play again or exit.
             # "Would you like to play again? (Y)es or (N)o: "
-            user_action = str(input("Would you like to play again? \033[93m(\033[00mY\033[93m)\033[00mes or \033[93m(\033[00mN\033[93m)\033[00mo: "))
+            user_action = str(input(PLAY_AGAIN))
             user_action = user_action.lower()
             if user_action == "y":
                 user_action = "yes"
@@ -746,43 +1217,85 @@ def play_another_game():
     return play_again
 
 
-def blackjack():
+def blackjack(phase_timer=None, history=None, decisions=None, metrics=None, snapshot=None):
     """The core function for controlling flow of the game of blackjack. Will run in loop
         until play_another_game() prompts the user to exit. It will collect bets,
         deal cards and payout bets until the player wishes to end.
         
         There are no pre or post requisites.
+    Inputs:
+        phase_timer, history, decisions, metrics, snapshot: As blackjack_rounds().
+    """
+    for round_result in blackjack_rounds(phase_timer, history, decisions, metrics, snapshot):
+        pass
+
+
+def blackjack_rounds(phase_timer=None, history=None, decisions=None, metrics=None, snapshot=None):
+    """The loop of blackjack() as a generator, yielding a RoundResult once each round is
+        settled, before asking to play again. Nothing is kept from earlier rounds, so a
+        caller can pass the results on to its own stats or logs as the game goes.
+    Inputs:
+        phase_timer: PhaseTimer to time each phase of every round, None to not time anything.
+        history: HandHistoryWriter to record every round, None to not record them.
+        decisions: DecisionRecorder told the balance at the end of every round, None when
+            the game is not recorded.
+        metrics: Metrics to count every round in, None to not count them.
+        snapshot: String path the game is saved to after every round, and carried on
+            from if it already exists. None to not save the game.
     """
     #Starting credit balance in the players bank.
     player_balance = STARTING_BALANCE
     
-    #Deck of cards to be used in game.
-    card_deck = []
+    #Deck of cards to be used in game, built by the first refresh_deck().
+    card_deck = None
     # A future random number to be used where the cut is in the deck.
     cut_num = int(0)
     play_again = True
+    round_num = 0
+    # Carry on a saved game, with the same shoe and random numbers it would have had.
+    if snapshot is not None and os.path.exists(snapshot):
+        round_num, player_balance, card_deck, cut_num, rng_state, opening_bet = read_snapshot(snapshot)
+        random.setstate(rng_state)
+        print(f"\nWelcome back, carrying on from round {round_num + 1} with a balance of {player_balance} credits.")
     # Builds a playing deck of 52 cards to be used in the game.
     pack_of_cards = build_cards()
+    # Each phase below is timed from the end of the one before it.
+    if phase_timer:
+        phase_timer.lap()
 
     # Main game will loop until the player selects not to play again,
     # then it will exit. See play_another_game().
     while play_again == True:
         # Reset player basic details each loop.
-        player_hand = []
-        player_hand2 = []
+        player_hand = Hand()
+        player_hand2 = Hand()
         bet_amount = 0
         bet_amount2 = 0
 
         #Build a playing deck with multiple packs of cards and then shuffles them.
         #Will also check how often deck needs to be reshuffled from the radom cut.
-        card_deck, cut_num = refresh_deck(card_deck, pack_of_cards, NUM_OF_DECKS, cut_num)
+        card_deck, cut_num = refresh_deck(card_deck, pack_of_cards, HOUSE_RULES.num_decks, cut_num)
+        if phase_timer:
+            phase_timer.lap(PHASE_REFRESH)
+        # A shoe with no cards dealt was just shuffled, a balance of 10 or less gets a top up.
+        if metrics is not None:
+            if card_deck.cursor == 0 and not HOUSE_RULES.continuous_shuffle:
+                metrics.count(METRIC_SHUFFLES)
+            if player_balance <= 10:
+                metrics.count(METRIC_TOP_UPS)
         
         # Give player extra credits if they are low.
         player_balance = on_the_house(player_balance)
+        round_start_balance = player_balance
 
         # Collects amount of players starting bet.
         bet_amount = get_opening_bet(player_balance)
-        time.sleep(MED_PAUSE)
+        opening_bet = bet_amount
+        if phase_timer:
+            phase_timer.lap(PHASE_BETTING)
+        pause()
+        if phase_timer:
+            phase_timer.lap(PHASE_PAUSES)
         
         # Deals and collects data on first two cards for player and dealer.
         player_hand, card_deck = start_player_cards(card_deck)
@@ -791,40 +1304,4009 @@ def blackjack():
         # Prints results of hands dealt of the opening game.
         player_starting_data(player_hand)
         dealer_starting_data(dealer_hand)
-        time.sleep(MED_PAUSE)
+        if phase_timer:
+            phase_timer.lap(PHASE_DEAL)
+        pause()
+        if phase_timer:
+            phase_timer.lap(PHASE_PAUSES)
 
         # Ask player for insurance and check if house value of 21 is True.
-        insurance_bet, game_push = get_insurance(dealer_hand, player_hand, bet_amount, player_balance)
+        insurance_bet, game_push = get_insurance(dealer_hand, player_hand, bet_amount, player_balance, card_deck)
         # Update player_balance if insurance was won or lost.
         player_balance = player_balance + insurance_bet
+        if phase_timer:
+            phase_timer.lap(PHASE_INSURANCE)
 
         # Check if user played an insurance bet.
         # This section will wrap up rest of the game play options.
         if insurance_bet <= 0 and game_push == False:
             # Checks if player can split hand and gives option to do so.
             card_deck, player_hand, player_hand2, bet_amount2 = player_split_hand(card_deck, player_hand, player_balance, bet_amount)
+            if phase_timer:
+                phase_timer.lap(PHASE_SPLIT)
             # Player gets to make his final interactions for this round.
             card_deck, player_hand, bet_amount = player_main_hand(card_deck, player_hand, bet_amount, player_balance)
-            time.sleep(MED_PAUSE)
+            if phase_timer:
+                phase_timer.lap(PHASE_MAIN_HAND)
+            pause()
+            if phase_timer:
+                phase_timer.lap(PHASE_PAUSES)
             # Dealer/House tries to beat the players hand.
+            if metrics is not None:
+                dealer_start = time.perf_counter()
             card_deck, dealer_hand = dealer_plays_hand(card_deck, dealer_hand, player_hand, player_hand2)
-            time.sleep(MED_PAUSE)
+            if metrics is not None:
+                metrics.observe(METRIC_DEALER, time.perf_counter() - dealer_start)
+            if phase_timer:
+                phase_timer.lap(PHASE_DEALER)
+            pause()
+            if phase_timer:
+                phase_timer.lap(PHASE_PAUSES)
         
         #Who wins and lose, tally up the bets.
         player_balance = settlements(dealer_hand, player_hand, player_hand2, bet_amount, bet_amount2, player_balance)
+        if phase_timer:
+            phase_timer.lap(PHASE_SETTLEMENTS)
+        round_data = (player_hand, player_hand2, dealer_hand, bet_amount, bet_amount2, insurance_bet,
+            player_balance - round_start_balance)
+        if history is not None:
+            history.write(player_balance, opening_bet, round_data)
+        if decisions is not None:
+            decisions.end_round(player_balance)
+            decisions.checkpoint(round_num + 1, lambda: pack_snapshot(round_num + 1, player_balance, card_deck,
+                cut_num, random.getstate(), HOUSE_RULES, opening_bet))
+        if metrics is not None:
+            metrics.observe_round(round_data, opening_bet)
+        if snapshot is not None:
+            write_snapshot(snapshot, round_num + 1, player_balance, card_deck, cut_num, random.getstate(), HOUSE_RULES, opening_bet)
+        
+        yield RoundResult(round_num, round_data, player_balance, opening_bet)
+        round_num += 1
         
         # Ask the user to play another game Y/N.
         play_again = play_another_game()
+        if phase_timer:
+            phase_timer.lap(PHASE_PLAY_AGAIN)
 
 
-def main():
-# Main function, serves as place holder to add more games.
-    #Display intro text.
-    intro()
-    #Load game of blackjack.
-    blackjack()
-    #Thank you notice on exit.
-    thank_you()
+class HeadlessStrategy:
+    """Makes the player's choices for the headless engine. Every prompt in blackjack() has a
+        method here, so a new strategy only needs to override the choices it cares about.
+        The default plays a flat bet of 10 credits, never buys insurance, splits Aces and 8's,
+        doubles down on 10 or 11 and hits until the hand is worth 17 or more.
+    """
+    def opening_bet(self, session):
+        """Same as get_opening_bet().
+        Returns:
+            bet_amount: Integer between 1 and session.player_balance.
+        """
+        return min(10, session.player_balance)
+
+    def take_insurance(self, session, player_hand, dealer_upcard, insurance_bet):
+        """Same as get_insurance(). Only asked when the House shows an Ace.
+        Returns:
+            Boolean True to buy insurance for insurance_bet credits.
+        """
+        return False
+
+    def split(self, session, player_hand, dealer_upcard, bet_amount):
+        """Same as player_split_hand(). Only asked when both cards have the same value.
+        Returns:
+            Boolean True to split for bet_amount credits.
+        """
+        return CARD_VALUES[player_hand[0]] == 11 or CARD_VALUES[player_hand[0]] == 8
+
+    def double_down(self, session, player_hand, dealer_upcard, bet_amount):
+        """Same as double_down(). Only asked when the hand is worth 9, 10 or 11.
+        Returns:
+            Boolean True to double the bet and take one more card.
+        """
+        return player_hand.value >= 10
+
+    def hit(self, session, player_hand, dealer_upcard):
+        """Same as hit_or_stand(), asked again after every hit.
+        Returns:
+            Boolean True to hit, False to stand.
+        """
+        return player_hand.value < 17
+
+    def play_again(self, session):
+        """Same as play_another_game().
+        Returns:
+            Boolean True to keep playing.
+        """
+        return True
+
+    def settings(self):
+        """Returns:
+            Tuple of everything that changes the strategy's choices, starting with its class name.
+        """
+        return (type(self).__name__,)
+
+    def config_hash(self):
+        """Returns:
+            String hash of settings(), the same for equal strategies on any machine.
+        """
+        return hashlib.sha256(repr(self.settings()).encode()).hexdigest()
+
+    def for_rules(self, rules):
+        """Returns:
+            The strategy to play under other HouseRules, this one if it does not depend on them.
+        """
+        return self
+
+
+def fill_shoe_pool(ready, recycled, stop, pack_of_cards, num_decks, seed):
+    """Shuffles shoes and puts them on the ready queue until stop is set. Waits whenever the
+        queue is full. Runs in the background thread or process of a ShoePool.
+    Inputs:
+        ready: Queue of shuffled Shoes, limited to the size of the pool.
+        recycled: Queue of used Shoes to shuffle again, None to always build new ones.
+        stop: Event set when the pool is closed.
+        pack_of_cards: bytes of the 52 card ids in a pack.
+        num_decks: Integer number of packs of cards in each shoe.
+        seed: Seed for the pool's random generator.
+    """
+    rng = random.Random(seed)
+    shoe_cards = pack_of_cards * num_decks
+    while not stop.is_set():
+        card_deck = None
+        if recycled is not None:
+            try:
+                card_deck = recycled.get_nowait()
+                # Put the cards back in order first, so the shuffle only depends on the seed.
+                card_deck.cards[:] = shoe_cards
+            except queue.Empty:
+                pass
+        if card_deck is None:
+            card_deck = Shoe(shoe_cards)
+        card_deck.shuffle(rng)
+        # Wait for room, checking now and then if the pool was closed.
+        while not stop.is_set():
+            try:
+                ready.put(card_deck, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+
+class ShoePool:
+    """Keeps up to pool_size shuffled shoes ready so a reshuffle only has to swap in the next
+        shoe. The pool is topped up by a background thread, or by a separate process when
+        use_process is True, which takes the shuffling off the game's own core.
+        Shoes come out in the order they were shuffled, so a seed always gives the same shoes.
+        Used shoes handed back to a thread pool are shuffled again instead of built new.
+    """
+    def __init__(self, pack_of_cards, num_decks=NUM_OF_DECKS, pool_size=SHOE_POOL_SIZE, seed=None, use_process=False):
+        if use_process:
+            self.ready = multiprocessing.Queue(pool_size)
+            self.recycled = None
+            self.stop = multiprocessing.Event()
+            self.worker = multiprocessing.Process(target=fill_shoe_pool, daemon=True,
+                args=(self.ready, self.recycled, self.stop, pack_of_cards, num_decks, seed))
+        else:
+            self.ready = queue.Queue(pool_size)
+            self.recycled = queue.Queue()
+            self.stop = threading.Event()
+            self.worker = threading.Thread(target=fill_shoe_pool, daemon=True,
+                args=(self.ready, self.recycled, self.stop, pack_of_cards, num_decks, seed))
+        self.worker.start()
+
+    def next_shoe(self, used_deck=None):
+        """Swaps a used shoe for the next shuffled one.
+        Inputs:
+            used_deck: Shoe finished with, or None.
+        Returns:
+            card_deck: Shuffled Shoe ready to be dealt.
+        """
+        if used_deck is not None and self.recycled is not None:
+            self.recycled.put(used_deck)
+        return self.ready.get()
+
+    def close(self):
+        """Stops the background thread or process."""
+        self.stop.set()
+        self.worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HeadlessSession:
+    """Everything blackjack() keeps between rounds, so a headless game can be paused
+        and continued. Each session has its own random generator, so a seed will
+        always replay the same shoes, cuts and dealer choices. If shoe_pool is given,
+        shuffled shoes are taken from it instead of shuffling between rounds.
+        The game is played with rules, default HOUSE_RULES. If metrics is given, every
+        round is counted in it.
+    """
+    __slots__ = ("pack_of_cards", "card_deck", "cut_num", "player_balance", "rng", "rounds_played", "shoe_pool", "opening_bet", "rules",
+                 "metrics")
+
+    def __init__(self, seed=None, player_balance=STARTING_BALANCE, shoe_pool=None, rules=None, metrics=None):
+        self.pack_of_cards = build_cards()
+        self.card_deck = None
+        self.cut_num = 0
+        self.player_balance = player_balance
+        self.rng = random.Random(seed)
+        self.rounds_played = 0
+        self.shoe_pool = shoe_pool
+        # Opening bet of the last round played.
+        self.opening_bet = 0
+        self.rules = rules or HOUSE_RULES
+        self.metrics = metrics
+
+
+def headless_refresh_deck(session):
+    """Same as refresh_deck(), without printing or pausing, and using the session's own
+        random generator or shoe pool.
+    Inputs:
+        session: HeadlessSession to update with a new card_deck and cut_num.
+    """
+    if session.rules.continuous_shuffle and session.card_deck is not None:
+        session.card_deck.reinsert(session.rng)
+        return
+    if session.cut_num == 0 or len(session.card_deck) <= session.cut_num:
+        if session.shoe_pool is not None:
+            session.card_deck = session.shoe_pool.next_shoe(session.card_deck)
+        elif session.card_deck is None:
+            session.card_deck = Shoe(session.pack_of_cards * session.rules.num_decks)
+            session.card_deck.shuffle(session.rng)
+        else:
+            session.card_deck.shuffle(session.rng)
+        session.cut_num = session.rng.randint(session.rules.cut_min, session.rules.cut_max)
+
+
+def hand_steps(session, strategy, player_hand, dealer_upcard, bet_amount, player_balance, split_hand=False, waits=False):
+    """Same as double_down() then hit_or_stand() on one hand, with the choices made by
+        strategy, as steps of seat_steps(). A main hand stands once doubled down, like
+        player_main_hand(), but a split hand is still asked to hit, like player_split_hand().
+        Like the prompt, the strategy is asked to hit at least once.
+    Inputs:
+        session: HeadlessSession dealing the cards.
+        strategy: HeadlessStrategy, or TablePlayer with waits, making the choices.
+        player_hand: Hand of card ids, new cards are added to it.
+        dealer_upcard: Card id of the House's face up card.
+        bet_amount: Integer value of the current bet amount.
+        player_balance: Integer reflecting current value of credits in players bank.
+        split_hand: Boolean True when playing the split hand.
+        waits: Boolean True to yield every choice and card dealt to be awaited.
+    Returns:
+        bet_amount: Updated to reflect players choice on bet.
+    """
+    card_deck = session.card_deck
+    # double_down()
+    player_hand_value = player_hand.value
+    if player_hand_value >= session.rules.double_min and player_hand_value <= session.rules.double_max and (player_balance >= (2 * bet_amount)):
+        doubled = strategy.double_down(session, player_hand, dealer_upcard, bet_amount)
+        if waits:
+            doubled = yield doubled
+        if doubled:
+            bet_amount = bet_amount * 2
+            player_hand.add(card_deck.deal())
+            if waits:
+                yield strategy.doubled(session, player_hand)
+            if not split_hand:
+                return bet_amount
+
+    # hit_or_stand()
+    while True:
+        hit = strategy.hit(session, player_hand, dealer_upcard)
+        if waits:
+            hit = yield hit
+        if not hit:
+            break
+        player_hand.add(card_deck.deal())
+        if waits:
+            yield strategy.hit_dealt(session, player_hand)
+        # Blackjack or bust ends the hand.
+        if player_hand.value >= 21:
+            return bet_amount
+    if waits:
+        yield strategy.stood(session, player_hand)
+    return bet_amount
+
+
+def settle_hand(player_hand_value, dealer_hand_value, bet_amount):
+    """Works out the payout of one hand in the same order of checks as settlements().
+    Inputs:
+        player_hand_value: Integer value of the player's hand.
+        dealer_hand_value: Integer value of the House's hand.
+        bet_amount: Integer value of the bet on this hand.
+    Returns:
+        Integer credits won (positive), lost (negative) or 0 for a push.
+    """
+    if player_hand_value > 21:
+        return -bet_amount
+    elif dealer_hand_value > 21:
+        return bet_amount
+    elif player_hand_value == dealer_hand_value:
+        return 0
+    elif player_hand_value > dealer_hand_value:
+        return bet_amount
+    return -bet_amount
+
+
+# settle_hand() for one credit, by the House's value then the player's, for settling many hands
+# against the same House hand with one lookup each.
+SETTLE_SIGNS = tuple(tuple(settle_hand(player_hand_value, dealer_hand_value, 1) for player_hand_value in range(32))
+                     for dealer_hand_value in range(32))
+
+
+def seat_steps(session, strategy, player_hand, dealer_hand, bet_amount, waits=False):
+    """The player's side of a round once the first cards are dealt, the same as get_insurance(),
+        player_split_hand() and player_main_hand() do in blackjack(). These are the rules of a
+        seat for the headless engine and the table server alike, written as a generator.
+        Every choice is asked of strategy. With waits, strategy is a TablePlayer whose
+        methods return awaitables: each choice is yielded for the caller to await and the
+        answer is sent back, and what happens in between is yielded the same way. Without
+        waits nothing is yielded, see finish_steps().
+    Inputs:
+        session: HeadlessSession of the player, dealing from session.card_deck.
+        strategy: HeadlessStrategy, or TablePlayer with waits, making the player's choices.
+        player_hand: Hand of the player's first two cards, played on by the player.
+        dealer_hand: Hand of the House's two cards, the second face up.
+        bet_amount: Integer opening bet.
+        waits: Boolean True to yield every choice and notice to be awaited.
+    Returns:
+        player_hand2: Hand of card ids in the split hand, empty if no split.
+        bet_amount: Integer final bet on the main hand.
+        bet_amount2: Integer final bet on the split hand.
+        insurance_bet: Integer won (positive) or lost (negative) on insurance, the round is
+            over for the player when it was won.
+    """
+    card_deck = session.card_deck
+    player_balance = session.player_balance
+    dealer_upcard = dealer_hand[1]
+    player_hand2 = Hand()
+    bet_amount2 = 0
+
+    # get_insurance(), skipped if player already has 21.
+    # (A push during insurance can't happen since the player never has 21 here.)
+    insurance_bet = 0
+    if player_hand.value != 21:
+        insurance_price = round(bet_amount * session.rules.insurance_rate) #House rules
+        if CARD_VALUES[dealer_upcard] == 11 and player_balance >= insurance_price:
+            insured = strategy.take_insurance(session, player_hand, dealer_upcard, insurance_price)
+            if waits:
+                insured = yield insured
+            if insured:
+                if CARD_VALUES[dealer_hand[0]] == 10:
+                    insurance_bet = round(insurance_price * 2)
+                else:
+                    insurance_bet = insurance_price * -1
+                if waits:
+                    yield strategy.insurance_settled(session, dealer_hand, insurance_bet)
+    player_balance = player_balance + insurance_bet
+
+    if insurance_bet <= 0:
+        # player_split_hand()
+        if CARD_VALUES[player_hand[0]] == CARD_VALUES[player_hand[1]] and player_balance >= (bet_amount * 2):
+            split = strategy.split(session, player_hand, dealer_upcard, bet_amount)
+            if waits:
+                split = yield split
+            if split:
+                player_hand2.add(player_hand.pop(0))
+                bet_amount2 = bet_amount
+                if waits:
+                    yield strategy.split_started(session, player_hand2)
+                player_hand2.add(card_deck.deal())
+                if waits:
+                    yield strategy.card_dealt(session, player_hand2)
+                if player_hand2.value == 21:
+                    bet_amount2 = bet_amount2 * session.rules.split_21_bonus #We are extra friendly, 4:1
+                    if waits:
+                        yield strategy.hand_is_21(session, player_hand2)
+                else:
+                    bet_amount2 = yield from hand_steps(session, strategy, player_hand2, dealer_upcard, bet_amount2, player_balance, True, waits)
+                if waits:
+                    yield strategy.second_hand(session, player_hand)
+                player_hand.add(card_deck.deal())
+                if waits:
+                    yield strategy.card_dealt(session, player_hand)
+
+        # player_main_hand()
+        if player_hand.value != 21:
+            bet_amount = yield from hand_steps(session, strategy, player_hand, dealer_upcard, bet_amount, player_balance, False, waits)
+        elif waits:
+            yield strategy.hand_is_21(session, player_hand)
+    return player_hand2, bet_amount, bet_amount2, insurance_bet
+
+
+def finish_steps(steps):
+    """Plays the steps of seat_steps() or round_steps() made without waits, which run to the
+        end without yielding.
+    Inputs:
+        steps: Generator from seat_steps() or round_steps().
+    Returns:
+        The value returned by the steps.
+    """
+    try:
+        next(steps)
+    except StopIteration as finished:
+        return finished.value
+    raise RuntimeError("Steps made without waits yielded.")
+
+
+def play_seat(session, strategy, player_hand, dealer_hand, bet_amount):
+    """Plays the player's side of a round once the first cards are dealt, with the rules of
+        seat_steps() and every choice made by strategy.
+    Inputs:
+        session: HeadlessSession of the player, dealing from session.card_deck.
+        strategy: HeadlessStrategy making the player's choices.
+        player_hand: Hand of the player's first two cards, played on by the player.
+        dealer_hand: Hand of the House's two cards, the second face up.
+        bet_amount: Integer opening bet.
+    Returns:
+        The tuple returned by seat_steps().
+    """
+    return finish_steps(seat_steps(session, strategy, player_hand, dealer_hand, bet_amount))
+
+
+def best_hand_value(player_hand, player_hand2):
+    """Picks the player's hand the House tries to beat, the same as dealer_plays_hand().
+    Inputs:
+        player_hand: Hand of card ids in the main hand.
+        player_hand2: Hand of card ids in the split hand, empty if no split.
+    Returns:
+        player_winning_hand: Integer value, over 21 if every hand is bust.
+    """
+    player_hand_value1 = player_hand.value
+    player_hand_value2 = player_hand2.value
+    if player_hand_value1 <= 21 and player_hand_value1 >= player_hand_value2:
+        return player_hand_value1
+    elif player_hand_value2 <= 21 and player_hand_value2 > player_hand_value1 and player_hand_value2 > 1:
+        return player_hand_value2
+    return player_hand_value1
+
+
+def headless_dealer_plays(session, dealer_hand, player_winning_hand):
+    """Same as dealer_plays_hand(), without printing or pausing. The House does not draw when
+        the player is bust, otherwise it draws while behind the player up to a random max_num.
+    Inputs:
+        session: HeadlessSession or TableSession dealing the cards, with the random generator.
+        dealer_hand: Hand of the House's cards, new cards are added to it.
+        player_winning_hand: Integer value of the hand the House has to beat.
+    """
+    if player_winning_hand <= 21:
+        card_deck = session.card_deck
+        max_num = session.rng.randint(session.rules.dealer_stop_min, session.rules.dealer_stop_max)
+        while dealer_hand.value <= max_num and dealer_hand.value < player_winning_hand:
+            dealer_hand.add(card_deck.deal())
+
+
+def round_steps(session, strategy, waits=False):
+    """One full round of blackjack(), from refresh_deck() to settlements(), as a generator
+        like seat_steps(), so play_round() and the table server play every round by the
+        same rules.
+    Inputs:
+        session: HeadlessSession, updated with the new balance and deck.
+        strategy: HeadlessStrategy, or TablePlayer with waits, making the player's choices.
+        waits: Boolean True to yield every choice and notice to be awaited.
+    Returns:
+        The tuple returned by play_round().
+    """
+    headless_refresh_deck(session)
+    card_deck = session.card_deck
+    metrics = session.metrics
+    shuffled = card_deck.cursor == 0 and not session.rules.continuous_shuffle
+    if metrics is not None:
+        if shuffled:
+            metrics.count(METRIC_SHUFFLES)
+        if session.player_balance <= 10:
+            metrics.count(METRIC_TOP_UPS)
+    if waits and shuffled:
+        yield strategy.shuffled(session)
+
+    # on_the_house()
+    if session.player_balance <= 10:
+        session.player_balance += 500
+        if waits:
+            yield strategy.topped_up(session)
+    player_balance = session.player_balance
+
+    # get_opening_bet()
+    bet_amount = strategy.opening_bet(session)
+    if waits:
+        bet_amount = yield bet_amount
+    if bet_amount < 1 or bet_amount > player_balance:
+        raise ValueError(f"Opening bet of {bet_amount} credits with a balance of {player_balance} credits.")
+    session.opening_bet = bet_amount
+
+    # start_player_cards() and start_dealer_cards()
+    player_hand = Hand((card_deck.deal(), card_deck.deal()))
+    dealer_hand = Hand((card_deck.deal(), card_deck.deal()))
+    if waits:
+        yield strategy.hands_dealt(session, player_hand, dealer_hand)
+
+    player_hand2, bet_amount, bet_amount2, insurance_bet = yield from seat_steps(session, strategy, player_hand, dealer_hand, bet_amount, waits)
+    player_balance = player_balance + insurance_bet
+    if insurance_bet <= 0:
+        # dealer_plays_hand()
+        if metrics is not None:
+            dealer_start = time.perf_counter()
+        headless_dealer_plays(session, dealer_hand, best_hand_value(player_hand, player_hand2))
+        if metrics is not None:
+            metrics.observe(METRIC_DEALER, time.perf_counter() - dealer_start)
+        if waits:
+            yield strategy.dealer_played(session, dealer_hand)
+
+    # settlements()
+    dealer_hand_value = dealer_hand.value
+    if player_hand2:
+        player_balance += settle_hand(player_hand2.value, dealer_hand_value, bet_amount2)
+    player_balance += settle_hand(player_hand.value, dealer_hand_value, bet_amount)
+
+    net_win = player_balance - session.player_balance
+    session.player_balance = player_balance
+    session.rounds_played += 1
+    round_data = (player_hand, player_hand2, dealer_hand, bet_amount, bet_amount2, insurance_bet, net_win)
+    if metrics is not None:
+        metrics.observe_round(round_data, session.opening_bet)
+    if waits:
+        yield strategy.settled(session, round_data)
+    return round_data
+
+
+def play_round(session, strategy):
+    """Plays one round exactly as the loop in blackjack() does, from refresh_deck() to
+        settlements(), with the rules of round_steps(), but every choice is made by strategy
+        and nothing is printed.
+    Inputs:
+        session: HeadlessSession, updated with the new balance and deck.
+        strategy: HeadlessStrategy making the player's choices.
+    Returns:
+        player_hand: Hand of card ids in the main hand.
+        player_hand2: Hand of card ids in the split hand, empty if no split.
+        dealer_hand: Hand of card ids in the House's hand.
+        bet_amount: Integer final bet on the main hand.
+        bet_amount2: Integer final bet on the split hand.
+        insurance_bet: Integer won (positive) or lost (negative) on insurance.
+        net_win: Integer change to the player's balance this round, not counting on_the_house().
+    """
+    return finish_steps(round_steps(session, strategy))
+
+
+class RoundResult:
+    """One finished round, from play_round() or blackjack_rounds(). Only the round's own hands
+        are kept, so a stream of them runs in constant memory.
+    """
+    __slots__ = ("round_num", "player_hand", "player_hand2", "dealer_hand", "bet_amount", "bet_amount2",
+                 "insurance_bet", "net_win", "player_balance", "opening_bet")
+
+    def __init__(self, round_num, round_data, player_balance, opening_bet):
+        self.round_num = round_num
+        (self.player_hand, self.player_hand2, self.dealer_hand, self.bet_amount, self.bet_amount2,
+            self.insurance_bet, self.net_win) = round_data
+        self.player_balance = player_balance
+        self.opening_bet = opening_bet
+
+    def __repr__(self):
+        return (f"RoundResult(round {self.round_num}, net win {self.net_win}, balance {self.player_balance}, "
+                f"player {list(self.player_hand)} {list(self.player_hand2)}, house {list(self.dealer_hand)})")
+
+    @property
+    def round_data(self):
+        # The same tuple play_round() returns, for SimulationStats.add_round() and HandHistoryWriter.write().
+        return (self.player_hand, self.player_hand2, self.dealer_hand, self.bet_amount, self.bet_amount2,
+                self.insurance_bet, self.net_win)
+
+    @property
+    def outcome(self):
+        # "win", "push" or "lose" for the round as a whole.
+        if self.net_win > 0:
+            return "win"
+        if self.net_win < 0:
+            return "lose"
+        return "push"
+
+
+def iter_rounds(session, strategy, num_rounds=None):
+    """Plays rounds only as the caller asks for them, yielding a RoundResult for each. Stops
+        after num_rounds, or when strategy does not want to play again. For example
+            for round_result in iter_rounds(HeadlessSession(seed), strategy, 10 ** 8):
+                stats.add_round(round_result.round_data)
+        plays a hundred million rounds without ever holding more than one.
+    Inputs:
+        session: HeadlessSession to play in.
+        strategy: HeadlessStrategy making the player's choices.
+        num_rounds: Integer most rounds to play, None to play until strategy stops.
+    """
+    rounds_left = num_rounds
+    while rounds_left is None or rounds_left > 0:
+        round_data = play_round(session, strategy)
+        yield RoundResult(session.rounds_played - 1, round_data, session.player_balance, session.opening_bet)
+        if rounds_left is not None:
+            rounds_left -= 1
+        if not strategy.play_again(session):
+            break
+
+
+def run_headless(num_rounds, strategy=None, seed=None, shoe_pool=None, history=None):
+    """Plays up to num_rounds rounds in a row, stopping early if strategy does not want to
+        play again.
+    Inputs:
+        num_rounds: Integer number of rounds to play.
+        strategy: HeadlessStrategy making the player's choices, default HeadlessStrategy().
+        seed: Seed for the session's random generator, None for a random game.
+        shoe_pool: ShoePool to take shuffled shoes from, None to shuffle between rounds.
+        history: HandHistoryWriter to record every round, None to not record them.
+    Returns:
+        session: HeadlessSession after the last round.
+    """
+    if strategy is None:
+        strategy = HeadlessStrategy()
+    session = HeadlessSession(seed, shoe_pool=shoe_pool)
+    for round_result in iter_rounds(session, strategy, num_rounds):
+        if history is not None:
+            history.write(round_result.player_balance, round_result.opening_bet, round_result.round_data)
+    return session
+
+
+class SimulationStats:
+    """Running totals for simulated rounds. Everything is a whole number, so totals from
+        different processes can be merged in any order and give exactly the same result.
+    """
+    __slots__ = ("rounds", "hands_played", "total_wagered", "net_win", "wins", "losses", "pushes",
+                 "busts", "blackjacks", "insurance_taken", "insurance_won", "insurance_net")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def add_round(self, round_data):
+        """Adds the result of one play_round() to the totals.
+        Inputs:
+            round_data: Tuple returned by play_round().
+        """
+        player_hand, player_hand2, dealer_hand, bet_amount, bet_amount2, insurance_bet, net_win = round_data
+        self.rounds += 1
+        self.net_win += net_win
+        self.total_wagered += bet_amount + bet_amount2
+        if insurance_bet != 0:
+            self.insurance_taken += 1
+            self.insurance_net += insurance_bet
+            if insurance_bet > 0:
+                self.insurance_won += 1
+        for hand in (player_hand, player_hand2):
+            if not hand:
+                continue
+            self.hands_played += 1
+            if hand.is_bust:
+                self.busts += 1
+            if hand.is_blackjack:
+                self.blackjacks += 1
+            # Win, push or loss for one credit.
+            outcome = settle_hand(hand.value, dealer_hand.value, 1)
+            if outcome > 0:
+                self.wins += 1
+            elif outcome < 0:
+                self.losses += 1
+            else:
+                self.pushes += 1
+
+    def as_dict(self):
+        """Returns:
+            Dictionary of every total by name, for saving.
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def load(self, totals):
+        """Sets the totals from a dictionary saved with as_dict().
+        Inputs:
+            totals: Dictionary of every total by name.
+        """
+        for name in self.__slots__:
+            setattr(self, name, totals[name])
+
+    def merge(self, other):
+        """Adds the totals of another SimulationStats to this one.
+        Inputs:
+            other: SimulationStats to add.
+        """
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+def simulate_chunk(chunk, keep_moments=False):
+    """Plays one chunk of a simulation in a new HeadlessSession. The chunk's random generator
+        is seeded from the master seed and the chunk number only, so a chunk plays the same
+        rounds whichever process runs it.
+        With a shoe pool, the shoes come from a ShoePool seeded the same way.
+    Inputs:
+        chunk: Tuple of (chunk_num, num_rounds, seed, strategy, shoe_pool_size, rules), a
+            shoe_pool_size of 0 shuffles between rounds instead.
+        keep_moments: Boolean True to also keep the moments of each round's net win per
+            credit of the opening bet.
+    Returns:
+        stats: SimulationStats of the chunk.
+        moments: RunningMoments of the return of each round, only returned with keep_moments.
+    """
+    chunk_num, num_rounds, seed, strategy, shoe_pool_size, rules = chunk
+    shoe_pool = None
+    if shoe_pool_size:
+        shoe_pool = ShoePool(build_cards(), rules.num_decks, pool_size=shoe_pool_size, seed=f"{seed}:{chunk_num}:shoes")
+    session = HeadlessSession(f"{seed}:{chunk_num}", shoe_pool=shoe_pool, rules=rules)
+    stats = SimulationStats()
+    if keep_moments:
+        moments = RunningMoments()
+        for i in range(num_rounds):
+            round_data = play_round(session, strategy)
+            stats.add_round(round_data)
+            moments.add(round_data[6] / session.opening_bet)
+    else:
+        for i in range(num_rounds):
+            stats.add_round(play_round(session, strategy))
+    if shoe_pool is not None:
+        shoe_pool.close()
+    if keep_moments:
+        return stats, moments
+    return stats
+
+
+def simulate(num_rounds, seed=None, workers=None, strategy=None, chunk_rounds=SIM_CHUNK_ROUNDS, shoe_pool_size=0, rules=None):
+    """Plays num_rounds headless rounds split into chunks of chunk_rounds, using a process pool
+        to play the chunks on every core. Each chunk starts a new session with a full balance.
+        The results only depend on seed and chunk_rounds, never on the number of workers.
+    Inputs:
+        num_rounds: Integer number of rounds to play.
+        seed: Master seed, None to pick one at random.
+        workers: Integer number of processes, default one per core.
+        strategy: HeadlessStrategy making the player's choices, default HeadlessStrategy().
+        chunk_rounds: Integer number of rounds in each chunk.
+        shoe_pool_size: Integer number of shoes each chunk keeps shuffled in the background,
+            0 to shuffle between rounds.
+        rules: HouseRules to play by, default HOUSE_RULES.
+    Returns:
+        stats: SimulationStats merged from every chunk.
+        seed: The master seed used, to repeat the run.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    if strategy is None:
+        strategy = HeadlessStrategy()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = []
+    for chunk_num, first_round in enumerate(range(0, num_rounds, chunk_rounds)):
+        chunks.append((chunk_num, min(chunk_rounds, num_rounds - first_round), seed, strategy, shoe_pool_size, rules or HOUSE_RULES))
+
+    if workers <= 1 or len(chunks) <= 1:
+        results = [simulate_chunk(chunk) for chunk in chunks]
+    else:
+        with multiprocessing.Pool(min(workers, len(chunks))) as pool:
+            results = pool.map(simulate_chunk, chunks)
+
+    stats = SimulationStats()
+    for chunk_stats in results:
+        stats.merge(chunk_stats)
+    return stats, seed
+
+
+def display_simulation(stats, seed, elapsed):
+    """Prints a summery of a simulation.
+    Inputs:
+        stats: SimulationStats to display.
+        seed: Master seed of the simulation.
+        elapsed: Float number of seconds the simulation took.
+    """
+    hands_played = max(stats.hands_played, 1)
+    print(f"Simulated {stats.rounds} rounds in {elapsed:.2f} seconds ({stats.rounds / max(elapsed, 1e-9):.0f} rounds/sec), seed {seed}")
+    print(f"Hands played: {stats.hands_played}  Credits wagered: {stats.total_wagered}")
+    print(f"Player net win: {stats.net_win} credits")
+    if stats.total_wagered:
+        print(f"House edge: {-100 * stats.net_win / stats.total_wagered:.3f}% of credits wagered")
+    print(f"Wins: {100 * stats.wins / hands_played:.2f}%  Losses: {100 * stats.losses / hands_played:.2f}%  Push rate: {100 * stats.pushes / hands_played:.2f}%")
+    print(f"Busts: {stats.busts}  Blackjacks: {stats.blackjacks}")
+    print(f"Insurance taken: {stats.insurance_taken}  won: {stats.insurance_won}  net: {stats.insurance_net} credits")
+
+
+class RunningMoments:
+    """Mean and variance of a stream of numbers with Welford's method, one pass and no list of
+        values kept. Moments from different processes can be merged into the same result as
+        if all the values had been added to one.
+    """
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        # Sum of squared differences from the mean.
+        self.m2 = 0.0
+
+    def add(self, value):
+        """Adds one value.
+        Inputs:
+            value: Float or integer.
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """Adds the values of another RunningMoments to this one (Chan's method).
+        Inputs:
+            other: RunningMoments to add.
+        """
+        count = self.count + other.count
+        if count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self):
+        # Sample variance.
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def standard_error(self):
+        # Standard error of the mean.
+        return (self.variance / self.count) ** 0.5 if self.count else float("inf")
+
+
+def simulate_until(ci_width, max_rounds=SIM_MAX_ROUNDS, seed=None, workers=None, strategy=None, confidence=0.95,
+                   chunk_rounds=SIM_CHUNK_ROUNDS, shoe_pool_size=0, rules=None):
+    """Plays rounds in batches of one chunk per worker, and stops as soon as the confidence
+        interval of the player's return per credit bet is narrower than ci_width, or max_rounds
+        have been played. The chunks are the same as simulate() plays from the same seed.
+    Inputs:
+        ci_width: Float full width of the confidence interval wanted, 0.01 for +/- 0.5%.
+        max_rounds: Integer most rounds to play.
+        seed: Master seed, None to pick one at random.
+        workers: Integer number of processes, default one per core.
+        strategy: HeadlessStrategy making the player's choices, default HeadlessStrategy().
+        confidence: Float confidence level of the interval.
+        chunk_rounds: Integer number of rounds in each chunk.
+        shoe_pool_size: Integer number of shoes each chunk keeps shuffled in the background.
+        rules: HouseRules to play by, default HOUSE_RULES.
+    Returns:
+        stats: SimulationStats of every round played.
+        moments: RunningMoments of the return of each round.
+        half_width: Float half width of the confidence interval reached.
+        seed: The master seed used, to repeat the run.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    if strategy is None:
+        strategy = HeadlessStrategy()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    rules = rules or HOUSE_RULES
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    stats = SimulationStats()
+    moments = RunningMoments()
+    half_width = float("inf")
+    chunk_num = 0
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        while stats.rounds < max_rounds and 2 * half_width > ci_width:
+            chunks = []
+            first_round = stats.rounds
+            while len(chunks) < workers and first_round < max_rounds:
+                num_rounds = min(chunk_rounds, max_rounds - first_round)
+                chunks.append((chunk_num, num_rounds, seed, strategy, shoe_pool_size, rules))
+                chunk_num += 1
+                first_round += num_rounds
+            if pool is None:
+                results = [simulate_chunk(chunk, keep_moments=True) for chunk in chunks]
+            else:
+                results = pool.map(functools.partial(simulate_chunk, keep_moments=True), chunks)
+            for chunk_stats, chunk_moments in results:
+                stats.merge(chunk_stats)
+                moments.merge(chunk_moments)
+            half_width = z * moments.standard_error
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return stats, moments, half_width, seed
+
+
+def display_simulate_until(stats, moments, half_width, ci_width, confidence, seed, elapsed):
+    """Prints how closely simulate_until() found the house edge.
+    Inputs:
+        stats: SimulationStats from simulate_until().
+        moments: RunningMoments from simulate_until().
+        half_width: Float half width of the confidence interval reached.
+        ci_width: Float full width that was asked for.
+        confidence: Float confidence level of the interval.
+        seed: Master seed of the simulation.
+        elapsed: Float number of seconds the simulation took.
+    """
+    display_simulation(stats, seed, elapsed)
+    reached = "reached" if 2 * half_width <= ci_width else "not reached, out of rounds"
+    print(f"House edge per credit of opening bet: {-100 * moments.mean:.3f}% +/- {100 * half_width:.3f}% "
+          f"({100 * confidence:g}% confidence), target width {100 * ci_width:g}% {reached}")
+
+
+def tournament_chunk(chunk):
+    """Plays one chunk of a tournament. Each shoe is shuffled once, and every strategy plays it
+        from the first card to the same cut, with the House's random stops drawn from the
+        same seed, so the strategies only differ by their own choices. Each strategy keeps
+        its own balance from shoe to shoe.
+    Inputs:
+        chunk: Tuple of (chunk_num, num_shoes, seed, strategies, rules).
+    Returns:
+        stats: List of SimulationStats, one per strategy.
+        shoe_moments: List of RunningMoments of each strategy's net win per shoe.
+        pair_moments: Dictionary of (a, b) strategy numbers, a before b, to RunningMoments
+            of the difference of their net wins per shoe.
+    """
+    chunk_num, num_shoes, seed, strategies, rules = chunk
+    shoe_rng = random.Random(f"{seed}:{chunk_num}")
+    card_deck = Shoe(build_cards() * rules.num_decks)
+    sessions = [HeadlessSession(rules=rules) for strategy in strategies]
+    stats = [SimulationStats() for strategy in strategies]
+    shoe_moments = [RunningMoments() for strategy in strategies]
+    pair_moments = {(a, b): RunningMoments() for a in range(len(strategies)) for b in range(a + 1, len(strategies))}
+    shoe_net = [0] * len(strategies)
+    for shoe_num in range(num_shoes):
+        card_deck.shuffle(shoe_rng)
+        cut_num = shoe_rng.randint(rules.cut_min, rules.cut_max)
+        dealer_seed = shoe_rng.getrandbits(64)
+        for number, strategy in enumerate(strategies):
+            session = sessions[number]
+            # Same cards, same cut and same dealer stops for every strategy. The shoe is only
+            # read, so one copy is shared and play_round() never reaches the cut to reshuffle.
+            card_deck.restart()
+            session.card_deck = card_deck
+            session.cut_num = cut_num
+            session.rng.seed(dealer_seed)
+            net_win = 0
+            while len(card_deck) > cut_num:
+                round_data = play_round(session, strategy)
+                stats[number].add_round(round_data)
+                net_win += round_data[6]
+            shoe_net[number] = net_win
+            shoe_moments[number].add(net_win)
+        for (a, b), moments in pair_moments.items():
+            moments.add(shoe_net[a] - shoe_net[b])
+    return stats, shoe_moments, pair_moments
+
+
+def tournament(strategies, num_shoes, seed=None, workers=None, chunk_shoes=TOURNAMENT_CHUNK_SHOES, rules=None):
+    """Compares strategies with common random numbers: every strategy plays exactly the same
+        shoes, so the difference between two strategies on a shoe has far less variance than
+        two independent simulations, and each shoe is only shuffled once for all of them.
+        Chunks of shoes are played on every core, and the results only depend on seed and
+        chunk_shoes.
+    Inputs:
+        strategies: List of HeadlessStrategy to compare.
+        num_shoes: Integer number of shoes each strategy plays.
+        seed: Master seed, None to pick one at random.
+        workers: Integer number of processes, default one per core.
+        chunk_shoes: Integer number of shoes in each chunk.
+        rules: HouseRules to play by, default HOUSE_RULES.
+    Returns:
+        stats, shoe_moments, pair_moments: As tournament_chunk(), merged from every chunk.
+        seed: The master seed used, to repeat the run.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    rules = rules or HOUSE_RULES
+    if rules.continuous_shuffle:
+        raise ValueError("A tournament compares strategies shoe by shoe, which needs a cut card, not continuous_shuffle.")
+    chunks = []
+    for chunk_num, first_shoe in enumerate(range(0, num_shoes, chunk_shoes)):
+        chunks.append((chunk_num, min(chunk_shoes, num_shoes - first_shoe), seed, strategies, rules))
+
+    if workers <= 1 or len(chunks) <= 1:
+        results = [tournament_chunk(chunk) for chunk in chunks]
+    else:
+        with multiprocessing.Pool(min(workers, len(chunks))) as pool:
+            results = pool.map(tournament_chunk, chunks)
+
+    stats, shoe_moments, pair_moments = results[0]
+    for chunk_stats, chunk_shoe_moments, chunk_pair_moments in results[1:]:
+        for number in range(len(strategies)):
+            stats[number].merge(chunk_stats[number])
+            shoe_moments[number].merge(chunk_shoe_moments[number])
+        for pair, moments in chunk_pair_moments.items():
+            pair_moments[pair].merge(moments)
+    return stats, shoe_moments, pair_moments, seed
+
+
+def display_tournament(names, stats, shoe_moments, pair_moments, seed, elapsed):
+    """Prints each strategy's results and how far apart each pair is, with the variance saved
+        by pairing compared with independent runs of the same size.
+    Inputs:
+        names: List of string names of the strategies.
+        stats, shoe_moments, pair_moments: From tournament().
+        seed: Master seed of the tournament.
+        elapsed: Float number of seconds the tournament took.
+    """
+    print(f"Tournament of {len(names)} strategies on {shoe_moments[0].count} common shoes in {elapsed:.2f} seconds, seed {seed}")
+    for name, strategy_stats, moments in zip(names, stats, shoe_moments):
+        house_edge = -100 * strategy_stats.net_win / max(strategy_stats.total_wagered, 1)
+        print(f"{name:>10}: {strategy_stats.rounds} rounds, net win {strategy_stats.net_win} credits, "
+              f"house edge {house_edge:.3f}%, {moments.mean:.2f} +/- {1.96 * moments.standard_error:.2f} credits per shoe")
+    for (a, b), moments in pair_moments.items():
+        paired_error = moments.standard_error
+        independent_error = (shoe_moments[a].variance / shoe_moments[a].count + shoe_moments[b].variance / shoe_moments[b].count) ** 0.5
+        saving = (independent_error / paired_error) ** 2 if paired_error > 0 else float("inf")
+        print(f"{names[a]} - {names[b]}: {moments.mean:+.2f} +/- {1.96 * paired_error:.2f} credits per shoe (95%), "
+              f"{saving:.1f}x fewer shoes than independent runs")
+
+
+class TableSession:
+    """A table of up to MAX_SEATS seats, all dealt from one shared shoe. Each seat is a
+        HeadlessSession with its own balance, whose card_deck is the table's shoe. The table
+        keeps the shoe, cut and random generator, and can be used with headless_refresh_deck()
+        and headless_dealer_plays() in the same way as a HeadlessSession.
+    """
+    __slots__ = ("pack_of_cards", "card_deck", "cut_num", "rng", "rounds_played", "shoe_pool", "rules", "seats")
+
+    def __init__(self, num_seats, seed=None, player_balance=STARTING_BALANCE, shoe_pool=None, rules=None):
+        if num_seats < 1 or num_seats > MAX_SEATS:
+            raise ValueError(f"A table has 1 to {MAX_SEATS} seats, not {num_seats}.")
+        self.pack_of_cards = build_cards()
+        self.card_deck = None
+        self.cut_num = 0
+        self.rng = random.Random(seed)
+        self.rounds_played = 0
+        self.shoe_pool = shoe_pool
+        self.rules = rules or HOUSE_RULES
+        self.seats = [HeadlessSession(player_balance=player_balance, rules=self.rules) for seat in range(num_seats)]
+
+
+def play_table_round(table, strategies):
+    """Plays one round at a table. Bets are placed, then one card is dealt to each seat and
+        the House in turn, twice, from the shared shoe. Each seat plays its hands like
+        play_round(), then the House plays once for the whole table against the best hand
+        still in play, and every hand is settled in one pass against the House's value.
+    Inputs:
+        table: TableSession, updated with the new balances and deck.
+        strategies: List of HeadlessStrategy, one for each seat.
+    Returns:
+        results: List of the tuple returned by play_round() for each seat, sharing one dealer_hand.
+    """
+    headless_refresh_deck(table)
+    card_deck = table.card_deck
+    seats = table.seats
+
+    # on_the_house() and get_opening_bet() for each seat.
+    opening_bets = []
+    for seat, strategy in zip(seats, strategies):
+        seat.card_deck = card_deck
+        if seat.player_balance <= 10:
+            seat.player_balance += 500
+        bet_amount = strategy.opening_bet(seat)
+        if bet_amount < 1 or bet_amount > seat.player_balance:
+            raise ValueError(f"Opening bet of {bet_amount} credits with a balance of {seat.player_balance} credits.")
+        seat.opening_bet = bet_amount
+        opening_bets.append(bet_amount)
+
+    # Deal in table order, the House's first card is face down.
+    player_hands = [Hand() for seat in seats]
+    dealer_hand = Hand()
+    for i in range(2):
+        for player_hand in player_hands:
+            player_hand.add(card_deck.deal())
+        dealer_hand.add(card_deck.deal())
+
+    # Every seat plays in turn, then the House plays once against the best hand still in play.
+    seat_hands = []
+    dealer_target = 0
+    for seat, strategy, player_hand, bet_amount in zip(seats, strategies, player_hands, opening_bets):
+        player_hand2, bet_amount, bet_amount2, insurance_bet = play_seat(seat, strategy, player_hand, dealer_hand, bet_amount)
+        seat_hands.append((player_hand, player_hand2, bet_amount, bet_amount2, insurance_bet))
+        if insurance_bet <= 0:
+            player_winning_hand = best_hand_value(player_hand, player_hand2)
+            if player_winning_hand <= 21 and player_winning_hand > dealer_target:
+                dealer_target = player_winning_hand
+    if dealer_target:
+        headless_dealer_plays(table, dealer_hand, dealer_target)
+
+    # settlements() for every hand at the table in one pass.
+    signs = SETTLE_SIGNS[dealer_hand.value]
+    results = []
+    for seat, (player_hand, player_hand2, bet_amount, bet_amount2, insurance_bet) in zip(seats, seat_hands):
+        net_win = insurance_bet + signs[player_hand.value] * bet_amount
+        if player_hand2:
+            net_win += signs[player_hand2.value] * bet_amount2
+        seat.player_balance += net_win
+        seat.rounds_played += 1
+        results.append((player_hand, player_hand2, dealer_hand, bet_amount, bet_amount2, insurance_bet, net_win))
+    table.rounds_played += 1
+    return results
+
+
+def simulate_table_chunk(chunk):
+    """Plays one chunk of table rounds at a new TableSession, seeded like simulate_chunk().
+    Inputs:
+        chunk: Tuple of (chunk_num, num_rounds, seed, strategies, rules).
+    Returns:
+        stats: List of SimulationStats, one per seat.
+    """
+    chunk_num, num_rounds, seed, strategies, rules = chunk
+    table = TableSession(len(strategies), f"{seed}:{chunk_num}", rules=rules)
+    stats = [SimulationStats() for strategy in strategies]
+    for i in range(num_rounds):
+        for seat_stats, round_data in zip(stats, play_table_round(table, strategies)):
+            seat_stats.add_round(round_data)
+    return stats
+
+
+def simulate_table(num_rounds, strategies, seed=None, workers=None, chunk_rounds=SIM_CHUNK_ROUNDS, rules=None):
+    """Plays num_rounds rounds at a table with one seat per strategy, in chunks on every core
+        like simulate(). The results only depend on seed and chunk_rounds.
+    Inputs:
+        num_rounds: Integer number of rounds to play.
+        strategies: List of HeadlessStrategy, one for each seat.
+        seed: Master seed, None to pick one at random.
+        workers: Integer number of processes, default one per core.
+        chunk_rounds: Integer number of rounds in each chunk.
+        rules: HouseRules to play by, default HOUSE_RULES.
+    Returns:
+        stats: List of SimulationStats, one per seat.
+        seed: The master seed used, to repeat the run.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    rules = rules or HOUSE_RULES
+    chunks = []
+    for chunk_num, first_round in enumerate(range(0, num_rounds, chunk_rounds)):
+        chunks.append((chunk_num, min(chunk_rounds, num_rounds - first_round), seed, strategies, rules))
+
+    if workers <= 1 or len(chunks) <= 1:
+        results = [simulate_table_chunk(chunk) for chunk in chunks]
+    else:
+        with multiprocessing.Pool(min(workers, len(chunks))) as pool:
+            results = pool.map(simulate_table_chunk, chunks)
+
+    stats = results[0]
+    for chunk_stats in results[1:]:
+        for seat_stats, other in zip(stats, chunk_stats):
+            seat_stats.merge(other)
+    return stats, seed
+
+
+def display_table_simulation(stats, seed, elapsed):
+    """Prints a summery of every seat of a table simulation, and of the table as a whole.
+    Inputs:
+        stats: List of SimulationStats, one per seat.
+        seed: Master seed of the simulation.
+        elapsed: Float number of seconds the simulation took.
+    """
+    table_stats = SimulationStats()
+    for seat_stats in stats:
+        table_stats.merge(seat_stats)
+    print(f"Simulated {stats[0].rounds} rounds at a table of {len(stats)} seats in {elapsed:.2f} seconds "
+          f"({stats[0].rounds / max(elapsed, 1e-9):.0f} rounds/sec, {table_stats.hands_played / max(elapsed, 1e-9):.0f} hands/sec), seed {seed}")
+    for seat, seat_stats in enumerate(stats, 1):
+        house_edge = -100 * seat_stats.net_win / max(seat_stats.total_wagered, 1)
+        print(f"Seat {seat}: net win {seat_stats.net_win} credits, house edge {house_edge:.3f}%, "
+              f"busts {seat_stats.busts}, blackjacks {seat_stats.blackjacks}")
+    print(f"Table: net win {table_stats.net_win} credits on {table_stats.total_wagered} wagered, "
+          f"house edge {-100 * table_stats.net_win / max(table_stats.total_wagered, 1):.3f}%")
+
+
+class QuantileSketch:
+    """Quantiles of a stream of numbers without keeping the numbers. Each value is counted in
+        a bucket of logarithmic width, so any quantile is within relative_accuracy of the
+        true value and the number of buckets only grows with the log of the range of values.
+        Sketches with the same accuracy merge into exactly the sketch of all their values.
+    """
+    __slots__ = ("gamma", "log_gamma", "positive", "negative", "zeros", "count")
+
+    def __init__(self, relative_accuracy=SKETCH_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        # Counts by bucket key, bucket k holds magnitudes in (gamma ** (k - 1), gamma ** k].
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        """Adds one value.
+        Inputs:
+            value: Float or integer.
+        """
+        self.count += 1
+        if value > 0:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif value < 0:
+            key = math.ceil(math.log(-value) / self.log_gamma)
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zeros += 1
+
+    def merge(self, other):
+        """Adds the values of another QuantileSketch with the same accuracy to this one.
+        Inputs:
+            other: QuantileSketch to add.
+        """
+        if other.gamma != self.gamma:
+            raise ValueError("Only sketches with the same accuracy can be merged.")
+        for buckets, other_buckets in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self, fraction):
+        """Estimates a quantile.
+        Inputs:
+            fraction: Float 0-1, 0.5 for the median.
+        Returns:
+            Float value, None if nothing has been added.
+        """
+        if self.count == 0:
+            return None
+        rank = fraction * (self.count - 1)
+        seen = 0
+        # The middle of a bucket is within the relative accuracy of anything in it.
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -2 * self.gamma ** key / (self.gamma + 1)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.positive) / (self.gamma + 1)
+
+
+class FixedHistogram:
+    """Counts of values in bins equal width bins from low to high, with one more count each
+        for values below and above. The bins never change, so histograms with the same bins
+        merge by adding their counts.
+    """
+    __slots__ = ("low", "high", "counts")
+
+    def __init__(self, low, high, bins):
+        self.low = low
+        self.high = high
+        # counts[0] is below low, counts[-1] is high or above.
+        self.counts = array.array("Q", [0]) * (bins + 2)
+
+    def add(self, value):
+        """Counts one value.
+        Inputs:
+            value: Float or integer.
+        """
+        if value < self.low:
+            self.counts[0] += 1
+        elif value >= self.high:
+            self.counts[-1] += 1
+        else:
+            self.counts[1 + int((value - self.low) * (len(self.counts) - 2) / (self.high - self.low))] += 1
+
+    def merge(self, other):
+        """Adds the counts of another FixedHistogram with the same bins.
+        Inputs:
+            other: FixedHistogram to add.
+        """
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+
+    def bins(self):
+        """Yields (low, high, count) of every bin, -inf and inf for the ends.
+        """
+        width = (self.high - self.low) / (len(self.counts) - 2)
+        yield float("-inf"), self.low, self.counts[0]
+        for i in range(len(self.counts) - 2):
+            yield self.low + i * width, self.low + (i + 1) * width, self.counts[i + 1]
+        yield self.high, float("inf"), self.counts[-1]
+
+
+class BankrollStats:
+    """Streaming summary of whole sessions, each starting with STARTING_BALANCE. Per session
+        it takes the final balance, the player's own bankroll (the final balance less any
+        credits from on_the_house()), the largest drawdown of that bankroll from its peak,
+        and the round the balance first fell to 10 or less, when the House tops it up.
+        That is ruin, as without the House the player could no longer play.
+        Every part is a fixed size estimator that merges across processes.
+    """
+    __slots__ = BANKROLL_COUNTS + BANKROLL_ESTIMATORS
+
+    def __init__(self):
+        self.sessions = 0
+        # Sessions ruined at least once, and those that still finished ahead thanks to the House.
+        self.ruined = 0
+        self.rescued = 0
+        # Sessions that finished above STARTING_BALANCE.
+        self.ahead = 0
+        self.top_ups = 0
+        self.final_balance = RunningMoments()
+        self.final_sketch = QuantileSketch()
+        self.final_histogram = FixedHistogram(0, 3 * STARTING_BALANCE, 30)
+        self.own_balance = RunningMoments()
+        self.own_sketch = QuantileSketch()
+        self.drawdown = RunningMoments()
+        self.drawdown_sketch = QuantileSketch()
+        self.ruin_round = RunningMoments()
+        self.ruin_sketch = QuantileSketch()
+
+    def add_session(self, final_balance, own_balance, drawdown, top_ups, ruin_round):
+        """Adds one session.
+        Inputs:
+            final_balance: Integer balance at the end, with the House's credits.
+            own_balance: Integer balance at the end without the House's credits.
+            drawdown: Integer largest fall of own_balance from its highest point.
+            top_ups: Integer times on_the_house() gave credits.
+            ruin_round: Integer round (from 0) of the first top up, None if never ruined.
+        """
+        self.sessions += 1
+        self.top_ups += top_ups
+        if final_balance > STARTING_BALANCE:
+            self.ahead += 1
+        if ruin_round is not None:
+            self.ruined += 1
+            self.ruin_round.add(ruin_round)
+            self.ruin_sketch.add(ruin_round)
+            if final_balance > STARTING_BALANCE:
+                self.rescued += 1
+        self.final_balance.add(final_balance)
+        self.final_sketch.add(final_balance)
+        self.final_histogram.add(final_balance)
+        self.own_balance.add(own_balance)
+        self.own_sketch.add(own_balance)
+        self.drawdown.add(drawdown)
+        self.drawdown_sketch.add(drawdown)
+
+    def merge(self, other):
+        """Adds the sessions of another BankrollStats to this one.
+        Inputs:
+            other: BankrollStats to add.
+        """
+        for name in BANKROLL_COUNTS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in BANKROLL_ESTIMATORS:
+            getattr(self, name).merge(getattr(other, name))
+
+
+def bankroll_chunk(chunk):
+    """Plays one chunk of whole sessions in a HeadlessSession seeded like simulate_chunk().
+        Each session starts over with STARTING_BALANCE on the shoe the last one left, as a
+        new player sitting down at the table. Only the running figures of the session in
+        play are kept, never its balances.
+    Inputs:
+        chunk: Tuple of (chunk_num, num_sessions, session_rounds, seed, strategy, rules).
+    Returns:
+        stats: BankrollStats of the chunk.
+    """
+    chunk_num, num_sessions, session_rounds, seed, strategy, rules = chunk
+    session = HeadlessSession(f"{seed}:{chunk_num}", rules=rules)
+    stats = BankrollStats()
+    for session_num in range(num_sessions):
+        session.player_balance = STARTING_BALANCE
+        own_balance = peak = STARTING_BALANCE
+        drawdown = 0
+        top_ups = 0
+        ruin_round = None
+        for round_num in range(session_rounds):
+            # play_round() tops the balance up first, as on_the_house() does.
+            if session.player_balance <= 10:
+                top_ups += 1
+                if ruin_round is None:
+                    ruin_round = round_num
+            own_balance += play_round(session, strategy)[6]
+            if own_balance > peak:
+                peak = own_balance
+            elif peak - own_balance > drawdown:
+                drawdown = peak - own_balance
+        stats.add_session(session.player_balance, own_balance, drawdown, top_ups, ruin_round)
+    return stats
+
+
+def bankroll_analysis(num_sessions, session_rounds=BANKROLL_SESSION_ROUNDS, seed=None, workers=None, strategy=None,
+                      chunk_sessions=BANKROLL_CHUNK_SESSIONS, rules=None):
+    """Plays num_sessions sessions of session_rounds rounds each, in chunks on every core like
+        simulate(). The results only depend on seed and chunk_sessions.
+    Inputs:
+        num_sessions: Integer number of sessions to play.
+        session_rounds: Integer rounds in each session.
+        seed: Master seed, None to pick one at random.
+        workers: Integer number of processes, default one per core.
+        strategy: HeadlessStrategy making the player's choices, default HeadlessStrategy().
+        chunk_sessions: Integer number of sessions in each chunk.
+        rules: HouseRules to play by, default HOUSE_RULES.
+    Returns:
+        stats: BankrollStats merged from every chunk.
+        seed: The master seed used, to repeat the run.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    if strategy is None:
+        strategy = HeadlessStrategy()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = []
+    for chunk_num, first_session in enumerate(range(0, num_sessions, chunk_sessions)):
+        chunks.append((chunk_num, min(chunk_sessions, num_sessions - first_session), session_rounds, seed, strategy, rules or HOUSE_RULES))
+
+    if workers <= 1 or len(chunks) <= 1:
+        results = [bankroll_chunk(chunk) for chunk in chunks]
+    else:
+        with multiprocessing.Pool(min(workers, len(chunks))) as pool:
+            results = pool.map(bankroll_chunk, chunks)
+
+    stats = BankrollStats()
+    for chunk_stats in results:
+        stats.merge(chunk_stats)
+    return stats, seed
+
+
+def display_bankroll(stats, session_rounds, seed, elapsed):
+    """Prints the bankroll and risk of ruin report of bankroll_analysis().
+    Inputs:
+        stats: BankrollStats to display.
+        session_rounds: Integer rounds in each session.
+        seed: Master seed of the analysis.
+        elapsed: Float number of seconds the analysis took.
+    """
+    sessions = max(stats.sessions, 1)
+    print(f"Played {stats.sessions} sessions of {session_rounds} rounds in {elapsed:.2f} seconds "
+          f"({stats.sessions * session_rounds / max(elapsed, 1e-9):.0f} rounds/sec), seed {seed}")
+    print(f"Risk of ruin (balance of 10 or less): {100 * stats.ruined / sessions:.2f}%")
+    if stats.ruined:
+        print(f"Rounds to ruin: mean {stats.ruin_round.mean:.0f}, median {stats.ruin_sketch.quantile(0.5):.0f}")
+    print(f"Courtesy top ups: {stats.top_ups} ({500 * stats.top_ups} credits, {stats.top_ups / sessions:.2f} per session)")
+    print(f"Finished ahead: {100 * stats.ahead / sessions:.2f}%  Ahead after being ruined: {100 * stats.rescued / sessions:.2f}%")
+    print(f"\n{'':<22}{'mean':>10}" + "".join(f"{'p' + format(100 * fraction, 'g'):>9}" for fraction in BANKROLL_PERCENTILES))
+    for name, moments, sketch in (("Final balance", stats.final_balance, stats.final_sketch),
+                                  ("Without top ups", stats.own_balance, stats.own_sketch),
+                                  ("Largest drawdown", stats.drawdown, stats.drawdown_sketch)):
+        print(f"{name:<22}{moments.mean:>10.1f}" + "".join(f"{sketch.quantile(fraction):>9.0f}" for fraction in BANKROLL_PERCENTILES))
+    print("\nFinal balances:")
+    for low, high, count in stats.final_histogram.bins():
+        if count:
+            print(f"{low:>8.0f} to {high:<8.0f}{count:>10}  {'#' * round(50 * count / sessions)}")
+
+
+def sweep_rules(grid, num_rounds, seed=0, workers=None, strategy=None, chunk_rounds=SIM_CHUNK_ROUNDS, cache_dir=SWEEP_CACHE_DIR):
+    """Works out the results of num_rounds rounds for every HouseRules in grid, like simulate(),
+        with the chunks of every set of rules shared out across one process pool.
+        Each result is saved in cache_dir under the hash of its rules and the round count,
+        so running the sweep again only plays rules that have not been played before.
+        Every set of rules is played from the same seeds, with strategy.for_rules() of its rules.
+    Inputs:
+        grid: List of HouseRules.
+        num_rounds: Integer number of rounds for each set of rules.
+        seed: Master seed, the same for every set of rules.
+        workers: Integer number of processes, default one per core.
+        strategy: HeadlessStrategy making the player's choices, default HeadlessStrategy().
+        chunk_rounds: Integer number of rounds in each chunk.
+        cache_dir: String folder of saved results.
+    Returns:
+        results: List of SimulationStats, in the same order as grid.
+        num_cached: Integer number of results read from the cache.
+    """
+    if strategy is None:
+        strategy = HeadlessStrategy()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # Results are only comparable for the same seed, chunks and strategy settings.
+    cache_dir = os.path.join(cache_dir, f"{type(strategy).__name__}_{strategy.config_hash()[:16]}_{seed}_{chunk_rounds}")
+    results = [None] * len(grid)
+    cache_paths = []
+    chunks = []
+    chunk_owners = []
+    for index, rules in enumerate(grid):
+        cache_path = os.path.join(cache_dir, f"{rules.config_hash()[:32]}_{num_rounds}.json")
+        cache_paths.append(cache_path)
+        if os.path.exists(cache_path):
+            with open(cache_path) as cache_file:
+                results[index] = SimulationStats()
+                results[index].load(json.load(cache_file)["stats"])
+            continue
+        rules_strategy = strategy.for_rules(rules)
+        for chunk_num, first_round in enumerate(range(0, num_rounds, chunk_rounds)):
+            chunks.append((chunk_num, min(chunk_rounds, num_rounds - first_round), seed, rules_strategy, 0, rules))
+            chunk_owners.append(index)
+    num_cached = len(grid) - len(set(chunk_owners))
+
+    if workers <= 1 or len(chunks) <= 1:
+        chunk_results = [simulate_chunk(chunk) for chunk in chunks]
+    else:
+        with multiprocessing.Pool(min(workers, len(chunks))) as pool:
+            chunk_results = pool.map(simulate_chunk, chunks)
+
+    for index, chunk_stats in zip(chunk_owners, chunk_results):
+        if results[index] is None:
+            results[index] = SimulationStats()
+        results[index].merge(chunk_stats)
+    os.makedirs(cache_dir, exist_ok=True)
+    for index in set(chunk_owners):
+        # Write then rename, so an interrupted sweep never leaves half a result behind.
+        temp_path = cache_paths[index] + ".tmp"
+        with open(temp_path, "w") as cache_file:
+            json.dump({"rules": grid[index].as_dict(), "rounds": num_rounds, "stats": results[index].as_dict()}, cache_file)
+        os.replace(temp_path, cache_paths[index])
+    return results, num_cached
+
+
+def rules_grid(settings, rules=None):
+    """Makes every combination of House rules from lists of values.
+    Inputs:
+        settings: List of strings of FIELD=VALUE,VALUE,... for the fields to vary.
+        rules: HouseRules for every field not varied, default HOUSE_RULES.
+    Returns:
+        grid: List of HouseRules.
+    """
+    grid = [rules or HOUSE_RULES]
+    for setting in settings:
+        name, _, values = setting.partition("=")
+        grid = [parse_rules([f"{name}={value}"], grid_rules) for grid_rules in grid for value in values.split(",")]
+    return grid
+
+
+def display_sweep(grid, results, num_cached, elapsed):
+    """Prints the house edge of every set of rules in a sweep.
+    Inputs:
+        grid: List of HouseRules.
+        results: List of SimulationStats from sweep_rules().
+        num_cached: Integer number of results read from the cache.
+        elapsed: Float number of seconds the sweep took.
+    """
+    # Only show the rules that change across the grid.
+    varied = [name for name in HouseRules.__slots__ if len({getattr(rules, name) for rules in grid}) > 1]
+    print(f"Swept {len(grid)} sets of House rules in {elapsed:.2f} seconds, {num_cached} from the cache")
+    print("".join(f"{name:>17}" for name in varied) + f"{'rounds':>12}{'house edge':>12}")
+    for rules, stats in zip(grid, results):
+        house_edge = -100 * stats.net_win / max(stats.total_wagered, 1)
+        print("".join(f"{getattr(rules, name):>17}" for name in varied) + f"{stats.rounds:>12}{house_edge:>11.3f}%")
+
+
+def simulate_dealer_batch(num_rounds, seed=None, player_totals=None, player_stand=17, batch_size=1000000, rules=None):
+    """Plays num_rounds independent rounds at once with NumPy, each from its own newly shuffled
+        shoe. Every row of a batch is one round: the shoes are a (rounds, cards) int8 matrix of
+        card values, and the hand totals and soft Aces are vectors. Cards are drawn for every
+        row that is still drawing until all rows have settled, using the same rules as
+        dealer_plays_hand(), including the random max_num.
+        The player hits until player_stand and never splits, doubles or buys insurance.
+        If player_totals is given, the player's cards are skipped and the House plays
+        against those totals instead.
+    Inputs:
+        num_rounds: Integer number of rounds to play.
+        seed: Integer seed for NumPy's random generator, None for a random run.
+        player_totals: Integer or array of num_rounds player totals, None to play the player's hand.
+        player_stand: Integer total the player stands on.
+        batch_size: Integer number of rounds held in memory at once.
+        rules: HouseRules for the number of decks and the House's stops, default HOUSE_RULES.
+    Returns:
+        dealer_totals: NumPy array counting the House's final totals, index 22 and above are busts.
+        wins: Integer number of rounds the player won.
+        pushes: Integer number of rounds that were a push.
+        losses: Integer number of rounds the player lost.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("simulate_dealer_batch() needs NumPy, install it with: pip install numpy") from None
+
+    rules = rules or HOUSE_RULES
+    rng = np.random.default_rng(None if seed is None else int(seed))
+    pack_values = np.array(CARD_VALUES, dtype=np.int8)
+    shoe_values = np.tile(pack_values, rules.num_decks)
+    dealer_totals = np.zeros(33, dtype=np.int64)
+    wins = 0
+    pushes = 0
+    losses = 0
+
+    for first_round in range(0, num_rounds, batch_size):
+        n = min(batch_size, num_rounds - first_round)
+        rows = np.arange(n)
+        # One shoe of card values per round. Shoes are shuffled as they are dealt: each deal
+        # swaps a random card from the rest of the shoe to the cursor, so only the few cards
+        # a round uses are ever shuffled.
+        shoes = np.tile(shoe_values, (n, 1))
+        cursor = np.zeros(n, dtype=np.int16)
+
+        def deal(total, soft_aces, drawing):
+            # Deal one card to every row still drawing, then count Aces as 1 while bust.
+            drawing_rows = rows[drawing]
+            position = cursor[drawing_rows]
+            swap = rng.integers(position, shoe_values.size, dtype=np.int16)
+            card_value = shoes[drawing_rows, swap]
+            shoes[drawing_rows, swap] = shoes[drawing_rows, position]
+            shoes[drawing_rows, position] = card_value
+            cursor[drawing_rows] += 1
+            total[drawing_rows] += card_value
+            soft_aces[drawing_rows] += (card_value == 11)
+            bust = (total > 21) & (soft_aces > 0)
+            while bust.any():
+                total[bust] -= 10
+                soft_aces[bust] -= 1
+                bust = (total > 21) & (soft_aces > 0)
+
+        everyone = np.ones(n, dtype=bool)
+        if player_totals is None:
+            # start_player_cards() then hit until player_stand.
+            player_total = np.zeros(n, dtype=np.int16)
+            player_soft = np.zeros(n, dtype=np.int16)
+            deal(player_total, player_soft, everyone)
+            deal(player_total, player_soft, everyone)
+        else:
+            player_total = np.broadcast_to(np.asarray(player_totals, dtype=np.int16), (num_rounds,))[first_round:first_round + n].copy()
+
+        # start_dealer_cards()
+        dealer_total = np.zeros(n, dtype=np.int16)
+        dealer_soft = np.zeros(n, dtype=np.int16)
+        deal(dealer_total, dealer_soft, everyone)
+        deal(dealer_total, dealer_soft, everyone)
+
+        if player_totals is None:
+            hitting = player_total < player_stand
+            while hitting.any():
+                deal(player_total, player_soft, hitting)
+                hitting = player_total < player_stand
+
+        # dealer_plays_hand(), the House only draws if the player did not bust.
+        max_num = rng.integers(rules.dealer_stop_min, rules.dealer_stop_max + 1, size=n, dtype=np.int16)
+        drawing = (player_total <= 21) & (dealer_total <= max_num) & (dealer_total < player_total)
+        while drawing.any():
+            deal(dealer_total, dealer_soft, drawing)
+            drawing &= (dealer_total <= max_num) & (dealer_total < player_total)
+
+        # settlements()
+        outcome = np.where(player_total > 21, -1, np.where(dealer_total > 21, 1, np.sign(player_total - dealer_total)))
+        wins += int(np.count_nonzero(outcome > 0))
+        losses += int(np.count_nonzero(outcome < 0))
+        pushes += int(np.count_nonzero(outcome == 0))
+        dealer_totals += np.bincount(dealer_total, minlength=33)[:33]
+
+    return dealer_totals, wins, pushes, losses
+
+
+def display_dealer_batch(dealer_totals, wins, pushes, losses, elapsed):
+    """Prints a summery of simulate_dealer_batch().
+    Inputs:
+        dealer_totals: NumPy array counting the House's final totals.
+        wins, pushes, losses: Integer number of rounds for each outcome.
+        elapsed: Float number of seconds the simulation took.
+    """
+    num_rounds = wins + pushes + losses
+    print(f"Simulated {num_rounds} rounds in {elapsed:.2f} seconds ({num_rounds / max(elapsed, 1e-9):.0f} rounds/sec)")
+    print("House final totals:")
+    for total in range(2, 22):
+        if dealer_totals[total]:
+            print(f"  {total}: {100 * dealer_totals[total] / num_rounds:.3f}%")
+    print(f"  Bust: {100 * dealer_totals[22:].sum() / num_rounds:.3f}%")
+    print(f"Player wins: {100 * wins / num_rounds:.2f}%  Push: {100 * pushes / num_rounds:.2f}%  Losses: {100 * losses / num_rounds:.2f}%")
+    print(f"Player net return: {100 * (wins - losses) / num_rounds:.3f}% of credits wagered")
+
+
+def full_shoe_composition(num_decks=NUM_OF_DECKS):
+    """Counts each card value in a new shoe.
+    Inputs:
+        num_decks: Integer number of packs of cards in the shoe.
+    Returns:
+        composition: Tuple of 10 integer counts, for card values 2 to 11 in order.
+    """
+    composition = [0] * 10
+    for card in range(52):
+        composition[CARD_VALUES[card] - 2] += num_decks
+    return tuple(composition)
+
+
+def shoe_composition(card_deck):
+    """Counts each card value still left to deal in a Shoe. The Shoe keeps these counts as it
+        deals, so nothing is counted here.
+    Inputs:
+        card_deck: Shoe of card ids.
+    Returns:
+        composition: Tuple of 10 integer counts, for card values 2 to 11 in order.
+    """
+    return tuple(card_deck.remaining)
+
+
+def ten_chance(counts):
+    """Works out the chance that a card the player has not seen, such as the House's face down
+        card, is worth 10.
+    Inputs:
+        counts: List of 10 integer counts of the unseen card values 2 to 11.
+    Returns:
+        Float chance of a 10.
+    """
+    return counts[8] / max(sum(counts), 1)
+
+
+def insurance_value(chance_of_ten, insurance_bet):
+    """Works out the expected credits won by buying insurance, which pays 2 to 1 when the
+        House has a 10 under its Ace and is lost otherwise.
+    Inputs:
+        chance_of_ten: Float chance the face down card is worth 10, see ten_chance().
+        insurance_bet: Integer price of the insurance.
+    Returns:
+        Float expected credits won, negative when insurance is a losing bet.
+    """
+    return chance_of_ten * 2 * insurance_bet - (1 - chance_of_ten) * insurance_bet
+
+
+@functools.lru_cache(maxsize=DEALER_CACHE_SIZE)
+def dealer_draw_probabilities(dealer_hand_value, soft_aces, max_num, player_winning_hand, composition):
+    """Works out exactly how a hand the House has started will finish, by trying every card left
+        in the shoe, weighted by how many of it are left. The House keeps drawing like
+        dealer_plays_hand(): while its value is at most max_num and below the player's hand.
+    Inputs:
+        dealer_hand_value: Integer value of the House's hand so far.
+        soft_aces: Integer number of Aces in the hand still counted as 11.
+        max_num: Integer the House feels lucky to go to, one of the House rules' dealer_stops.
+        player_winning_hand: Integer value of the player's best hand.
+        composition: Tuple of 10 integer counts of card values 2 to 11 left in the shoe.
+    Returns:
+        Tuple of 23 floats, the chance of each final value 0-21, and of a bust at DEALER_BUST.
+    """
+    probabilities = [0.0] * (DEALER_BUST + 1)
+    cards_left = sum(composition)
+    if dealer_hand_value > max_num or dealer_hand_value >= player_winning_hand or cards_left == 0:
+        probabilities[min(dealer_hand_value, DEALER_BUST)] = 1.0
+        return tuple(probabilities)
+
+    for i in range(10):
+        count = composition[i]
+        if count == 0:
+            continue
+        # Add the card to the hand, counting Aces as 1 while bust.
+        card_value = i + 2
+        new_value = dealer_hand_value + card_value
+        new_soft_aces = soft_aces + (card_value == 11)
+        while new_value > 21 and new_soft_aces:
+            new_value -= 10
+            new_soft_aces -= 1
+        if new_value > 21:
+            probabilities[DEALER_BUST] += count / cards_left
+            continue
+        new_composition = composition[:i] + (count - 1,) + composition[i + 1:]
+        outcome = dealer_draw_probabilities(new_value, new_soft_aces, max_num, player_winning_hand, new_composition)
+        weight = count / cards_left
+        for total in range(DEALER_BUST + 1):
+            probabilities[total] += weight * outcome[total]
+    return tuple(probabilities)
+
+
+@functools.lru_cache(maxsize=DEALER_CACHE_SIZE)
+def dealer_outcome_probabilities(dealer_upcard_value, player_winning_hand, composition, dealer_stops):
+    """Works out exactly how the House's hand will finish, from its face up card and the cards
+        left in the shoe, by trying every face down card and every card the House could draw.
+        max_num is any of dealer_stops with even chances, and the House does not draw at all if the
+        player is bust, the same as dealer_plays_hand().
+        Results are kept in a bounded cache, so asking again costs a dictionary lookup. The
+        stops are part of the key, so results for other House rules are never mixed up.
+    Inputs:
+        dealer_upcard_value: Integer value 2-11 of the House's face up card.
+        player_winning_hand: Integer value of the player's best hand.
+        composition: Tuple of 10 integer counts of card values 2 to 11 left in the shoe,
+            not counting the face up card.
+        dealer_stops: Range of every max_num, the dealer_stops of the House rules.
+    Returns:
+        Tuple of 23 floats, the chance of each final value 0-21, and of a bust at DEALER_BUST.
+    """
+    probabilities = [0.0] * (DEALER_BUST + 1)
+    cards_left = sum(composition)
+    for i in range(10):
+        count = composition[i]
+        if count == 0:
+            continue
+        # Face down card.
+        dealer_hand = Hand()
+        dealer_hand.add(CARD_VALUE_IDS[dealer_upcard_value])
+        dealer_hand.add(CARD_VALUE_IDS[i + 2])
+        new_composition = composition[:i] + (count - 1,) + composition[i + 1:]
+        weight = count / cards_left
+        if player_winning_hand > 21:
+            probabilities[dealer_hand.value] += weight
+            continue
+        for max_num in dealer_stops:
+            outcome = dealer_draw_probabilities(dealer_hand.value, dealer_hand.soft_aces, max_num, player_winning_hand, new_composition)
+            for total in range(DEALER_BUST + 1):
+                probabilities[total] += weight / len(dealer_stops) * outcome[total]
+    return tuple(probabilities)
+
+
+def player_outcome_probabilities(dealer_probabilities, player_hand_value):
+    """Works out the player's chances with a hand against the House's final values, checked in
+        the same order as settlements().
+    Inputs:
+        dealer_probabilities: Tuple from dealer_outcome_probabilities().
+        player_hand_value: Integer value of the player's hand.
+    Returns:
+        win: Float chance the player wins.
+        push: Float chance of a push.
+        lose: Float chance the player loses.
+    """
+    if player_hand_value > 21:
+        return 0.0, 0.0, 1.0
+    win = dealer_probabilities[DEALER_BUST] + sum(dealer_probabilities[:player_hand_value])
+    push = dealer_probabilities[player_hand_value]
+    return win, push, 1.0 - win - push
+
+
+def display_dealer_table(player_winning_hand, rules=None):
+    """Prints the House's exact odds against a player's hand for every face up card, from a
+        new shoe.
+    Inputs:
+        player_winning_hand: Integer value of the player's hand.
+        rules: HouseRules for the number of decks and the House's stops, default HOUSE_RULES.
+    """
+    rules = rules or HOUSE_RULES
+    print(f"The House against a player hand of {player_winning_hand}, {rules.num_decks} decks:")
+    print("Face up   17+ / lower   Bust     Player wins  Push     Player loses")
+    shoe = full_shoe_composition(rules.num_decks)
+    for dealer_upcard_value in range(2, 12):
+        composition = list(shoe)
+        composition[dealer_upcard_value - 2] -= 1
+        probabilities = dealer_outcome_probabilities(dealer_upcard_value, player_winning_hand, tuple(composition), rules.dealer_stops)
+        win, push, lose = player_outcome_probabilities(probabilities, player_winning_hand)
+        high = sum(probabilities[17:22])
+        low = sum(probabilities[:17])
+        print(f"{dealer_upcard_value:>7}   {100 * high:5.1f}% / {100 * low:4.1f}%   {100 * probabilities[DEALER_BUST]:5.1f}%   "
+              f"{100 * win:5.1f}%       {100 * push:5.1f}%   {100 * lose:5.1f}%")
+
+
+def strategy_index(player_hand_value, soft, pair, dealer_upcard_value):
+    """Position of a hand in the flat strategy tables.
+    Inputs:
+        player_hand_value: Integer value 0-21 of the player's hand.
+        soft: 1 if an Ace in the hand is counted as 11, else 0.
+        pair: 1 if the hand is two cards of the same value, else 0.
+        dealer_upcard_value: Integer value 2-11 of the House's face up card.
+    Returns:
+        Integer index into the tables from build_strategy_table().
+    """
+    return ((player_hand_value * 2 + soft) * 2 + pair) * 12 + dealer_upcard_value
+
+
+def add_card_value(player_hand_value, soft, card_value):
+    """Adds a card value to a hand total the same way as Hand.add().
+    Inputs:
+        player_hand_value: Integer value of the hand.
+        soft: 1 if an Ace in the hand is counted as 11, else 0.
+        card_value: Integer value 2-11 of the new card.
+    Returns:
+        player_hand_value: Integer new value of the hand.
+        soft: 1 if an Ace in the new hand is counted as 11, else 0.
+    """
+    player_hand_value += card_value
+    soft_aces = soft + (card_value == 11)
+    while player_hand_value > 21 and soft_aces:
+        player_hand_value -= 10
+        soft_aces -= 1
+    return player_hand_value, min(soft_aces, 1)
+
+
+def hand_action_values(dealer_distributions, composition):
+    """Works out the expected value, per credit bet, of standing, hitting and doubling down on
+        every hand, with the player drawing from composition and the House finishing as given
+        by dealer_distributions. Hitting is valued as playing on with the best choices after
+        each card, and stops at 21 like hit_or_stand().
+    Inputs:
+        dealer_distributions: Dictionary of player hand value 4-21 to the tuple from
+            dealer_outcome_probabilities() against that value.
+        composition: Tuple of 10 integer counts of card values 2 to 11 left in the shoe.
+    Returns:
+        stand: Dictionary of hand value to expected value of standing.
+        hit_value: Function of (hand value, soft) to expected value of hitting.
+        double_value: Function of (hand value, soft) to expected value of doubling down.
+    """
+    cards_left = sum(composition)
+    draws = [(i + 2, composition[i] / cards_left) for i in range(10) if composition[i]]
+    stand = {}
+    for player_hand_value in range(4, 22):
+        win, push, lose = player_outcome_probabilities(dealer_distributions[player_hand_value], player_hand_value)
+        stand[player_hand_value] = win - lose
+
+    hits = {}
+    def hit_value(player_hand_value, soft):
+        key = (player_hand_value, soft)
+        if key not in hits:
+            expected = 0.0
+            for card_value, chance in draws:
+                new_value, new_soft = add_card_value(player_hand_value, soft, card_value)
+                if new_value > 21:
+                    expected -= chance
+                elif new_value == 21:
+                    expected += chance * stand[21]
+                else:
+                    expected += chance * max(stand[new_value], hit_value(new_value, new_soft))
+            hits[key] = expected
+        return hits[key]
+
+    def double_value(player_hand_value, soft):
+        expected = 0.0
+        for card_value, chance in draws:
+            new_value, new_soft = add_card_value(player_hand_value, soft, card_value)
+            expected += chance * (stand[new_value] if new_value <= 21 else -1.0)
+        return 2 * expected
+
+    return stand, hit_value, double_value
+
+
+def split_value(card_value, composition, stand, hit_value, double_value, rules):
+    """Works out the expected value, per credit of the opening bet, of splitting a pair, played
+        like player_split_hand(): the split hand doubles its bet on 21, or can double down and
+        still hit, and the main hand is then played like player_main_hand(). Each hand is
+        valued as if the House were playing against it alone.
+    Inputs:
+        card_value: Integer value 2-11 of each card in the pair.
+        composition: Tuple of 10 integer counts of card values 2 to 11 left in the shoe.
+        stand, hit_value, double_value: From hand_action_values().
+        rules: HouseRules for the split 21 bonus and the totals that can double down.
+    Returns:
+        Float expected value of both hands together.
+    """
+    cards_left = sum(composition)
+    draws = [(i + 2, composition[i] / cards_left) for i in range(10) if composition[i]]
+    def play_on(player_hand_value, soft):
+        if player_hand_value > 21:
+            return -1.0
+        if player_hand_value == 21:
+            return stand[21]
+        return max(stand[player_hand_value], hit_value(player_hand_value, soft))
+
+    expected = 0.0
+    first_value, first_soft = add_card_value(0, 0, card_value)
+    for new_card_value, chance in draws:
+        player_hand_value, soft = add_card_value(first_value, first_soft, new_card_value)
+        if player_hand_value == 21:
+            split_hand = rules.split_21_bonus * stand[21] #We are extra friendly, 4:1
+            main_hand = stand[21]
+        else:
+            split_hand = play_on(player_hand_value, soft)
+            main_hand = split_hand
+            if player_hand_value >= rules.double_min and player_hand_value <= rules.double_max:
+                doubled = 0.0
+                for double_card_value, double_chance in draws:
+                    doubled += double_chance * play_on(*add_card_value(player_hand_value, soft, double_card_value))
+                split_hand = max(split_hand, 2 * doubled)
+                main_hand = max(main_hand, double_value(player_hand_value, soft))
+        expected += chance * (split_hand + main_hand)
+    return expected
+
+
+def build_strategy_table(rules=None):
+    """Works out the best choice for every hand against every face up card under this game's
+        House rules: the House stops once ahead of the player with a random limit, double
+        down only on a few totals, one split with a bonus on a split 21, and insurance that ends
+        the round when it wins, all as set in rules. Expected values come from the exact House odds of
+        dealer_outcome_probabilities() with the player drawing from a new shoe, so the
+        results are for the start of a shoe. Every table is indexed by strategy_index().
+    Inputs:
+        rules: HouseRules to play by, default HOUSE_RULES.
+    Returns:
+        actions: bytearray of the best ACTION_ for the first choice on a two card hand.
+        hits: bytearray of 1 where hitting beats standing, used after the first choice.
+        insurance: bytearray of 1 where buying insurance beats declining it.
+        values: array of the expected value of the best first choice, per credit bet.
+    """
+    rules = rules or HOUSE_RULES
+    shoe = full_shoe_composition(rules.num_decks)
+    double_min = rules.double_min
+    double_max = rules.double_max
+    actions = bytearray(STRATEGY_TABLE_SIZE)
+    hits = bytearray(STRATEGY_TABLE_SIZE)
+    insurance = bytearray(STRATEGY_TABLE_SIZE)
+    values = array.array("d", bytes(8 * STRATEGY_TABLE_SIZE))
+
+    for dealer_upcard_value in range(2, 12):
+        composition = list(shoe)
+        composition[dealer_upcard_value - 2] -= 1
+        composition = tuple(composition)
+        dealer_distributions = {}
+        for player_hand_value in range(4, 22):
+            dealer_distributions[player_hand_value] = dealer_outcome_probabilities(dealer_upcard_value, player_hand_value, composition,
+                                                                                   rules.dealer_stops)
+        stand, hit_value, double_value = hand_action_values(dealer_distributions, composition)
+
+        def best_choice(player_hand_value, soft, pair):
+            # Natural 21 has no choices.
+            if player_hand_value == 21:
+                return ACTION_STAND, stand[21]
+            choices = [(stand[player_hand_value], ACTION_STAND), (hit_value(player_hand_value, soft), ACTION_HIT)]
+            if player_hand_value >= double_min and player_hand_value <= double_max:
+                choices.append((double_value(player_hand_value, soft), ACTION_DOUBLE))
+            if pair:
+                pair_value = 11 if soft else player_hand_value // 2
+                choices.append((split_value(pair_value, composition, stand, hit_value, double_value, rules), ACTION_SPLIT))
+            expected, action = max(choices)
+            return action, expected
+
+        # With an Ace showing, insurance is valued against the House's odds when the face
+        # down card is not a 10. When it is a 10, insurance wins twice its price and the bet is lost.
+        if dealer_upcard_value == 11:
+            chance_of_ten = composition[8] / sum(composition)
+            no_ten_distributions = {}
+            for player_hand_value in range(4, 22):
+                outcome = [0.0] * (DEALER_BUST + 1)
+                for i in range(10):
+                    if i == 8 or composition[i] == 0:
+                        continue
+                    weight = composition[i] / (sum(composition) - composition[8])
+                    dealer_hand_value, soft_aces = add_card_value(11, 1, i + 2)
+                    hole_composition = composition[:i] + (composition[i] - 1,) + composition[i + 1:]
+                    for max_num in rules.dealer_stops:
+                        draw = dealer_draw_probabilities(dealer_hand_value, soft_aces, max_num, player_hand_value, hole_composition)
+                        for total in range(DEALER_BUST + 1):
+                            outcome[total] += weight / len(rules.dealer_stops) * draw[total]
+                no_ten_distributions[player_hand_value] = tuple(outcome)
+            no_ten_stand, no_ten_hit, no_ten_double = hand_action_values(no_ten_distributions, composition)
+
+        for player_hand_value in range(4, 22):
+            for soft in (0, 1):
+                if soft and player_hand_value < 12:
+                    continue
+                hit_it = player_hand_value < 21 and hit_value(player_hand_value, soft) > stand[player_hand_value]
+                for pair in (0, 1):
+                    if pair and not (player_hand_value % 2 == 0 and player_hand_value <= 20 and (soft == 0 or player_hand_value == 12)):
+                        continue
+                    index = strategy_index(player_hand_value, soft, pair, dealer_upcard_value)
+                    action, expected = best_choice(player_hand_value, soft, pair)
+                    actions[index] = action
+                    values[index] = expected
+                    hits[index] = hit_it
+                    if dealer_upcard_value == 11 and player_hand_value < 21:
+                        no_ten_best = max(no_ten_stand[player_hand_value], no_ten_hit(player_hand_value, soft))
+                        if player_hand_value >= double_min and player_hand_value <= double_max:
+                            no_ten_best = max(no_ten_best, no_ten_double(player_hand_value, soft))
+                        insurance_rate = rules.insurance_rate
+                        insured = chance_of_ten * (2 * insurance_rate - 1) + (1 - chance_of_ten) * (no_ten_best - insurance_rate)
+                        insurance[index] = insured > expected
+    return actions, hits, insurance, values
+
+
+class TableStrategy(HeadlessStrategy):
+    """HeadlessStrategy that looks up every choice in the tables from build_strategy_table(),
+        so each choice costs one index into a flat array. The tables are worked out for
+        rules, default HOUSE_RULES, unless they are given.
+    """
+    def __init__(self, table=None, rules=None):
+        self.rules = rules or HOUSE_RULES
+        if table is None:
+            table = build_strategy_table(self.rules)
+        self.actions, self.hits, self.insurance, self.values = table
+
+    def settings(self):
+        return super().settings() + (bytes(self.actions), bytes(self.hits), bytes(self.insurance))
+
+    def for_rules(self, rules):
+        # Same strategy with its tables worked out again for the other rules.
+        if rules.as_dict() == self.rules.as_dict():
+            return self
+        strategy = copy.copy(self)
+        strategy.rules = rules
+        strategy.actions, strategy.hits, strategy.insurance, strategy.values = build_strategy_table(rules)
+        return strategy
+
+    def index(self, player_hand, dealer_upcard):
+        pair = len(player_hand) == 2 and CARD_VALUES[player_hand[0]] == CARD_VALUES[player_hand[1]]
+        return ((player_hand.value * 2 + player_hand.is_soft) * 2 + pair) * 12 + CARD_VALUES[dealer_upcard]
+
+    def take_insurance(self, session, player_hand, dealer_upcard, insurance_bet):
+        return self.insurance[self.index(player_hand, dealer_upcard)] == 1
+
+    def split(self, session, player_hand, dealer_upcard, bet_amount):
+        return self.actions[self.index(player_hand, dealer_upcard)] == ACTION_SPLIT
+
+    def double_down(self, session, player_hand, dealer_upcard, bet_amount):
+        action = self.actions[self.index(player_hand, dealer_upcard)]
+        if action == ACTION_SPLIT:
+            # The split was not offered (short balance or a pair dealt after a split), so
+            # play the pair as any other hand of its value.
+            action = self.actions[strategy_index(player_hand.value, player_hand.is_soft, 0, CARD_VALUES[dealer_upcard])]
+        return action == ACTION_DOUBLE
+
+    def hit(self, session, player_hand, dealer_upcard):
+        if player_hand.value >= 21:
+            return False
+        return self.hits[self.index(player_hand, dealer_upcard)] == 1
+
+
+class CountingStrategy(TableStrategy):
+    """TableStrategy that also counts cards with the Hi-Lo count the Shoe keeps as it deals.
+        The opening bet is base_bet times the true count, from 1 to max_spread times, and
+        insurance is bought whenever the cards the player has not seen make it worth buying.
+    """
+    def __init__(self, table=None, base_bet=10, max_spread=8, rules=None):
+        super().__init__(table, rules)
+        self.base_bet = base_bet
+        self.max_spread = max_spread
+        self.round_counts = None
+
+    def settings(self):
+        return super().settings() + (self.base_bet, self.max_spread)
+
+    def opening_bet(self, session):
+        card_deck = session.card_deck
+        # Everything dealt before this round has been seen, the last face down card included.
+        self.round_counts = card_deck.unseen_counts()
+        spread = min(max(int(card_deck.true_count), 1), self.max_spread)
+        return min(self.base_bet * spread, session.player_balance)
+
+    def take_insurance(self, session, player_hand, dealer_upcard, insurance_bet):
+        # Unseen now are the cards left at the start of the round, less the ones on show.
+        counts = list(self.round_counts)
+        for card in (player_hand[0], player_hand[1], dealer_upcard):
+            counts[CARD_VALUES[card] - 2] -= 1
+        return insurance_value(ten_chance(counts), insurance_bet) > 0
+
+
+def display_strategy_table(table):
+    """Prints the tables from build_strategy_table() as charts of (S)tand, (H)it, (D)ouble
+        and S(P)lit, with a * where insurance should be bought against an Ace.
+    Inputs:
+        table: Tuple returned by build_strategy_table().
+    """
+    actions, hits, insurance, values = table
+    letters = "SHDP"
+    header = "         " + " ".join(f"{dealer_upcard_value:>2}" for dealer_upcard_value in range(2, 12))
+    charts = (("Hard", range(5, 21), 0, 0), ("Soft", range(13, 21), 1, 0), ("Pair", range(4, 21, 2), 0, 1))
+    for title, totals, soft, pair in charts:
+        print(f"\n{title} totals\n{header}")
+        for player_hand_value in totals:
+            row = []
+            for dealer_upcard_value in range(2, 12):
+                index = strategy_index(player_hand_value, soft, pair, dealer_upcard_value)
+                mark = "*" if insurance[index] else " "
+                row.append(f" {letters[actions[index]]}{mark}")
+            print(f"{player_hand_value:>8} " + "".join(row))
+        if pair:
+            row = [f" {letters[actions[strategy_index(12, 1, 1, dealer_upcard_value)]]}" + ("*" if insurance[strategy_index(12, 1, 1, dealer_upcard_value)] else " ")
+                   for dealer_upcard_value in range(2, 12)]
+            print("     A,A " + "".join(row))
+
+
+STRATEGY_NAMES = ("default", "table", "count") # Strategies that can be picked on the command line.
+
+
+def make_strategy(name):
+    """Makes a strategy from its name on the command line.
+    Inputs:
+        name: String, one of STRATEGY_NAMES.
+    Returns:
+        HeadlessStrategy for default, TableStrategy for table or CountingStrategy for count.
+    """
+    if name == "table":
+        return TableStrategy()
+    if name == "count":
+        return CountingStrategy()
+    return HeadlessStrategy()
+
+
+# Answers accepted by the table server for yes or no questions.
+YES_NO_ANSWERS = {"y": True, "yes": True, "n": False, "no": False}
+HIT_STAND_ANSWERS = {"h": True, "hit": True, "s": False, "stand": False}
+
+
+async def send_text(writer, text):
+    """Sends text to a connected player, with telnet line endings.
+    Inputs:
+        writer: asyncio StreamWriter of the player's connection.
+        text: String to send.
+    """
+    writer.write(text.replace("\n", "\r\n").encode())
+    await writer.drain()
+
+
+async def ask_player(reader, writer, prompt, answers, metrics=None):
+    """Asks a connected player a question until they give one of the answers. Waiting for an
+        answer does not block any other player.
+    Inputs:
+        reader: asyncio StreamReader of the player's connection.
+        writer: asyncio StreamWriter of the player's connection.
+        prompt: String question to send.
+        answers: Dictionary of accepted answers (lower case) to the value to return, or
+            a function that returns the value or None if the answer is not valid.
+        metrics: Metrics to time the player's answer in, None to not time it.
+    Returns:
+        The value of the player's answer.
+    """
+    while True:
+        await send_text(writer, prompt)
+        if metrics is not None:
+            asked = time.perf_counter()
+        line = await reader.readline()
+        if metrics is not None:
+            metrics.observe(METRIC_DECISION, time.perf_counter() - asked)
+        if not line:
+            raise ConnectionError("Player disconnected.")
+        answer = line.decode(errors="replace").strip().lower()
+        if callable(answers):
+            value = answers(answer)
+            if value is not None:
+                return value
+        elif answer in answers:
+            return answers[answer]
+
+
+def hand_text(source_hand, name):
+    """Same text as display_full_hand().
+    Inputs:
+        source_hand: Hand of card ids.
+        name: A string for "Name" of who's hand the cards belong to.
+    Returns:
+        String of the cards and value of the hand.
+    """
+    cards_in_hand = ", ".join(CARD_NAMES[card] for card in source_hand)
+    return f"{name} has cards: {cards_in_hand}\n{name} hand value is: {source_hand.value}\n"
+
+
+class TablePlayer:
+    """A connected player, as the strategy of round_steps() with waits. The choices have the
+        same names and inputs as HeadlessStrategy but ask the player, and every other method
+        shows the player what just happened with the same text as blackjack(). All of them
+        are coroutines, and the pauses are asyncio.sleep(), so every other table keeps
+        playing meanwhile. There are no "Press Enter" stops.
+    """
+    def __init__(self, reader, writer, pause_seconds=MED_PAUSE, metrics=None):
+        self.reader = reader
+        self.writer = writer
+        self.pause_seconds = pause_seconds
+        self.metrics = metrics
+        # Won or lost on insurance this round, for the balance shown when offered a split.
+        self.insurance_bet = 0
+        # The split off hand this round, whose 21 is not a natural.
+        self.split_hand = None
+
+    async def ask(self, prompt, answers):
+        return await ask_player(self.reader, self.writer, prompt, answers, self.metrics)
+
+    async def show(self, text):
+        await send_text(self.writer, text)
+
+    async def wait(self):
+        await asyncio.sleep(self.pause_seconds)
+
+    async def shuffled(self, session):
+        await self.show("\nShuffling new deck...\n\n")
+        await self.wait()
+
+    async def topped_up(self, session):
+        await self.show(f"Have some fun with an extra 500 credits, courtesy of the House.\nPlayer's new balance is: {session.player_balance} credits\n")
+        await self.wait()
+
+    async def opening_bet(self, session):
+        player_balance = session.player_balance
+        def valid_bet(answer):
+            if answer.isdigit() and 1 <= int(answer) <= player_balance:
+                return int(answer)
+            return None
+        bet_amount = await self.ask(f"Your current balance is {player_balance} credits. \nPlace an opening bet: ", valid_bet)
+        await self.show(f"You have placed a bet of {bet_amount} credits.\nBets are closed, the dealer has begun to deal cards.\n")
+        await self.wait()
+        self.insurance_bet = 0
+        self.split_hand = None
+        return bet_amount
+
+    async def hands_dealt(self, session, player_hand, dealer_hand):
+        await self.show(f"\nPlayer has cards: {CARD_NAMES[player_hand[0]]} and {CARD_NAMES[player_hand[1]]}.  (Value of: {player_hand.value})\n"
+                        f"House has cards: (Face Down) and {CARD_NAMES[dealer_hand[1]]}.  (Value of: {CARD_VALUES[dealer_hand[1]]}+)\n")
+        await self.wait()
+
+    async def take_insurance(self, session, player_hand, dealer_upcard, insurance_bet):
+        await self.show(f"\nThe House has an Ace. Your balance is: {(session.player_balance - session.opening_bet)} credits\n")
+        return await self.ask(f"Would you like to buy insurance for {insurance_bet} credits? " + YES_NO, YES_NO_ANSWERS)
+
+    async def insurance_settled(self, session, dealer_hand, insurance_bet):
+        self.insurance_bet = insurance_bet
+        if insurance_bet > 0:
+            await self.show(f"Dealer revels face down card: {CARD_NAMES[dealer_hand[0]]}\nPlayers insurance payout is {insurance_bet} credits.\n")
+        else:
+            await self.show("The House does not have 21. Insurance bet is lost.\n")
+        await self.show(f" Your balance is: {(session.player_balance - session.opening_bet) + insurance_bet} credits\n")
+
+    async def split(self, session, player_hand, dealer_upcard, bet_amount):
+        await self.show(f"\nYour balance is: {(session.player_balance + self.insurance_bet - bet_amount)} credits.\n")
+        return await self.ask(f"Would you like to split for {bet_amount} credits? " + YES_NO, YES_NO_ANSWERS)
+
+    async def split_started(self, session, player_hand2):
+        self.split_hand = player_hand2
+        await self.show("Player has chosen to split.\n\n")
+        await self.wait()
+        await self.show(f"Player first hand has: {CARD_NAMES[player_hand2[0]]}\n")
+
+    async def second_hand(self, session, player_hand):
+        await self.show(f"Player second hand has: {CARD_NAMES[player_hand[0]]}\n")
+
+    async def card_dealt(self, session, player_hand):
+        await self.show(f"Player is dealt card: {CARD_NAMES[player_hand[-1]]}\n" + hand_text(player_hand, "Player"))
+
+    async def hand_is_21(self, session, player_hand):
+        if player_hand is self.split_hand:
+            await self.show(f"Blackjack, Congratulations! {player_hand.value}.\n\n")
+        else:
+            await self.show(f"Blackjack, Congratulations! Player has natural {player_hand.value}.\n\n")
+
+    async def double_down(self, session, player_hand, dealer_upcard, bet_amount):
+        return await self.ask(DOUBLE_DOWN, YES_NO_ANSWERS)
+
+    async def doubled(self, session, player_hand):
+        await self.card_dealt(session, player_hand)
+        await self.show("\n")
+
+    async def hit(self, session, player_hand, dealer_upcard):
+        return await self.ask(HIT_OR_STAND, HIT_STAND_ANSWERS)
+
+    async def hit_dealt(self, session, player_hand):
+        await self.card_dealt(session, player_hand)
+        await self.wait()
+        if player_hand.value == 21:
+            await self.show(f"Blackjack, Congratulations! Player has {player_hand.value}\n\n")
+        elif player_hand.value > 21:
+            await self.show("Bust! Player has exceeded 21.\n\n")
+
+    async def stood(self, session, player_hand):
+        await self.show(f"Player stands with a value of {player_hand.value}\n\n")
+
+    async def dealer_played(self, session, dealer_hand):
+        # The House has already played, its cards are shown one at a time.
+        await self.wait()
+        shown_hand = Hand(dealer_hand[:2])
+        await self.show(f"Dealer reveals the face down card: {CARD_NAMES[dealer_hand[0]]}.\n" + hand_text(shown_hand, "The House") + "\n")
+        await self.wait()
+        for card in dealer_hand[2:]:
+            shown_hand.add(card)
+            await self.show(f"The House is dealt card: {CARD_NAMES[card]}\n" + hand_text(shown_hand, "The House") + "\n")
+            await self.wait()
+        if dealer_hand.value == 21:
+            await self.show("Blackjack, the House has 21.\n\n")
+        if dealer_hand.value > 21:
+            await self.show("Bust, the House has more than 21.\n\n")
+        await self.wait()
+
+    async def settled(self, session, round_data):
+        player_hand, player_hand2, dealer_hand, bet_amount, bet_amount2, insurance_bet, net_win = round_data
+        await self.show(SUMMARY_BANNER + "\n")
+        for hand, bet in ((player_hand2, bet_amount2), (player_hand, bet_amount)):
+            if not hand:
+                continue
+            payout = settle_hand(hand.value, dealer_hand.value, bet)
+            if hand.value > 21:
+                who_won = "Bust, player lost."
+            elif dealer_hand.value > 21:
+                who_won = "The House bust, player wins."
+            elif payout == 0:
+                who_won = "Winner: Push"
+            elif payout > 0:
+                who_won = "Player Wins!"
+            else:
+                who_won = "The House wins."
+            if payout > 0:
+                bet_summery = f"Payout: +{payout} credits won"
+            elif payout < 0:
+                bet_summery = f"Payout: {payout} credits lost"
+            else:
+                bet_summery = "Payout: No wins or losses"
+            await self.show(hand_text(hand, "Player") + hand_text(dealer_hand, "The House"))
+            await self.wait()
+            await self.show(f"\n{who_won}\n{bet_summery}\n\n")
+        await self.show(f"Final player balance is: {session.player_balance} credits\n--------------------------\n\n")
+        await self.wait()
+
+
+async def table_round(session, player):
+    """Plays one round of round_steps() for a connected player, awaiting each choice and
+        notice of the TablePlayer, so waiting on one player never holds up another table.
+    Inputs:
+        session: HeadlessSession holding the player's balance and shoe.
+        player: TablePlayer of the connection.
+    Returns:
+        The tuple returned by play_round().
+    """
+    steps = round_steps(session, player, waits=True)
+    try:
+        awaitable = next(steps)
+        while True:
+            awaitable = steps.send(await awaitable)
+    except StopIteration as finished:
+        return finished.value
+
+
+async def table_session(reader, writer, pause_seconds=MED_PAUSE, metrics=None):
+    """A whole game for one connected player, with their own balance and shoe, until they
+        choose not to play again or disconnect.
+    Inputs:
+        reader, writer: asyncio streams of the player's connection.
+        pause_seconds: Float seconds for each visual pause.
+        metrics: Metrics to count every round in, None to not count them.
+    """
+    session = HeadlessSession(metrics=metrics)
+    player = TablePlayer(reader, writer, pause_seconds, metrics)
+    try:
+        await send_text(writer, "\nWelcome to Minimalist Console Blackjack\n")
+        play_again = True
+        while play_again:
+            await table_round(session, player)
+            play_again = await player.ask(PLAY_AGAIN, YES_NO_ANSWERS)
+            await send_text(writer, "\n")
+        await send_text(writer, "Thank you for playing! \n\nA special thanks to everyone at Code in Place 2021.\n\n")
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve_tables(host, port, pause_seconds=MED_PAUSE, metrics=None):
+    """Runs a table for every player that connects (telnet or any line based client), all on
+        one event loop with no thread per player.
+    Inputs:
+        host: String address to listen on.
+        port: Integer port to listen on.
+        pause_seconds: Float seconds for each visual pause.
+        metrics: Metrics to count every table's rounds in, None to not count them.
+    """
+    server = await asyncio.start_server(lambda reader, writer: table_session(reader, writer, pause_seconds, metrics), host, port, backlog=SERVER_BACKLOG)
+    print(f"Blackjack tables open on {', '.join(str(sock.getsockname()) for sock in server.sockets)}")
+    async with server:
+        await server.serve_forever()
+
+
+class PhaseTimer:
+    """Times each phase of a round of blackjack(). Every phase keeps a count, the total time
+        and a histogram of times in preallocated arrays, so timing a phase never allocates.
+        Each lap() is timed from the lap() before it, one clock read per phase.
+        When blackjack() is given no PhaseTimer the only cost is a check of None.
+    """
+    __slots__ = ("counts", "total_ns", "histogram", "last_ns")
+
+    def __init__(self):
+        self.counts = array.array("Q", [0]) * len(PHASE_NAMES)
+        self.total_ns = array.array("Q", [0]) * len(PHASE_NAMES)
+        self.histogram = array.array("Q", [0]) * (len(PHASE_NAMES) * PHASE_BUCKETS)
+        self.last_ns = time.perf_counter_ns()
+
+    def lap(self, phase=None):
+        """Ends a phase and starts timing the next one.
+        Inputs:
+            phase: Integer PHASE_ constant of the phase that just ended, None to only start timing.
+        """
+        now_ns = time.perf_counter_ns()
+        if phase is not None:
+            elapsed_ns = now_ns - self.last_ns
+            self.counts[phase] += 1
+            self.total_ns[phase] += elapsed_ns
+            self.histogram[phase * PHASE_BUCKETS + elapsed_ns.bit_length()] += 1
+        self.last_ns = now_ns
+
+    def percentile(self, phase, fraction):
+        """Upper bound of a percentile of a phase's times, from its histogram.
+        Inputs:
+            phase: Integer PHASE_ constant.
+            fraction: Float 0-1 of the times that are shorter, 0.5 for the median.
+        Returns:
+            Integer nanoseconds, a power of 2.
+        """
+        wanted = self.counts[phase] * fraction
+        seen = 0
+        start = phase * PHASE_BUCKETS
+        for bucket in range(PHASE_BUCKETS):
+            seen += self.histogram[start + bucket]
+            if seen >= wanted:
+                return 1 << bucket
+        return 1 << (PHASE_BUCKETS - 1)
+
+    def report(self, output=None):
+        """Prints the count, total, mean and percentiles of every phase timed so far.
+        Inputs:
+            output: File to print to, None for the console.
+        """
+        total_ns = sum(self.total_ns) or 1
+        print(f"\n{'phase':<14}{'count':>10}{'total ms':>12}{'share':>8}{'mean us':>12}{'p50 us':>10}{'p99 us':>10}", file=output)
+        for phase, name in enumerate(PHASE_NAMES):
+            count = self.counts[phase]
+            if count == 0:
+                continue
+            print(f"{name:<14}{count:>10}{self.total_ns[phase] / 1e6:>12.1f}{100 * self.total_ns[phase] / total_ns:>7.1f}%"
+                  f"{self.total_ns[phase] / count / 1e3:>12.1f}{self.percentile(phase, 0.5) / 1e3:>10.1f}"
+                  f"{self.percentile(phase, 0.99) / 1e3:>10.1f}", file=output)
+
+
+class MetricsShard:
+    """The counters and histograms one thread adds to. Only its own thread writes to it, so
+        it needs no lock. Each histogram has a bucket for every bound of METRIC_BUCKETS, and
+        one more for longer times.
+    """
+    __slots__ = ("counters", "buckets", "sums")
+
+    def __init__(self):
+        self.counters = array.array("Q", [0]) * len(METRIC_COUNTERS)
+        self.buckets = array.array("Q", [0]) * (len(METRIC_HISTOGRAMS) * (len(METRIC_BUCKETS) + 1))
+        self.sums = array.array("d", [0.0]) * len(METRIC_HISTOGRAMS)
+
+
+class Metrics:
+    """Counters and latency histograms of a running game or table server, see
+        METRIC_COUNTERS and METRIC_HISTOGRAMS. Every thread counts into a MetricsShard of
+        its own with no locks, the lock is only taken once per thread to add its shard.
+        The shards are added up when the metrics are read, in Prometheus text format.
+    """
+    __slots__ = ("local", "shards", "lock", "last_scrape")
+
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()
+        # Time and rounds of the last render(), for the rounds per second since then.
+        self.last_scrape = (time.perf_counter(), 0)
+
+    def shard(self):
+        """The calling thread's MetricsShard, added the first time the thread counts.
+        Returns:
+            MetricsShard of the thread.
+        """
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = MetricsShard()
+            with self.lock:
+                self.shards.append(shard)
+            return shard
+
+    def count(self, counter, amount=1):
+        """Adds to a counter.
+        Inputs:
+            counter: Integer METRIC_ constant of METRIC_COUNTERS.
+            amount: Integer to add.
+        """
+        self.shard().counters[counter] += amount
+
+    def observe(self, histogram, seconds):
+        """Adds a time to a histogram.
+        Inputs:
+            histogram: Integer METRIC_ constant of METRIC_HISTOGRAMS.
+            seconds: Float time to add.
+        """
+        shard = self.shard()
+        shard.buckets[histogram * (len(METRIC_BUCKETS) + 1) + bisect.bisect_left(METRIC_BUCKETS, seconds)] += 1
+        shard.sums[histogram] += seconds
+
+    def observe_round(self, round_data, opening_bet):
+        """Counts the round, its hands, insurance, split and double downs. A hand was
+            doubled if its bet went up and it was dealt more cards after the split, as the
+            bonus for a split hand of 21 raises the bet of a hand of two cards.
+        Inputs:
+            round_data: Tuple as returned by play_round().
+            opening_bet: Integer opening bet of the round.
+        """
+        player_hand, player_hand2, dealer_hand, bet_amount, bet_amount2, insurance_bet, net_win = round_data
+        counters = self.shard().counters
+        counters[METRIC_ROUNDS] += 1
+        counters[METRIC_HANDS] += 1
+        if insurance_bet:
+            counters[METRIC_INSURANCE_TAKEN] += 1
+            if insurance_bet > 0:
+                counters[METRIC_INSURANCE_WON] += 1
+        if bet_amount > opening_bet:
+            counters[METRIC_DOUBLES] += 1
+        if player_hand2:
+            counters[METRIC_HANDS] += 1
+            counters[METRIC_SPLITS] += 1
+            if bet_amount2 > opening_bet and len(player_hand2) > 2:
+                counters[METRIC_DOUBLES] += 1
+
+    def timed_input(self, read):
+        """Wraps an input() function to time how long the player takes to answer. The
+            "Press <Enter> to continue" pauses are not decisions and are not timed.
+        Inputs:
+            read: Function used as input().
+        Returns:
+            Function to use in place of input().
+        """
+        def timed(prompt=""):
+            asked = time.perf_counter()
+            answer = read(prompt)
+            if "to continue" not in prompt:
+                self.observe(METRIC_DECISION, time.perf_counter() - asked)
+            return answer
+        return timed
+
+    def totals(self):
+        """Adds up every thread's shard. A thread counting meanwhile may be seen part way
+            through a round, which the next read catches up with.
+        Returns:
+            MetricsShard of the totals.
+        """
+        with self.lock:
+            shards = list(self.shards)
+        totals = MetricsShard()
+        for shard in shards:
+            for name in MetricsShard.__slots__:
+                total = getattr(totals, name)
+                for i, value in enumerate(getattr(shard, name)):
+                    total[i] += value
+        return totals
+
+    def render(self):
+        """Every metric in Prometheus text format, with the rounds per second since the
+            last time it was rendered.
+        Returns:
+            String of the metrics.
+        """
+        totals = self.totals()
+        counters = totals.counters
+        now = time.perf_counter()
+        last_time, last_rounds = self.last_scrape
+        self.last_scrape = (now, counters[METRIC_ROUNDS])
+        lines = []
+        for (name, help_text), value in zip(METRIC_COUNTERS, counters):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+        gauges = (
+            ("blackjack_rounds_per_second", "Rounds played per second since the last scrape.",
+             (counters[METRIC_ROUNDS] - last_rounds) / max(now - last_time, 1e-9)),
+            ("blackjack_split_rate", "Share of rounds with a split.", counters[METRIC_SPLITS] / max(counters[METRIC_ROUNDS], 1)),
+            ("blackjack_double_rate", "Share of hands doubled down.", counters[METRIC_DOUBLES] / max(counters[METRIC_HANDS], 1)),
+        )
+        for name, help_text, value in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value:.6g}"]
+        num_buckets = len(METRIC_BUCKETS) + 1
+        for histogram, (name, help_text) in enumerate(METRIC_HISTOGRAMS):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            seen = 0
+            start = histogram * num_buckets
+            for bound, count in zip(METRIC_BUCKETS + ("+Inf",), totals.buckets[start:start + num_buckets]):
+                seen += count
+                lines.append(f'{name}_bucket{{le="{bound}"}} {seen}')
+            lines += [f"{name}_sum {totals.sums[histogram]:.6f}", f"{name}_count {seen}"]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """Answers GET /metrics with the server's Metrics, see serve_metrics().
+    """
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not logged, they would mix with the game's output.
+        pass
+
+
+def serve_metrics(metrics, host, port):
+    """Serves metrics on http://host:port/metrics from a daemon thread, so it stops with
+        the program. The game's own threads never wait for a scrape.
+    Inputs:
+        metrics: Metrics to serve.
+        host: String address to listen on.
+        port: Integer port to listen on, 0 for any free port.
+    Returns:
+        server: ThreadingHTTPServer, server.server_address has the port it listens on.
+    """
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
+
+
+def write_metrics(metrics, path):
+    """Writes metrics to path in Prometheus text format, for a node exporter's textfile
+        collector. The file is written beside path and renamed over it, so a reader never
+        sees half a file.
+    Inputs:
+        metrics: Metrics to write.
+        path: String path of the file.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as metrics_file:
+        metrics_file.write(metrics.render())
+    os.replace(temp_path, path)
+
+
+def start_metrics_file(metrics, path, interval=METRICS_INTERVAL):
+    """Rewrites a metrics file every interval seconds from a daemon thread.
+    Inputs:
+        metrics: Metrics to write.
+        path: String path of the file.
+        interval: Float seconds between writes.
+    Returns:
+        stop: threading.Event, set it to stop writing.
+    """
+    stop = threading.Event()
+    def rewrite():
+        while not stop.wait(interval):
+            write_metrics(metrics, path)
+    threading.Thread(target=rewrite, daemon=True, name="metrics file").start()
+    return stop
+
+
+def start_metrics(port, host, path, interval=METRICS_INTERVAL):
+    """Publishes a new Metrics over HTTP, to a file, or both. The file is written once more
+        when the program exits.
+    Inputs:
+        port: Integer port to serve /metrics on, None for no HTTP.
+        host: String address to serve on.
+        path: String path of a metrics file, None for no file.
+        interval: Float seconds between writes of the file.
+    Returns:
+        metrics: Metrics, or None if neither was asked for.
+    """
+    if port is None and not path:
+        return None
+    metrics = Metrics()
+    if port is not None:
+        serve_metrics(metrics, host, port)
+    if path:
+        start_metrics_file(metrics, path, interval)
+        atexit.register(write_metrics, metrics, path)
+    return metrics
+
+
+@contextlib.contextmanager
+def stubbed_console(answer):
+    """While active, blackjack() and its prompts read their answers from answer() instead of
+        the keyboard, print nothing and never pause. Only this module's input and PAUSES_ON
+        are changed, and both are put back on the way out, even on an error.
+    Inputs:
+        answer: Function taking the prompt string and returning the typed answer.
+    """
+    global PAUSES_ON
+    saved_input = globals().get("input")
+    saved_pauses = PAUSES_ON
+    globals()["input"] = answer
+    PAUSES_ON = False
+    try:
+        with contextlib.redirect_stdout(NullRenderer()):
+            yield
+    finally:
+        PAUSES_ON = saved_pauses
+        if saved_input is None:
+            del globals()["input"]
+        else:
+            globals()["input"] = saved_input
+
+
+def scripted_answer(num_rounds):
+    """A scripted player for stubbed_console(). Bets 10 credits, always stands, declines
+        every offer and plays num_rounds rounds.
+    Inputs:
+        num_rounds: Integer number of rounds to play before answering no to play again.
+    Returns:
+        answer: Function taking a prompt string and returning the answer.
+    """
+    rounds_played = [0]
+    def answer(prompt=""):
+        if "opening bet" in prompt:
+            return "10"
+        if "play again" in prompt:
+            rounds_played[0] += 1
+            return "y" if rounds_played[0] < num_rounds else "n"
+        if "it or" in prompt:
+            return "s"
+        if "es or" in prompt:
+            return "n"
+        return ""
+    return answer
+
+
+def time_benchmark(function, repeat=5):
+    """Times a function with timeit and keeps the best of several runs.
+    Inputs:
+        function: Function to time, called with no inputs.
+        repeat: Integer number of timing runs.
+    Returns:
+        Float nanoseconds for one call.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) * 1e9 / number
+
+
+def run_benchmarks(repeat=5):
+    """Times the functions every round depends on, and whole rounds of a scripted game with its
+        prompts answered by scripted_answer(), no output and no sleeps.
+    Inputs:
+        repeat: Integer number of timing runs for each benchmark.
+    Returns:
+        results: Dictionary of benchmark name to nanoseconds per call (or per round).
+    """
+    results = {}
+    pack_of_cards = build_cards()
+    card_deck = Shoe(pack_of_cards * NUM_OF_DECKS)
+    three_cards = Hand((card_deck.cards[0], card_deck.cards[1], card_deck.cards[2]))
+
+    def deal_to_new_hand():
+        card_deck.restart()
+        deal_new_card(card_deck, Hand(), "Player")
+
+    saved_random = random.getstate()
+    random.seed(0)
+    # Only the functions that print or pause are timed with the console stubbed.
+    results["build_cards"] = time_benchmark(build_cards, repeat)
+    with stubbed_console(scripted_answer(BENCHMARK_ROUNDS)):
+        results["build_deck"] = time_benchmark(lambda: build_deck(NUM_OF_DECKS, pack_of_cards), repeat)
+        # A cut of every card left makes every call reshuffle.
+        results["refresh_deck"] = time_benchmark(lambda: refresh_deck(card_deck, pack_of_cards, NUM_OF_DECKS, len(card_deck)), repeat)
+    results["get_hand_value"] = time_benchmark(lambda: get_hand_value(three_cards), repeat)
+    with stubbed_console(scripted_answer(BENCHMARK_ROUNDS)):
+        results["deal_new_card"] = time_benchmark(deal_to_new_hand, repeat)
+
+    def scripted_game():
+        with stubbed_console(scripted_answer(BENCHMARK_ROUNDS)):
+            blackjack()
+    results["blackjack_round"] = time_benchmark(scripted_game, repeat) / BENCHMARK_ROUNDS
+
+    session = HeadlessSession(0)
+    strategy = HeadlessStrategy()
+    results["play_round"] = time_benchmark(lambda: play_round(session, strategy), repeat)
+    random.setstate(saved_random)
+    return results
+
+
+def compare_benchmarks(results, baseline, threshold=BENCHMARK_THRESHOLD):
+    """Compares benchmark results with a saved baseline.
+    Inputs:
+        results: Dictionary of benchmark name to nanoseconds per call.
+        baseline: Dictionary of benchmark name to nanoseconds per call from an earlier run.
+        threshold: Float percent slower than the baseline that counts as a regression.
+    Returns:
+        regressions: List of benchmark names slower than the threshold.
+    """
+    regressions = []
+    for name, nanoseconds in results.items():
+        if name not in baseline:
+            continue
+        change = 100 * (nanoseconds - baseline[name]) / baseline[name]
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  <-- REGRESSION"
+        print(f"{name:<16} {baseline[name]:>14.0f} ns -> {nanoseconds:>14.0f} ns  {change:+7.1f}%{flag}")
+    return regressions
+
+
+def display_benchmarks(results):
+    """Prints benchmark results.
+    Inputs:
+        results: Dictionary of benchmark name to nanoseconds per call.
+    """
+    for name, nanoseconds in results.items():
+        per_second = 1e9 / nanoseconds
+        unit = "rounds/sec" if name.endswith("_round") else "calls/sec"
+        print(f"{name:<16} {nanoseconds:>14.0f} ns  {per_second:>14.0f} {unit}")
+
+
+# Name of each prompt a script line can be kept for, and the text that picks out the prompt.
+SCRIPT_PROMPTS = (("bet", "opening bet"), ("insurance", "buy insurance"), ("split", "like to split"),
+                  ("double", "double down"), ("hit", "it or"), ("again", "play again"))
+
+
+class ScriptedInput:
+    """Used in place of input() to play the real game from a script file or pipe, one
+        answer per line, so many copies of the game can be load tested from a harness.
+        The "Press <Enter> to continue" pauses are answered straight away without using a
+        line, so a script only holds the answers to the game's questions. Each prompt is
+        printed with its answer, as a terminal would show it.
+
+        A line can name the prompt it is for, as in "double n" (see SCRIPT_PROMPTS). Named
+        lines for prompts that are not asked are skipped, so the same lines can be repeated
+        for every round whether or not insurance, a split or a double is offered:
+            bet 10 / insurance n / split n / double n / hit h / hit s / again y
+        A line of only the answer is used for whatever prompt comes next. A line of two
+        words with a name not in SCRIPT_PROMPTS ends the game, and play_script() raises a
+        ValueError, so a typo cannot put the script out of step with the game.
+    """
+    __slots__ = ("source", "answers_read", "first_prompt", "error")
+
+    def __init__(self, source):
+        self.source = source
+        self.answers_read = 0
+        self.first_prompt = None
+        # Why the script was stopped part way, None while it is good.
+        self.error = None
+
+    def __call__(self, prompt=""):
+        """Answers one prompt.
+        Inputs:
+            prompt: String printed before the answer, as for input().
+        Returns:
+            answer: String of the next line of the script, without its line ending.
+        Raises:
+            EOFError: The script has run out, the same as input() at the end of stdin, or a
+                line names a prompt not in SCRIPT_PROMPTS. The game's prompts ask again on
+                a ValueError, so the error is kept for play_script() to raise.
+        """
+        if self.first_prompt is None:
+            self.first_prompt = time.perf_counter()
+        if "to continue" in prompt:
+            print(prompt)
+            return ""
+        while True:
+            line = self.source.readline()
+            if not line:
+                raise EOFError("End of script.")
+            self.answers_read += 1
+            words = line.split()
+            if len(words) != 2:
+                answer = line.rstrip("\r\n")
+                break
+            name, answer = words
+            if not any(name == prompt_name for prompt_name, text in SCRIPT_PROMPTS):
+                self.error = f"Line {self.answers_read} of the script names an unknown prompt '{name}'."
+                raise EOFError(self.error)
+            if any(name == prompt_name and text in prompt for prompt_name, text in SCRIPT_PROMPTS):
+                break
+        print(prompt, answer, sep="")
+        return answer
+
+
+def play_script(script, phase_timer=None, history=None, decisions=None, metrics=None, snapshot=None):
+    """Plays blackjack() with its answers from a ScriptedInput, until the player quits or
+        the script runs out. A round cut short by the end of the script is not counted.
+    Inputs:
+        script: ScriptedInput already used in place of input().
+        phase_timer, history, decisions, metrics, snapshot: As blackjack_rounds().
+    Returns:
+        rounds_played: Integer number of rounds settled.
+        elapsed: Float number of seconds from the first prompt to the end of the game.
+    Raises:
+        ValueError: A line of the script names an unknown prompt.
+    """
+    rounds_played = 0
+    try:
+        for round_result in blackjack_rounds(phase_timer, history, decisions, metrics, snapshot):
+            rounds_played += 1
+    except EOFError:
+        if script.error is not None:
+            raise ValueError(script.error) from None
+    end_time = time.perf_counter()
+    return rounds_played, end_time - (script.first_prompt or end_time)
+
+
+def display_script_stats(script, rounds_played, elapsed, output=sys.stderr):
+    """Prints the startup time and speed of a scripted game, to stderr by default so it is
+        kept apart from the game's own output.
+    Inputs:
+        script: ScriptedInput the game was played from.
+        rounds_played: Integer number of rounds settled.
+        elapsed: Float number of seconds from the first prompt to the end of the game.
+        output: File to print to.
+    """
+    startup = ((script.first_prompt or time.perf_counter()) - PROCESS_START) * 1000
+    print(f"Startup {startup:.1f} ms to the first prompt, {rounds_played} rounds in {elapsed:.3f} seconds "
+          f"({rounds_played / max(elapsed, 1e-9):.0f} rounds/sec), {script.answers_read} answers read", file=output)
+
+
+class NullRenderer:
+    """Takes the place of sys.stdout and input() for the game. Every renderer has the same
+        methods: write() and flush() as a file for print(), input() for prompts and close()
+        when the game ends. This one throws away all output, for headless and scripted runs
+        where it would only cost time.
+    """
+    __slots__ = ()
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def input(self, prompt=""):
+        """Reads a line from stdin as input() does, with prompt written to the renderer.
+        """
+        return builtins.input(prompt)
+
+    def close(self):
+        pass
+
+
+class ConsoleRenderer(NullRenderer):
+    """Collects the game's output and writes it to the terminal as one frame at each step of
+        the game, when it pauses or asks the player something, instead of one write for
+        every print(). Line editing of the answers still works, as input() flushes the frame
+        and then finds the terminal through fileno().
+    """
+    __slots__ = ("output", "frame")
+
+    def __init__(self, output=None):
+        self.output = output or sys.stdout
+        self.frame = []
+
+    def write(self, text):
+        self.frame.append(text)
+        return len(text)
+
+    def flush(self):
+        if self.frame:
+            self.output.write("".join(self.frame))
+            self.frame.clear()
+        self.output.flush()
+
+    def fileno(self):
+        return self.output.fileno()
+
+    def close(self):
+        self.flush()
+
+
+class CursesRenderer(NullRenderer):
+    """Draws the game in a full screen curses window, showing the last lines printed like a
+        terminal. Each frame is compared line by line with the one on screen and only the
+        lines that changed are drawn again, the rest are left for curses to keep. The
+        highlights in the game's text are shown in yellow. When it is closed the last
+        screen is printed to the terminal, so the end of the game stays in view.
+    Inputs:
+        output: File the last screen is printed to when closed, default sys.stdout.
+    """
+    __slots__ = ("curses", "screen", "highlight", "lines", "drawn", "output")
+
+    def __init__(self, output=None):
+        try:
+            import curses
+        except ImportError:
+            raise ImportError("The curses renderer needs curses, on Windows install it with: pip install windows-curses")
+        self.curses = curses
+        self.output = output or sys.stdout
+        self.screen = curses.initscr()
+        self.highlight = curses.A_BOLD
+        if curses.has_colors():
+            curses.start_color()
+            curses.use_default_colors()
+            curses.init_pair(1, curses.COLOR_YELLOW, -1)
+            self.highlight = curses.color_pair(1) | curses.A_BOLD
+        curses.noecho()
+        self.lines = [""]
+        self.drawn = []
+
+    def write(self, text):
+        lines = text.split("\n")
+        self.lines[-1] += lines[0]
+        self.lines.extend(lines[1:])
+        if len(self.lines) > CURSES_SCROLLBACK:
+            del self.lines[:-CURSES_SCROLLBACK]
+        return len(text)
+
+    def draw_line(self, row, line, width):
+        """Draws one line of text, showing its colour codes as highlights.
+        Inputs:
+            row: Integer row of the screen.
+            line: String of the line, with the colour codes of ANSI_CODE.
+            width: Integer width of the screen.
+        Returns:
+            column: Integer column after the end of the line.
+        """
+        self.screen.move(row, 0)
+        self.screen.clrtoeol()
+        column = 0
+        attribute = 0
+        # The split leaves text at even positions and colour codes at odd positions.
+        for i, part in enumerate(ANSI_CODE.split(line)):
+            if i % 2:
+                attribute = self.highlight if part == "93" else 0
+            elif part and column < width - 1:
+                self.screen.addnstr(row, column, part, width - 1 - column, attribute)
+                column += len(part)
+        return min(column, width - 1)
+
+    def flush(self):
+        height, width = self.screen.getmaxyx()
+        visible = self.lines[-height:]
+        for row, line in enumerate(visible):
+            if row >= len(self.drawn) or self.drawn[row] != line:
+                self.draw_line(row, line, width)
+        for row in range(len(visible), len(self.drawn)):
+            self.screen.move(row, 0)
+            self.screen.clrtoeol()
+        self.drawn = visible
+        self.screen.refresh()
+
+    def input(self, prompt=""):
+        """Shows the prompt at the end of the last line and reads the answer typed after it.
+        """
+        self.write(prompt)
+        self.flush()
+        height, width = self.screen.getmaxyx()
+        column = len(ANSI_CODE.sub("", self.lines[-1]))
+        self.curses.echo()
+        try:
+            answer = self.screen.getstr(len(self.drawn) - 1, min(column, width - 1)).decode(errors="replace")
+        finally:
+            self.curses.noecho()
+        self.write(answer + "\n")
+        return answer
+
+    def close(self):
+        self.flush()
+        self.curses.echo()
+        self.curses.endwin()
+        self.output.write("\n".join(self.drawn) + "\n")
+        self.output.flush()
+
+
+def make_renderer(name):
+    """Makes a renderer by name, see RENDERERS.
+    Inputs:
+        name: String of the renderer.
+    Returns:
+        renderer: NullRenderer for null, CursesRenderer for curses or ConsoleRenderer for console.
+    """
+    if name == "null":
+        return NullRenderer()
+    if name == "curses":
+        return CursesRenderer()
+    return ConsoleRenderer()
+
+
+@contextlib.contextmanager
+def use_renderer(renderer):
+    """While active, everything the game prints goes to renderer, and input() asks the
+        player through it. The renderer is closed at the end, even on an error or Ctrl-C.
+    Inputs:
+        renderer: NullRenderer, ConsoleRenderer or CursesRenderer.
+    """
+    module_globals = globals()
+    saved_input = module_globals.get("input")
+    saved_stdout = sys.stdout
+    sys.stdout = renderer
+    module_globals["input"] = renderer.input
+    try:
+        yield renderer
+    finally:
+        try:
+            renderer.close()
+        finally:
+            sys.stdout = saved_stdout
+            if saved_input is None:
+                del module_globals["input"]
+            else:
+                module_globals["input"] = saved_input
+
+
+class HandHistoryWriter:
+    """Appends every round to a hand history file as a fixed size binary record, see
+        HISTORY_RECORD. Records are packed into a preallocated buffer and written out
+        HISTORY_BUFFER_RECORDS at a time, so recording costs one struct pack per round.
+        An existing file is added to, with round numbers carrying on from its last record.
+        Use as a context manager, or call close() to write out the last records.
+    """
+    def __init__(self, path, buffer_records=HISTORY_BUFFER_RECORDS):
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(HISTORY_HEADER.pack(HISTORY_MAGIC, HISTORY_VERSION, HISTORY_RECORD.size))
+            self.round_num = 0
+        else:
+            check_history_header(path)
+            self.round_num = (self.file.tell() - HISTORY_HEADER.size) // HISTORY_RECORD.size
+            # Drop the end of a record left part written.
+            self.file.truncate(HISTORY_HEADER.size + self.round_num * HISTORY_RECORD.size)
+        self.buffer = bytearray(HISTORY_RECORD.size * buffer_records)
+        self.offset = 0
+
+    def write(self, player_balance, opening_bet, round_data):
+        """Records one round.
+        Inputs:
+            player_balance: Integer balance after the round.
+            opening_bet: Integer bet placed before any double down or split.
+            round_data: Tuple returned by play_round().
+        """
+        player_hand, player_hand2, dealer_hand, bet_amount, bet_amount2, insurance_bet, net_win = round_data
+        actions = 0
+        if insurance_bet != 0:
+            actions |= HISTORY_INSURANCE
+        if player_hand2:
+            actions |= HISTORY_SPLIT
+            # The split hand's bet is also doubled for 21 with two cards, which is not a double down.
+            if bet_amount2 == 2 * opening_bet and not (len(player_hand2) == 2 and player_hand2.value == 21):
+                actions |= HISTORY_DOUBLE2
+        if bet_amount == 2 * opening_bet:
+            actions |= HISTORY_DOUBLE
+        HISTORY_RECORD.pack_into(self.buffer, self.offset, self.round_num, player_balance, opening_bet,
+            bet_amount, bet_amount2, insurance_bet, net_win, actions,
+            len(player_hand), len(player_hand2), len(dealer_hand),
+            bytes(player_hand.cards), bytes(player_hand2.cards), bytes(dealer_hand.cards))
+        self.round_num += 1
+        self.offset += HISTORY_RECORD.size
+        if self.offset == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        """Writes out the records packed so far.
+        """
+        self.file.write(memoryview(self.buffer)[:self.offset])
+        self.file.flush()
+        self.offset = 0
+
+    def close(self):
+        """Writes out the last records and closes the file.
+        """
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def check_history_header(path):
+    """Checks a file starts with a hand history header this version can read.
+    Inputs:
+        path: String path of the file.
+    """
+    with open(path, "rb") as history_file:
+        header = history_file.read(HISTORY_HEADER.size)
+    if len(header) < HISTORY_HEADER.size:
+        raise ValueError(f"{path} is not a hand history file.")
+    magic, version, record_size = HISTORY_HEADER.unpack(header)
+    if magic != HISTORY_MAGIC or version != HISTORY_VERSION or record_size != HISTORY_RECORD.size:
+        raise ValueError(f"{path} is not a version {HISTORY_VERSION} hand history file.")
+
+
+class HandHistory:
+    """Reads a hand history file through mmap, so even a file of billions of rounds is never
+        read into memory. Indexing gives a memoryview of one record without copying it,
+        record() unpacks one and to_numpy() views the whole file as a NumPy structured array.
+    """
+    def __init__(self, path):
+        check_history_header(path)
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        # Leave out a record still being written.
+        self.num_records = (size - HISTORY_HEADER.size) // HISTORY_RECORD.size
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)[HISTORY_HEADER.size:HISTORY_HEADER.size + self.num_records * HISTORY_RECORD.size]
+
+    def __len__(self):
+        return self.num_records
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.num_records
+        if index < 0 or index >= self.num_records:
+            raise IndexError("hand history index out of range")
+        start = index * HISTORY_RECORD.size
+        return self.view[start:start + HISTORY_RECORD.size]
+
+    def record(self, index):
+        """Unpacks one record.
+        Inputs:
+            index: Integer record number.
+        Returns:
+            Dictionary of the record's fields, the hands as lists of card ids.
+        """
+        (round_num, player_balance, opening_bet, bet_amount, bet_amount2, insurance_bet, net_win, actions,
+            num_cards, num_cards2, num_dealer_cards, player_cards, player_cards2, dealer_cards) = HISTORY_RECORD.unpack(self[index])
+        return {"round_num": round_num, "player_balance": player_balance, "opening_bet": opening_bet,
+            "bet_amount": bet_amount, "bet_amount2": bet_amount2, "insurance_bet": insurance_bet,
+            "net_win": net_win, "actions": actions, "player_hand": list(player_cards[:num_cards]),
+            "player_hand2": list(player_cards2[:num_cards2]), "dealer_hand": list(dealer_cards[:num_dealer_cards])}
+
+    def to_numpy(self):
+        """Views every record as a NumPy structured array, sharing memory with the mmap.
+        Returns:
+            records: NumPy array with a field for each part of HISTORY_RECORD.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("HandHistory.to_numpy() needs NumPy, install it with: pip install numpy") from None
+        dtype = np.dtype([("round_num", "<u8"), ("player_balance", "<i8"), ("opening_bet", "<i4"),
+            ("bet_amount", "<i4"), ("bet_amount2", "<i4"), ("insurance_bet", "<i4"), ("net_win", "<i4"),
+            ("actions", "u1"), ("num_cards", "u1"), ("num_cards2", "u1"), ("num_dealer_cards", "u1"),
+            ("player_hand", "u1", HISTORY_HAND_CARDS), ("player_hand2", "u1", HISTORY_HAND_CARDS),
+            ("dealer_hand", "u1", HISTORY_HAND_CARDS)])
+        return np.frombuffer(self.view, dtype=dtype)
+
+    def close(self):
+        self.view.release()
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def display_hand_history(path):
+    """Prints a summery of a hand history file, using NumPy when it is installed.
+    Inputs:
+        path: String path of the file.
+    """
+    with HandHistory(path) as history:
+        num_rounds = len(history)
+        if num_rounds == 0:
+            print(f"{path} has no rounds.")
+            return
+        try:
+            records = history.to_numpy()
+            net_win = int(records["net_win"].sum())
+            wagered = int(records["bet_amount"].sum() + records["bet_amount2"].sum())
+            splits = int(((records["actions"] & HISTORY_SPLIT) != 0).sum())
+            doubles = int(((records["actions"] & (HISTORY_DOUBLE | HISTORY_DOUBLE2)) != 0).sum())
+            final_balance = int(records["player_balance"][-1])
+            del records
+        except ImportError:
+            net_win = wagered = splits = doubles = 0
+            for index in range(num_rounds):
+                record = history.record(index)
+                net_win += record["net_win"]
+                wagered += record["bet_amount"] + record["bet_amount2"]
+                splits += (record["actions"] & HISTORY_SPLIT) != 0
+                doubles += (record["actions"] & (HISTORY_DOUBLE | HISTORY_DOUBLE2)) != 0
+            final_balance = record["player_balance"]
+    print(f"{path}: {num_rounds} rounds, {wagered} credits wagered, player net win {net_win} credits")
+    print(f"Rounds split: {splits}  Rounds doubled down: {doubles}  Final balance: {final_balance} credits")
+
+
+class ReplayDivergence(ValueError):
+    """Raised when a replayed round no longer matches the decision log, the game asked for a
+        different choice than the one recorded or finished with a different balance.
+    """
+
+
+class DecisionRecorder:
+    """Writes a decision log: the seed of the session on the first line, then one line per
+        round with the decisions in the order they were made and the balance after the round.
+        Decisions are b<credits> for the opening bet, i, p and d with 1 or 0 for insurance,
+        split and double down, then h or s for each hit or stand. For example
+        "b10 d0 h s 990". Lines are written as each round ends, so a log survives a crash.
+        Every checkpoint_rounds rounds a snapshot of the session is added to the checkpoints
+        file beside the log, for Replay.seek() to start from.
+    """
+    def __init__(self, path, seed, read=input, checkpoint_rounds=REPLAY_CHECKPOINT_ROUNDS):
+        self.file = open(path, "w", buffering=1)
+        self.file.write(f"seed {seed}\n")
+        self.checkpoint_file = open(path + REPLAY_CHECKPOINT_SUFFIX, "wb", buffering=0)
+        self.checkpoint_rounds = checkpoint_rounds
+        self.read = read
+        self.decisions = []
+
+    def add(self, decision):
+        """Records a decision of the current round.
+        Inputs:
+            decision: String decision such as "b10", "i0" or "h".
+        """
+        self.decisions.append(decision)
+
+    def end_round(self, player_balance):
+        """Writes out the current round.
+        Inputs:
+            player_balance: Integer balance after the round.
+        """
+        self.decisions.append(str(player_balance))
+        self.file.write(" ".join(self.decisions) + "\n")
+        self.decisions = []
+
+    def checkpoint(self, rounds_played, snapshot):
+        """Saves a checkpoint if one is due after this many rounds.
+        Inputs:
+            rounds_played: Integer rounds written so far.
+            snapshot: Function returning the session's state from pack_snapshot().
+        """
+        if rounds_played % self.checkpoint_rounds == 0:
+            self.checkpoint_file.write(snapshot())
+
+    def input(self, prompt=""):
+        """Used in place of input() by blackjack(), records each valid answer to a prompt.
+            An answer the game will ask again for is not recorded.
+        Inputs:
+            prompt: String prompt shown to the player.
+        Returns:
+            user_action: String answer typed by the player.
+        """
+        user_action = self.read(prompt)
+        # The split prompt is the only one that does not ignore case.
+        answer = user_action if "split" in prompt else user_action.lower()
+        if "opening bet" in prompt:
+            try:
+                bet_amount = int(user_action)
+            except ValueError:
+                return user_action
+            # A bet over the balance is asked again straight away, so replace it.
+            if self.decisions and self.decisions[-1][0] == "b":
+                self.decisions.pop()
+            self.add(f"b{bet_amount}")
+        elif "it or" in prompt:
+            if answer in HIT_STAND_ANSWERS:
+                self.add("h" if HIT_STAND_ANSWERS[answer] else "s")
+        elif answer in YES_NO_ANSWERS:
+            for kind, words in (("i", "insurance"), ("p", "split"), ("d", "double down")):
+                if words in prompt:
+                    self.add(f"{kind}{int(YES_NO_ANSWERS[answer])}")
+        return user_action
+
+    def close(self):
+        self.file.close()
+        self.checkpoint_file.close()
+
+
+class RecordingStrategy(HeadlessStrategy):
+    """Makes the same choices as another strategy and records them with a DecisionRecorder,
+        to write a decision log of a headless session.
+    """
+    def __init__(self, strategy, recorder):
+        self.strategy = strategy
+        self.recorder = recorder
+
+    def opening_bet(self, session):
+        bet_amount = self.strategy.opening_bet(session)
+        self.recorder.add(f"b{bet_amount}")
+        return bet_amount
+
+    def take_insurance(self, session, player_hand, dealer_upcard, insurance_bet):
+        choice = self.strategy.take_insurance(session, player_hand, dealer_upcard, insurance_bet)
+        self.recorder.add(f"i{int(choice)}")
+        return choice
+
+    def split(self, session, player_hand, dealer_upcard, bet_amount):
+        choice = self.strategy.split(session, player_hand, dealer_upcard, bet_amount)
+        self.recorder.add(f"p{int(choice)}")
+        return choice
+
+    def double_down(self, session, player_hand, dealer_upcard, bet_amount):
+        choice = self.strategy.double_down(session, player_hand, dealer_upcard, bet_amount)
+        self.recorder.add(f"d{int(choice)}")
+        return choice
+
+    def hit(self, session, player_hand, dealer_upcard):
+        choice = self.strategy.hit(session, player_hand, dealer_upcard)
+        self.recorder.add("h" if choice else "s")
+        return choice
+
+    def play_again(self, session):
+        # Every round ends here, after settlements.
+        self.recorder.end_round(session.player_balance)
+        self.recorder.checkpoint(session.rounds_played, lambda: session_snapshot(session))
+        return self.strategy.play_again(session)
+
+
+def load_decision_log(path):
+    """Reads a decision log written by a DecisionRecorder.
+    Inputs:
+        path: String path of the log.
+    Returns:
+        seed: String seed of the session.
+        rounds: List of (decisions, player_balance) for each round, decisions a tuple of strings.
+    """
+    rounds = []
+    with open(path) as log_file:
+        first_line = log_file.readline().split(" ", 1)
+        if len(first_line) != 2 or first_line[0] != "seed":
+            raise ValueError(f"{path} is not a decision log.")
+        seed = first_line[1].rstrip("\n")
+        for line in log_file:
+            decisions = line.split()
+            if decisions:
+                rounds.append((tuple(decisions[:-1]), int(decisions[-1])))
+    return seed, rounds
+
+
+class ReplayStrategy(HeadlessStrategy):
+    """Makes the choices of one round of a decision log, checking each is the choice the game
+        is asking for.
+    """
+    def __init__(self):
+        self.round_num = 0
+        self.decisions = ()
+        self.position = 0
+
+    def start_round(self, round_num, decisions):
+        """Sets the decisions of the next round.
+        Inputs:
+            round_num: Integer round number, for error messages.
+            decisions: Tuple of string decisions from load_decision_log().
+        """
+        self.round_num = round_num
+        self.decisions = decisions
+        self.position = 0
+
+    def next_decision(self, kinds):
+        """Takes the next decision of the round.
+        Inputs:
+            kinds: String of the decision letters the game can accept now.
+        Returns:
+            decision: String decision.
+        """
+        if self.position >= len(self.decisions):
+            raise ReplayDivergence(f"Round {self.round_num}: the game asked for '{kinds}' after the last recorded decision.")
+        decision = self.decisions[self.position]
+        if decision[0] not in kinds:
+            raise ReplayDivergence(f"Round {self.round_num}: the game asked for '{kinds}' but the log has '{decision}'.")
+        self.position += 1
+        return decision
+
+    def opening_bet(self, session):
+        return int(self.next_decision("b")[1:])
+
+    def take_insurance(self, session, player_hand, dealer_upcard, insurance_bet):
+        return self.next_decision("i") == "i1"
+
+    def split(self, session, player_hand, dealer_upcard, bet_amount):
+        return self.next_decision("p") == "p1"
+
+    def double_down(self, session, player_hand, dealer_upcard, bet_amount):
+        return self.next_decision("d") == "d1"
+
+    def hit(self, session, player_hand, dealer_upcard):
+        return self.next_decision("hs") == "h"
+
+
+class Replay:
+    """Replays a recorded session with the headless engine, which deals the same shoes, cuts
+        and dealer stops as blackjack() does from the same seed. Every round is checked against
+        the log and a ReplayDivergence is raised at the first difference.
+        The state of the session is saved every checkpoint_rounds rounds, by the recorder or
+        as the replay goes, to the checkpoints file beside the log. seek() only has to play on
+        from the nearest checkpoint before the round wanted, even in a new process.
+    """
+    def __init__(self, seed, rounds, checkpoint_rounds=REPLAY_CHECKPOINT_ROUNDS, checkpoint_path=None):
+        self.seed = seed
+        self.rounds = rounds
+        self.checkpoint_rounds = checkpoint_rounds
+        self.checkpoint_path = checkpoint_path
+        self.strategy = ReplayStrategy()
+        self.session = HeadlessSession(seed)
+        self.checkpoints = {0: session_snapshot(self.session)}
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            self.load_checkpoints()
+
+    def load_checkpoints(self):
+        """Reads the checkpoints saved in checkpoint_path. A checkpoint cut short by a crash
+            is left out.
+        """
+        with open(self.checkpoint_path, "rb") as checkpoint_file:
+            saved = checkpoint_file.read()
+        for start in range(0, len(saved) - SNAPSHOT.size + 1, SNAPSHOT.size):
+            snapshot = saved[start:start + SNAPSHOT.size]
+            rounds_played = unpack_snapshot(snapshot, self.checkpoint_path, self.session.rules)[0]
+            if rounds_played <= len(self.rounds):
+                self.checkpoints[rounds_played] = snapshot
+
+    def restore(self, snapshot):
+        """Puts the session back to a checkpoint.
+        Inputs:
+            snapshot: Bytes from pack_snapshot().
+        """
+        session = self.session
+        (session.rounds_played, session.player_balance, session.card_deck, session.cut_num,
+            rng_state, session.opening_bet) = unpack_snapshot(snapshot, self.checkpoint_path, session.rules)
+        session.rng.setstate(rng_state)
+
+    def play_next(self):
+        """Replays the next round and checks the balance after it.
+        Returns:
+            round_data: Tuple returned by play_round().
+        """
+        session = self.session
+        round_num = session.rounds_played
+        decisions, player_balance = self.rounds[round_num]
+        self.strategy.start_round(round_num, decisions)
+        round_data = play_round(session, self.strategy)
+        if self.strategy.position != len(decisions):
+            raise ReplayDivergence(f"Round {round_num}: the round ended with decisions left over {decisions[self.strategy.position:]}.")
+        if session.player_balance != player_balance:
+            raise ReplayDivergence(f"Round {round_num}: the balance is {session.player_balance} credits but the log has {player_balance}.")
+        if session.rounds_played % self.checkpoint_rounds == 0 and session.rounds_played not in self.checkpoints:
+            snapshot = session_snapshot(session)
+            self.checkpoints[session.rounds_played] = snapshot
+            if self.checkpoint_path is not None:
+                with open(self.checkpoint_path, "ab") as checkpoint_file:
+                    checkpoint_file.write(snapshot)
+        return round_data
+
+    def seek(self, round_num):
+        """Replays round round_num (counted from 0), starting from the latest checkpoint
+            before it unless the session is already closer.
+        Inputs:
+            round_num: Integer round number.
+        Returns:
+            round_data: Tuple returned by play_round() for that round.
+        """
+        if round_num < 0 or round_num >= len(self.rounds):
+            raise IndexError(f"The log has {len(self.rounds)} rounds.")
+        nearest = max(checkpoint for checkpoint in self.checkpoints if checkpoint <= round_num)
+        if self.session.rounds_played > round_num or self.session.rounds_played < nearest:
+            self.restore(self.checkpoints[nearest])
+        while self.session.rounds_played < round_num:
+            self.play_next()
+        return self.play_next()
+
+    def run(self):
+        """Replays every round left in the log.
+        Returns:
+            session: HeadlessSession after the last round.
+        """
+        while self.session.rounds_played < len(self.rounds):
+            self.play_next()
+        return self.session
+
+
+def display_replay_round(round_num, round_data, session):
+    """Prints the hands, bets and outcome of a replayed round.
+    Inputs:
+        round_num: Integer round number.
+        round_data: Tuple returned by play_round().
+        session: HeadlessSession after the round.
+    """
+    player_hand, player_hand2, dealer_hand, bet_amount, bet_amount2, insurance_bet, net_win = round_data
+    print(f"Round {round_num}:")
+    display_full_hand(player_hand, "Player")
+    if player_hand2:
+        display_full_hand(player_hand2, "Player (split)")
+    display_full_hand(dealer_hand, "The House")
+    print(f"Bets: {bet_amount} and {bet_amount2} credits  Insurance: {insurance_bet} credits")
+    print(f"Payout: {net_win} credits  Player's balance: {session.player_balance} credits")
+
+
+def pack_snapshot(rounds_played, player_balance, card_deck, cut_num, rng_state, rules, opening_bet=0):
+    """Packs everything a session needs to carry on into a SNAPSHOT.
+    Inputs:
+        rounds_played: Integer rounds played so far.
+        player_balance: Integer balance after the last round.
+        card_deck: Shoe being dealt from, None before the first shoe.
+        cut_num: Integer cards left when the shoe is reshuffled.
+        rng_state: State of the random generator, from getstate().
+        rules: HouseRules the session plays by.
+        opening_bet: Integer opening bet of the last round.
+    Returns:
+        Bytes of SNAPSHOT.size.
+    """
+    version, words, gauss_next = rng_state
+    if card_deck is None:
+        cards, cursor = b"", 0
+    else:
+        cards, cursor = card_deck.cards, card_deck.cursor
+    if len(cards) > SNAPSHOT_SHOE_CARDS:
+        raise ValueError(f"A snapshot holds up to {SNAPSHOT_SHOE_CARDS} cards, not {len(cards)}.")
+    return SNAPSHOT.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, SNAPSHOT.size, rounds_played, player_balance, opening_bet,
+        cut_num, len(cards), cursor, bytes.fromhex(rules.config_hash()[:16]), *words,
+        gauss_next is not None, gauss_next or 0.0, bytes(cards))
+
+
+def unpack_snapshot(snapshot, path, rules=None):
+    """Reads the state packed by pack_snapshot().
+    Inputs:
+        snapshot: Bytes from pack_snapshot().
+        path: String path the snapshot was read from, for error messages.
+        rules: HouseRules the session will carry on with, default HOUSE_RULES. They must be
+            the rules the snapshot was packed with.
+    Returns:
+        rounds_played: Integer rounds played so far.
+        player_balance: Integer balance after the last round.
+        card_deck: Shoe ready to deal the next card, None before the first shoe.
+        cut_num: Integer cards left when the shoe is reshuffled.
+        rng_state: State for the random generator's setstate().
+        opening_bet: Integer opening bet of the last round.
+    """
+    rules = rules or HOUSE_RULES
+    if len(snapshot) != SNAPSHOT.size or snapshot[:4] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} session snapshot.")
+    fields = SNAPSHOT.unpack(snapshot)
+    magic, version, size, rounds_played, player_balance, opening_bet, cut_num, num_cards, cursor, rules_hash = fields[:10]
+    if version != SNAPSHOT_VERSION or size != SNAPSHOT.size:
+        raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} session snapshot.")
+    if rules_hash != bytes.fromhex(rules.config_hash()[:16]):
+        raise ValueError(f"{path} was saved with different House rules.")
+    words = fields[10:10 + 625]
+    has_gauss, gauss_next, cards = fields[10 + 625:]
+    card_deck = None
+    if num_cards:
+        card_deck = Shoe(cards[:num_cards])
+        card_deck.restart(cursor)
+    rng_state = (3, words, gauss_next if has_gauss else None)
+    return rounds_played, player_balance, card_deck, cut_num, rng_state, opening_bet
+
+
+def write_snapshot(path, rounds_played, player_balance, card_deck, cut_num, rng_state, rules, opening_bet=0):
+    """Saves everything a session needs to carry on with pack_snapshot(), small enough to
+        write after every round. It is written beside path and renamed over it, so a crash
+        part way leaves the last snapshot whole. It is not synced to disk, that would take
+        milliseconds a round, sync_snapshot() does it once when the game exits.
+    Inputs:
+        path: String path of the snapshot file.
+        The rest as pack_snapshot().
+    """
+    snapshot = pack_snapshot(rounds_played, player_balance, card_deck, cut_num, rng_state, rules, opening_bet)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as snapshot_file:
+        snapshot_file.write(snapshot)
+    os.replace(temp_path, path)
+
+
+def sync_snapshot(path):
+    """Syncs the last snapshot written by write_snapshot() to disk, so it survives a power cut.
+    Inputs:
+        path: String path of the snapshot file, which may not have been written yet.
+    """
+    if os.path.exists(path):
+        with open(path, "rb") as snapshot_file:
+            os.fsync(snapshot_file.fileno())
+
+
+def read_snapshot(path, rules=None):
+    """Loads a snapshot saved by write_snapshot().
+    Inputs:
+        path: String path of the snapshot file.
+        rules: HouseRules the session will carry on with, default HOUSE_RULES. They must be
+            the rules the snapshot was saved with.
+    Returns:
+        rounds_played: Integer rounds played so far.
+        player_balance: Integer balance after the last round.
+        card_deck: Shoe ready to deal the next card, None before the first shoe.
+        cut_num: Integer cards left when the shoe is reshuffled.
+        rng_state: State for the random generator's setstate().
+        opening_bet: Integer opening bet of the last round.
+    """
+    with open(path, "rb") as snapshot_file:
+        return unpack_snapshot(snapshot_file.read(), path, rules)
+
+
+def session_snapshot(session):
+    """Packs a HeadlessSession with pack_snapshot(). A shoe pool is not saved, a resumed
+        session shuffles its own shoes.
+    Inputs:
+        session: HeadlessSession to pack.
+    Returns:
+        Bytes of SNAPSHOT.size.
+    """
+    return pack_snapshot(session.rounds_played, session.player_balance, session.card_deck, session.cut_num,
+        session.rng.getstate(), session.rules, session.opening_bet)
+
+
+def snapshot_session(session, path):
+    """Saves a HeadlessSession with write_snapshot(), as session_snapshot() packs it.
+    Inputs:
+        session: HeadlessSession to save.
+        path: String path of the snapshot file.
+    """
+    write_snapshot(path, session.rounds_played, session.player_balance, session.card_deck, session.cut_num,
+        session.rng.getstate(), session.rules, session.opening_bet)
+
+
+def resume_session(path, rules=None, metrics=None):
+    """Carries on a HeadlessSession saved by snapshot_session(), for example a simulation
+        worker that was stopped part way. With the same strategy it plays exactly the
+        rounds the saved session would have played next.
+    Inputs:
+        path: String path of the snapshot file.
+        rules: HouseRules of the saved session, default HOUSE_RULES.
+        metrics: As HeadlessSession.
+    Returns:
+        session: HeadlessSession ready to play its next round.
+    """
+    rounds_played, player_balance, card_deck, cut_num, rng_state, opening_bet = read_snapshot(path, rules)
+    session = HeadlessSession(player_balance=player_balance, rules=rules, metrics=metrics)
+    session.rounds_played = rounds_played
+    session.card_deck = card_deck
+    session.cut_num = cut_num
+    session.rng.setstate(rng_state)
+    session.opening_bet = opening_bet
+    return session
+
+
+def main():
+# Main function, serves as place holder to add more games.
+    parser = argparse.ArgumentParser(description="Minimalist Console Blackjack")
+    parser.add_argument("--simulate", type=int, metavar="ROUNDS", help="play ROUNDS headless rounds and report the results")
+    parser.add_argument("--simulate-until", type=float, metavar="PERCENT",
+                        help="simulate until the house edge confidence interval is narrower than PERCENT")
+    parser.add_argument("--max-rounds", type=int, default=SIM_MAX_ROUNDS, metavar="ROUNDS",
+                        help=f"most rounds --simulate-until plays, default {SIM_MAX_ROUNDS}")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level for --simulate-until, default 0.95")
+    parser.add_argument("--table-simulate", type=int, metavar="ROUNDS", help="play ROUNDS rounds at a table of --seats seats sharing one shoe")
+    parser.add_argument("--seats", type=int, default=MAX_SEATS, help=f"seats for --table-simulate, 1 to {MAX_SEATS}, default {MAX_SEATS}")
+    parser.add_argument("--tournament", type=int, metavar="SHOES", help="compare strategies on SHOES common shoes")
+    parser.add_argument("--bankroll", type=int, metavar="SESSIONS", help="play SESSIONS whole sessions and report balances and risk of ruin")
+    parser.add_argument("--session-rounds", type=int, default=BANKROLL_SESSION_ROUNDS, metavar="ROUNDS",
+                        help=f"rounds in each --bankroll session, default {BANKROLL_SESSION_ROUNDS}")
+    parser.add_argument("--tournament-strategies", nargs="+", choices=STRATEGY_NAMES, default=["default", "table"],
+                        metavar="STRATEGY", help="strategies for --tournament, default: default table")
+    parser.add_argument("--seed", help="master seed for --simulate, or the seed of a --record game")
+    parser.add_argument("--workers", type=int, help="processes used by --simulate, default one per core")
+    parser.add_argument("--shoe-pool", type=int, default=0, metavar="SHOES", help="keep SHOES shuffled shoes ready in the background for --simulate")
+    parser.add_argument("--dealer-batch", type=int, metavar="ROUNDS", help="play ROUNDS rounds at once with NumPy")
+    parser.add_argument("--dealer-table", type=int, metavar="TOTAL", help="print the House's exact odds against a hand of TOTAL")
+    parser.add_argument("--strategy-table", action="store_true", help="print the best choice for every hand")
+    parser.add_argument("--rules", nargs="+", default=[], metavar="FIELD=VALUE",
+                        help=f"change House rules for every mode, fields: {', '.join(HouseRules.__slots__)}")
+    parser.add_argument("--sweep", type=int, metavar="ROUNDS", help="play ROUNDS rounds for every combination of --sweep-grid")
+    parser.add_argument("--sweep-grid", nargs="+", default=[], metavar="FIELD=VALUE,VALUE",
+                        help="House rules to vary in --sweep, e.g. num_decks=1,3,6")
+    parser.add_argument("--sweep-cache", default=SWEEP_CACHE_DIR, metavar="DIR", help=f"folder of saved --sweep results, default {SWEEP_CACHE_DIR}")
+    parser.add_argument("--strategy", choices=STRATEGY_NAMES, default="default", help="player strategy for --simulate")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="host blackjack tables for many players over TCP")
+    parser.add_argument("--host", default="127.0.0.1", help="address for --serve and --metrics-port, default 127.0.0.1")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", help="serve Prometheus metrics of the game or --serve on http://HOST:PORT/metrics")
+    parser.add_argument("--metrics-file", metavar="FILE", help="rewrite Prometheus metrics of the game or --serve to FILE")
+    parser.add_argument("--metrics-interval", type=float, default=METRICS_INTERVAL, metavar="SECONDS",
+                        help=f"seconds between rewrites of --metrics-file, default {METRICS_INTERVAL}")
+    parser.add_argument("--benchmark", action="store_true", help="time the deck, hand and round functions")
+    parser.add_argument("--benchmark-save", metavar="FILE", help="save --benchmark results as JSON")
+    parser.add_argument("--benchmark-baseline", metavar="FILE", help="compare --benchmark results with a saved JSON file")
+    parser.add_argument("--benchmark-threshold", type=float, default=BENCHMARK_THRESHOLD, metavar="PERCENT",
+                        help=f"percent slower than the baseline that is a regression, default {BENCHMARK_THRESHOLD}")
+    parser.add_argument("--phase-report", action="store_true", help="time each phase of every round and print a report at exit")
+    parser.add_argument("--history", metavar="FILE", help="record every round of the game to a hand history FILE")
+    parser.add_argument("--read-history", metavar="FILE", help="print a summery of a hand history FILE")
+    parser.add_argument("--record", metavar="FILE", help=f"write the seed and every decision of the game to FILE, with checkpoints in FILE{REPLAY_CHECKPOINT_SUFFIX}")
+    parser.add_argument("--replay", metavar="FILE", help="replay a game recorded with --record and check every round")
+    parser.add_argument("--replay-round", type=int, metavar="N", help="show round N (from 0) of --replay")
+    parser.add_argument("--snapshot", metavar="FILE", help="save the game to FILE after every round, and carry on from FILE if it exists")
+    parser.add_argument("--script", metavar="FILE", help="read every answer of the game from FILE, - for stdin, with no pauses")
+    parser.add_argument("--no-pause", action="store_true", help="play without the pauses between steps")
+    parser.add_argument("--quiet", action="store_true", help="throw away the game's output, the same as --renderer null")
+    parser.add_argument("--renderer", choices=RENDERERS, default="console", help="how the game is shown, default console")
+    parser.add_argument("--script-stats", action="store_true", help="print the startup time and rounds/sec of a --script game to stderr")
+    args = parser.parse_args()
+
+    # Every mode plays by the same House rules.
+    global HOUSE_RULES, PAUSES_ON
+    HOUSE_RULES = parse_rules(args.rules)
+
+    if args.sweep:
+        start_time = time.perf_counter()
+        grid = rules_grid(args.sweep_grid)
+        strategy = make_strategy(args.strategy)
+        seed = args.seed if args.seed is not None else 0
+        results, num_cached = sweep_rules(grid, args.sweep, seed, args.workers, strategy, cache_dir=args.sweep_cache)
+        display_sweep(grid, results, num_cached, time.perf_counter() - start_time)
+        return
+
+    if args.benchmark:
+        results = run_benchmarks()
+        display_benchmarks(results)
+        if args.benchmark_save:
+            with open(args.benchmark_save, "w") as save_file:
+                json.dump({"python": platform.python_version(), "results": results}, save_file, indent=2)
+        if args.benchmark_baseline:
+            with open(args.benchmark_baseline) as baseline_file:
+                baseline = json.load(baseline_file)["results"]
+            print()
+            if compare_benchmarks(results, baseline, args.benchmark_threshold):
+                sys.exit(1)
+        return
+
+    if args.replay:
+        seed, rounds = load_decision_log(args.replay)
+        replay = Replay(seed, rounds, checkpoint_path=args.replay + REPLAY_CHECKPOINT_SUFFIX)
+        start_time = time.perf_counter()
+        try:
+            if args.replay_round is not None:
+                display_replay_round(args.replay_round, replay.seek(args.replay_round), replay.session)
+            else:
+                session = replay.run()
+                elapsed = time.perf_counter() - start_time
+                print(f"Replayed {session.rounds_played} rounds in {elapsed:.2f} seconds, final balance {session.player_balance} credits")
+        except ReplayDivergence as divergence:
+            print(f"Replay diverged. {divergence}")
+            sys.exit(1)
+        return
+
+    if args.read_history:
+        display_hand_history(args.read_history)
+        return
+
+    if args.serve:
+        try:
+            metrics = start_metrics(args.metrics_port, args.host, args.metrics_file, args.metrics_interval)
+            asyncio.run(serve_tables(args.host, args.serve, metrics=metrics))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.strategy_table:
+        display_strategy_table(build_strategy_table())
+        return
+
+    if args.dealer_table:
+        display_dealer_table(args.dealer_table)
+        return
+
+    if args.dealer_batch:
+        start_time = time.perf_counter()
+        dealer_totals, wins, pushes, losses = simulate_dealer_batch(args.dealer_batch, args.seed)
+        display_dealer_batch(dealer_totals, wins, pushes, losses, time.perf_counter() - start_time)
+        return
+
+    if args.table_simulate:
+        start_time = time.perf_counter()
+        strategy = make_strategy(args.strategy)
+        stats, seed = simulate_table(args.table_simulate, [strategy] * args.seats, args.seed, args.workers)
+        display_table_simulation(stats, seed, time.perf_counter() - start_time)
+        return
+
+    if args.bankroll:
+        start_time = time.perf_counter()
+        stats, seed = bankroll_analysis(args.bankroll, args.session_rounds, args.seed, args.workers, make_strategy(args.strategy))
+        display_bankroll(stats, args.session_rounds, seed, time.perf_counter() - start_time)
+        return
+
+    if args.tournament:
+        start_time = time.perf_counter()
+        strategies = [make_strategy(name) for name in args.tournament_strategies]
+        stats, shoe_moments, pair_moments, seed = tournament(strategies, args.tournament, args.seed, args.workers)
+        display_tournament(args.tournament_strategies, stats, shoe_moments, pair_moments, seed, time.perf_counter() - start_time)
+        return
+
+    if args.simulate_until:
+        start_time = time.perf_counter()
+        strategy = make_strategy(args.strategy)
+        ci_width = args.simulate_until / 100
+        stats, moments, half_width, seed = simulate_until(ci_width, args.max_rounds, args.seed, args.workers, strategy,
+                                                          args.confidence, shoe_pool_size=args.shoe_pool)
+        display_simulate_until(stats, moments, half_width, ci_width, args.confidence, seed, time.perf_counter() - start_time)
+        return
+
+    if args.simulate:
+        start_time = time.perf_counter()
+        strategy = make_strategy(args.strategy)
+        stats, seed = simulate(args.simulate, args.seed, args.workers, strategy, shoe_pool_size=args.shoe_pool)
+        display_simulation(stats, seed, time.perf_counter() - start_time)
+        return
+
+    # Every line of the game is shown by one renderer, closed when the game ends.
+    renderer = make_renderer("null" if args.quiet else args.renderer)
+    with use_renderer(renderer):
+        # Answer from a script or pipe with no pauses, to load test the real game.
+        script = None
+        read = renderer.input
+        if args.script == "-":
+            script = read = ScriptedInput(sys.stdin)
+        elif args.script:
+            script_file = open(args.script)
+            atexit.register(script_file.close)
+            script = read = ScriptedInput(script_file)
+        # Count every round and time every answer while the game runs.
+        metrics = start_metrics(args.metrics_port, args.host, args.metrics_file, args.metrics_interval)
+        if metrics is not None:
+            read = metrics.timed_input(read)
+        globals()["input"] = read
+        if args.no_pause or script:
+            PAUSES_ON = False
+        #Display intro text.
+        intro()
+        # Time each phase of the game and report when the program exits, even on Ctrl-C.
+        phase_timer = None
+        if args.phase_report:
+            phase_timer = PhaseTimer()
+            atexit.register(phase_timer.report)
+        # Record every round, the last ones are written out when the game ends.
+        history = None
+        if args.history:
+            history = HandHistoryWriter(args.history)
+            atexit.register(history.close)
+        # Seed the game and record every answer, so it can be replayed with --replay.
+        decisions = None
+        if args.record:
+            seed = args.seed if args.seed is not None else str(random.randrange(2 ** 32))
+            random.seed(seed)
+            decisions = DecisionRecorder(args.record, seed, read)
+            globals()["input"] = decisions.input
+            atexit.register(decisions.close)
+        # The game is saved after every round, synced to disk once at the end.
+        if args.snapshot:
+            atexit.register(sync_snapshot, args.snapshot)
+        #Load game of blackjack.
+        if script:
+            rounds_played, elapsed = play_script(script, phase_timer, history, decisions, metrics, args.snapshot)
+            if args.script_stats:
+                display_script_stats(script, rounds_played, elapsed)
+        else:
+            blackjack(phase_timer, history, decisions, metrics, args.snapshot)
+        #Thank you notice on exit.
+        thank_you()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file